@@ -1,14 +1,22 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from typing import Optional
 import os
 from dotenv import load_dotenv
+from app.services.metrics import Gauge
+from app.services.tracing import instrument_engine
+from app.services.query_stats import track_engine
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./customerbot.db")
 
+# When this Alembic config exists and the database is at its head revision,
+# startup skips create_all
+ALEMBIC_CONFIG = os.getenv("ALEMBIC_CONFIG", "alembic.ini")
+
 # Convert sqlite to aiosqlite for async support
 if DATABASE_URL.startswith("sqlite"):
     ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://")
@@ -16,6 +24,30 @@ else:
     ASYNC_DATABASE_URL = DATABASE_URL
 
 engine = create_async_engine(ASYNC_DATABASE_URL, echo=True, future=True)
+instrument_engine(engine)
+track_engine(engine)
+
+# Counted from pool events, so it also works with NullPool (the aiosqlite default)
+db_connections_checked_out = Gauge(
+    "db_connections_checked_out",
+    "Database connections currently in use"
+)
+db_pool_size = Gauge(
+    "db_pool_size",
+    "Configured size of the connection pool, where the pool has one",
+    callback=lambda: engine.pool.size() if hasattr(engine.pool, "size") else {}
+)
+
+
+@event.listens_for(engine.sync_engine, "checkout")
+def _connection_checked_out(dbapi_connection, connection_record, connection_proxy):
+    db_connections_checked_out.inc()
+
+
+@event.listens_for(engine.sync_engine, "checkin")
+def _connection_checked_in(dbapi_connection, connection_record):
+    db_connections_checked_out.dec()
+
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
@@ -32,6 +64,36 @@ async def get_db():
             await session.close()
 
 
+def _alembic_head() -> Optional[str]:
+    """Head revision of the Alembic scripts, or None without an Alembic setup"""
+    if not os.path.exists(ALEMBIC_CONFIG):
+        return None
+    try:
+        from alembic.config import Config
+        from alembic.script import ScriptDirectory
+    except ImportError:  # alembic is optional at runtime; fall back to create_all
+        return None
+    try:
+        return ScriptDirectory.from_config(Config(ALEMBIC_CONFIG)).get_current_head()
+    except Exception as e:
+        print(f"Could not read Alembic head revision: {e}")
+        return None
+
+
+async def _database_at_revision(revision: str) -> bool:
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+            return revision in result.scalars().all()
+    except Exception:
+        # No alembic_version table yet
+        return False
+
+
 async def init_db():
+    head = _alembic_head()
+    if head is not None and await _database_at_revision(head):
+        print(f"Database at Alembic revision {head}; skipping create_all")
+        return
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
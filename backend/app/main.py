@@ -1,22 +1,76 @@
-from fastapi import FastAPI
+from app.services.startup import startup_profile, LazyRouterMiddleware, LAZY_ROUTERS
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
 
 from app.database import init_db
-from app.routes import departments, users, chats, websocket, auth, reviews
+from app.routes import chats, websocket, auth
+from app.services.outbox import outbox_relay
+from app.services.jobs import job_queue
+from app.services.presence import presence
+from app.services.heartbeat import heartbeat_scheduler
+from app.services.typing_indicator import typing_coalescer
+from app.services.archive import chat_archiver
+from app.services.search import search_index
+from app.services.review_insights import review_insights_runner
+from app.services.supervisor import supervisor_hub
+from app.services.metrics import metrics_registry, MetricsMiddleware, CONTENT_TYPE
+from app.services.tracing import TracingMiddleware
+from app.services.query_stats import QueryStatsMiddleware
+from app.services.idempotency import IdempotencyMiddleware
+from app.services.profiler import profiler, ProfilerMiddleware, PROFILER_STARTUP_SECONDS
+from app.services.loop_monitor import loop_monitor
 
 load_dotenv()
 
+startup_profile.mark("imports")
+
+# Back-office routers, by path prefix; customers and agents only need the eager ones
+LAZY_ROUTER_MODULES = {
+    "/api/departments": "app.routes.departments",
+    "/api/users": "app.routes.users",
+    "/api/reviews": "app.routes.reviews",
+    "/api/admin": "app.routes.admin",
+}
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Initialize database
+    # Startup: watch the event loop from the start, then initialize database
+    startup_profile.mark("server start")
+    loop_monitor.start()
     await init_db()
+    startup_profile.mark("init_db")
+    await search_index.setup()
+    startup_profile.mark("search index")
     print("Database initialized")
+    outbox_relay.start()
+    job_queue.start()
+    presence.start()
+    heartbeat_scheduler.start()
+    typing_coalescer.start()
+    chat_archiver.start()
+    review_insights_runner.start()
+    supervisor_hub.start()
+    if PROFILER_STARTUP_SECONDS > 0:
+        profiler.start(PROFILER_STARTUP_SECONDS)
+    startup_profile.mark("background services")
+    startup_profile.ready()
     yield
-    # Shutdown: cleanup if needed
+    # Shutdown: flush pending notifications and agent status writes
+    await profiler.stop()
+    await supervisor_hub.stop()
+    await review_insights_runner.stop()
+    await chat_archiver.stop()
+    await typing_coalescer.stop()
+    await heartbeat_scheduler.stop()
+    await presence.stop()
+    # Drain post-response jobs before the relay delivers their notifications
+    await job_queue.stop()
+    await outbox_relay.stop()
+    await loop_monitor.stop()
     print("Shutting down...")
 
 
@@ -41,13 +95,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if LAZY_ROUTERS:
+    app.add_middleware(LazyRouterMiddleware, fastapi_app=app, routers=LAZY_ROUTER_MODULES)
+
+# Added last so they wrap CORS; the root span opens inside the metrics timer
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(QueryStatsMiddleware)
+app.add_middleware(ProfilerMiddleware)
+app.add_middleware(TracingMiddleware)
+if metrics_registry.enabled:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
-app.include_router(departments.router)
-app.include_router(users.router)
 app.include_router(chats.router)
-app.include_router(reviews.router)
 app.include_router(websocket.router)
+if not LAZY_ROUTERS:
+    import importlib
+    for module_name in LAZY_ROUTER_MODULES.values():
+        app.include_router(importlib.import_module(module_name).router)
+
+
+startup_profile.mark("app setup")
 
 
 @app.get("/")
@@ -64,11 +133,20 @@ async def health_check():
     return {"status": "healthy"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return Response(metrics_registry.render(), media_type=CONTENT_TYPE)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True
+        reload=True,
+        # Transport-level permessage-deflate compresses every frame; turn it off
+        # when relying on the size-aware `compress` policy instead
+        ws_per_message_deflate=os.getenv("WS_PER_MESSAGE_DEFLATE", "true").lower() == "true"
     )
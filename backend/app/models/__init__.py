@@ -1 +1 @@
-from .models import Department, User, ChatSession, Message, UserRole, ChatStatus, AgentStatus
+from .models import Department, User, ChatSession, Message, OutboxEvent, OutboxDeadLetter, ArchivedChat, MaintenanceLock, ReviewInsight, ReviewTrend, PipelineWatermark, AgentScorecard, UserRole, ChatStatus, AgentStatus
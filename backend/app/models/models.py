@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Date, Float, ForeignKey, Text, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -83,6 +83,9 @@ class ChatSession(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    # Ids only grow, even after the newest rows are deleted (SQLite would
+    # otherwise reuse them); archive purges rely on this
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     chat_session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
@@ -114,3 +117,114 @@ class Review(Base):
     chat_session = relationship("ChatSession", backref="review")
     agent = relationship("User")
     department = relationship("Department")
+
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    target_type = Column(String(20), nullable=False)  # "agent" or "chat"
+    target_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON-encoded WebSocket message
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=True, index=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# Outbox events given up on after OUTBOX_MAX_ATTEMPTS, kept for inspection
+class OutboxDeadLetter(Base):
+    __tablename__ = "outbox_dead_letters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, nullable=False)  # The outbox event's id, which may be reused later
+    target_type = Column(String(20), nullable=False)
+    target_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True))
+    failed_at = Column(DateTime, nullable=False)
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(50), nullable=False)  # Registered job handler
+    payload = Column(Text, nullable=False)  # JSON-encoded keyword arguments
+    priority = Column(Integer, default=5, nullable=False, index=True)  # Lower runs first
+    status = Column(String(10), default="pending", nullable=False, index=True)  # "pending", "running" or "failed"
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, nullable=True)
+    locked_by = Column(String(32), nullable=True)  # Process running the job
+    locked_until = Column(DateTime, nullable=True)  # Another process may take it over after this
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ArchivedChat(Base):
+    __tablename__ = "archived_chats"
+
+    chat_session_id = Column(Integer, ForeignKey("chat_sessions.id"), primary_key=True)
+    archive_path = Column(String(255), nullable=False)  # File name inside ARCHIVE_DIR
+    offset = Column(Integer, nullable=False)  # Byte offset of the chat's compressed member
+    length = Column(Integer, nullable=False)
+    message_count = Column(Integer, nullable=False)
+    last_message_id = Column(Integer, default=0, nullable=False)  # Highest message id in the member; later rows stay live
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class MaintenanceLock(Base):
+    __tablename__ = "maintenance_locks"
+
+    name = Column(String(50), primary_key=True)  # Job holding the lock, e.g. "archive"
+    owner = Column(String(32), nullable=False)  # Run holding it
+    locked_until = Column(DateTime, nullable=False)  # Another run may take it over after this
+
+
+class ReviewInsight(Base):
+    __tablename__ = "review_insights"
+
+    review_id = Column(Integer, ForeignKey("reviews.id"), primary_key=True)
+    sentiment_score = Column(Float, nullable=True)  # -1..1, null when there is no comment
+    sentiment_label = Column(String(10), nullable=False)  # "positive", "neutral" or "negative"
+    keywords = Column(Text, nullable=False, default="[]")  # JSON list
+    processed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ReviewTrend(Base):
+    __tablename__ = "review_trends"
+    __table_args__ = (UniqueConstraint("scope", "scope_id", "period"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(12), nullable=False)  # "agent" or "department"
+    scope_id = Column(Integer, nullable=False)
+    period = Column(Date, nullable=False)  # Day the reviews were submitted
+    review_count = Column(Integer, default=0, nullable=False)
+    rating_sum = Column(Integer, default=0, nullable=False)
+    sentiment_count = Column(Integer, default=0, nullable=False)  # Reviews with a comment
+    sentiment_sum = Column(Float, default=0.0, nullable=False)
+    positive_count = Column(Integer, default=0, nullable=False)
+    negative_count = Column(Integer, default=0, nullable=False)
+    keyword_counts = Column(Text, nullable=False, default="{}")  # JSON keyword -> count
+
+
+class PipelineWatermark(Base):
+    __tablename__ = "pipeline_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    last_id = Column(Integer, default=0, nullable=False)  # Highest source row id processed
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class AgentScorecard(Base):
+    __tablename__ = "agent_scorecards"
+
+    agent_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    chats_closed = Column(Integer, default=0, nullable=False)
+    handle_seconds_total = Column(Float, default=0.0, nullable=False)
+    ratings_count = Column(Integer, default=0, nullable=False)
+    rating_sum = Column(Integer, default=0, nullable=False)
+    transfers_out = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
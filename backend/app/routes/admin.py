@@ -0,0 +1,69 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import PlainTextResponse, Response
+from typing import Optional
+from app.services.auth import get_current_admin
+from app.services.loop_monitor import loop_monitor
+from app.services.startup import startup_profile
+from app.services.profiler import (
+    profiler,
+    flamegraph_svg,
+    PROFILER_DEFAULT_SECONDS,
+    PROFILER_INTERVAL_MS
+)
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin"],
+    dependencies=[Depends(get_current_admin)]
+)
+
+
+@router.post("/profiler/start")
+async def start_profiler(
+    seconds: float = PROFILER_DEFAULT_SECONDS,
+    interval_ms: float = PROFILER_INTERVAL_MS
+):
+    """Sample the event loop for a window of `seconds` (capped by PROFILER_MAX_SECONDS)"""
+    try:
+        profiler.start(seconds, interval_ms)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    return profiler.summary()
+
+
+@router.post("/profiler/stop")
+async def stop_profiler():
+    """End the current profiling window early"""
+    await profiler.stop()
+    return profiler.summary()
+
+
+@router.get("/profiler")
+async def get_profiler_summary():
+    """Samples per endpoint and event loop lag of the current or last window"""
+    return profiler.summary()
+
+
+@router.get("/profiler/collapsed", response_class=PlainTextResponse)
+async def get_collapsed_stacks(endpoint: Optional[str] = None):
+    """Collapsed stacks for flamegraph.pl or speedscope, optionally for one endpoint"""
+    return profiler.collapsed(endpoint)
+
+
+@router.get("/profiler/flamegraph")
+async def get_flamegraph(endpoint: Optional[str] = None):
+    """SVG flame graph of one endpoint (e.g. `POST /api/auth/login`) or of everything"""
+    svg = flamegraph_svg(profiler.collapsed(endpoint), title=endpoint or "All endpoints")
+    return Response(svg, media_type="image/svg+xml")
+
+
+@router.get("/event-loop")
+async def get_event_loop_health():
+    """Rolling loop lag percentiles and the stacks of recent blocking calls"""
+    return loop_monitor.summary()
+
+
+@router.get("/startup")
+async def get_startup_profile():
+    """Time spent in each startup phase, and in lazily loaded routers"""
+    return startup_profile.report()
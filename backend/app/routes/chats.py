@@ -1,16 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, desc
 from sqlalchemy.orm import selectinload
 from typing import List
 from datetime import datetime
 from app.database import get_db
-from app.models.models import ChatSession, Message, ChatStatus, Department, User, AgentStatus
+from app.models.models import ChatSession, Message, ChatStatus, Department, User, AgentStatus, ArchivedChat
 from app.schemas.schemas import (
+    Department as DepartmentSchema,
+    User as UserSchema,
     ChatSession as ChatSessionSchema,
     ChatSessionCreate,
     ChatSessionWithDetails,
     Message as MessageSchema,
+    MessageSearchResult,
     MessageCreate,
     TransferRequest,
     QueueStatus
@@ -20,15 +23,31 @@ from app.services.assignment_service import (
     transfer_chat,
     get_customer_care_department,
     claim_chat_with_lock,
-    handle_chat_close_assignment,
     get_queue_position,
     get_department_agent_stats,
     agent_has_active_chat
 )
 from app.services.websocket_manager import manager
+from app.services.outbox import enqueue_chat_broadcast
+from app.services.chat_history import chat_history, message_event
+from app.services.message_cache import message_cache
+from app.services.archive import read_archived_messages
+from app.services.search import search_index
+from app.services.scorecards import record_chat_closed
+from app.services.wait_time_estimator import wait_time_estimator
+from app.services.rate_limit import limit_chat_creation, limit_message
+from app.services.jobs import job_queue, enqueue_job, PRIORITY_HIGH
+from app.services.serialization import RowSerializer
 
 router = APIRouter(prefix="/api/chats", tags=["chats"])
 
+chat_rows = RowSerializer(
+    ChatSessionWithDetails,
+    ChatSession,
+    nested={"department": (DepartmentSchema, Department), "assigned_agent": (UserSchema, User)}
+)
+message_rows = RowSerializer(MessageSchema, Message)
+
 
 @router.get("/", response_model=List[ChatSessionWithDetails])
 async def get_chat_sessions(
@@ -40,9 +59,10 @@ async def get_chat_sessions(
     db: AsyncSession = Depends(get_db)
 ):
     """Get all chat sessions with optional filters"""
-    query = select(ChatSession).options(
-        selectinload(ChatSession.department),
-        selectinload(ChatSession.assigned_agent)
+    query = (
+        chat_rows.select()
+        .join(Department, ChatSession.department_id == Department.id)
+        .outerjoin(User, ChatSession.assigned_agent_id == User.id)
     )
 
     if status_filter:
@@ -54,8 +74,36 @@ async def get_chat_sessions(
 
     query = query.order_by(desc(ChatSession.created_at)).offset(skip).limit(limit)
     result = await db.execute(query)
-    sessions = result.scalars().all()
-    return sessions
+    return chat_rows.response(result.all())
+
+
+@router.get("/search", response_model=List[MessageSearchResult])
+async def search_chats(
+    q: str,
+    department_id: int = None,
+    agent_id: int = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+    skip: int = 0,
+    limit: int = 50,
+    db: AsyncSession = Depends(get_db)
+):
+    """Search message content, newest matches first"""
+    return await search_index.search(
+        db, q,
+        department_id=department_id,
+        agent_id=agent_id,
+        date_from=date_from,
+        date_to=date_to,
+        skip=skip,
+        limit=min(limit, 200)
+    )
+
+
+@router.get("/cache/stats")
+async def get_message_cache_stats():
+    """Size and hit ratio of the recent-messages cache"""
+    return message_cache.stats()
 
 
 @router.get("/{chat_session_id}", response_model=ChatSessionWithDetails)
@@ -97,8 +145,10 @@ async def get_chat_queue_status(
             detail="Chat session not found"
         )
 
-    position, estimated_wait = await get_queue_position(db, chat_session_id)
     available, busy = await get_department_agent_stats(db, session.department_id)
+    position, estimated_wait = await get_queue_position(
+        db, chat_session_id, chat=session, agent_stats=(available, busy)
+    )
 
     return QueueStatus(
         chat_session_id=chat_session_id,
@@ -110,7 +160,12 @@ async def get_chat_queue_status(
     )
 
 
-@router.post("/", response_model=ChatSessionWithDetails, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=ChatSessionWithDetails,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(limit_chat_creation)]
+)
 async def create_chat_session(
     chat_data: ChatSessionCreate,
     db: AsyncSession = Depends(get_db)
@@ -138,6 +193,10 @@ async def create_chat_session(
     await db.commit()
     await db.refresh(db_chat)
 
+    # A new chat has no history, so its replay buffer and cache entry are complete from the start
+    chat_history.start_chat(db_chat.id)
+    message_cache.start_chat(db_chat.id)
+
     # Try to auto-assign to an available agent
     db_chat = await auto_assign_chat(db, db_chat.id)
 
@@ -152,6 +211,12 @@ async def get_chat_messages(
     db: AsyncSession = Depends(get_db)
 ):
     """Get all messages for a chat session"""
+    # Active chats are served from the cache when the page is inside the cached tail
+    cached = message_cache.get(chat_session_id, skip, limit)
+    if cached is not None:
+        return message_rows.dump(cached)
+    writes = message_cache.writes
+
     # Verify chat session exists
     result = await db.execute(
         select(ChatSession).where(ChatSession.id == chat_session_id)
@@ -163,25 +228,52 @@ async def get_chat_messages(
             detail="Chat session not found"
         )
 
+    # Transcripts of archived chats live in the archive files
+    if session.status == ChatStatus.CLOSED:
+        archived = await db.get(ArchivedChat, chat_session_id)
+        if archived:
+            messages = await read_archived_messages(archived)
+            # Messages written after the chat was archived are still in the table
+            result = await db.execute(
+                message_rows.select()
+                .where(
+                    and_(
+                        Message.chat_session_id == chat_session_id,
+                        Message.id > archived.last_message_id
+                    )
+                )
+                .order_by(Message.created_at)
+            )
+            messages += message_rows.build(result.all())
+            return message_rows.dump(messages[skip:skip + limit])
+
     # Get messages
     result = await db.execute(
-        select(Message)
+        message_rows.select()
         .where(Message.chat_session_id == chat_session_id)
         .order_by(Message.created_at)
         .offset(skip)
         .limit(limit)
     )
-    messages = result.scalars().all()
-    return messages
+    messages = message_rows.build(result.all())
+
+    # A first page shorter than the limit is the whole history; cache it for active chats
+    if session.status != ChatStatus.CLOSED and skip == 0 and len(messages) < limit:
+        message_cache.fill(chat_session_id, messages, writes)
+
+    return message_rows.dump(messages)
 
 
 @router.post("/{chat_session_id}/messages", response_model=MessageSchema, status_code=status.HTTP_201_CREATED)
 async def create_message(
     chat_session_id: int,
     message_data: MessageCreate,
+    request: Request,
     db: AsyncSession = Depends(get_db)
 ):
     """Create a new message in a chat session"""
+    await limit_message(request, chat_session_id, message_data.sender_id)
+
     # Verify chat session exists
     result = await db.execute(
         select(ChatSession).where(ChatSession.id == chat_session_id)
@@ -199,19 +291,12 @@ async def create_message(
     await db.commit()
     await db.refresh(db_message)
 
-    # Broadcast message to all connected clients
-    await manager.broadcast_to_chat(
-        {
-            "type": "message",
-            "message_id": db_message.id,
-            "chat_session_id": db_message.chat_session_id,
-            "sender_name": db_message.sender_name,
-            "content": db_message.content,
-            "is_system_message": db_message.is_system_message,
-            "created_at": str(db_message.created_at)
-        },
-        chat_session_id
-    )
+    message_cache.append(db_message.chat_session_id, MessageSchema.model_validate(db_message))
+
+    # Keep the event for reconnect replay, then broadcast it to connected clients
+    event = message_event(db_message)
+    chat_history.record(chat_session_id, event)
+    await manager.broadcast_to_chat(event, chat_session_id)
 
     return db_message
 
@@ -261,21 +346,8 @@ async def claim_chat_session(
             detail="Chat session already claimed or not available"
         )
 
-    # Notify the customer that an agent has joined
-    agent_result = await db.execute(
-        select(User).where(User.id == agent_id)
-    )
-    agent = agent_result.scalar_one_or_none()
-
-    await manager.broadcast_to_chat(
-        {
-            "type": "agent_assigned",
-            "chat_session_id": chat_session_id,
-            "agent_name": agent.full_name or agent.username if agent else "Agent",
-            "message": f"{agent.full_name or agent.username if agent else 'An agent'} has joined the chat."
-        },
-        chat_session_id
-    )
+    # Notify the customer that an agent has joined, after the response
+    await job_queue.submit("announce_agent_joined", chat_session_id=chat_session_id, agent_id=agent_id)
 
     return session
 
@@ -303,36 +375,38 @@ async def close_chat_session(
 
     agent_id = session.assigned_agent_id
     department_id = session.department_id
+    already_closed = session.status == ChatStatus.CLOSED
 
     session.status = ChatStatus.CLOSED
     session.closed_at = datetime.utcnow()
 
-    await db.commit()
+    # Count the chat on the agent's scorecard in the same transaction
+    if agent_id and not already_closed:
+        await record_chat_closed(db, agent_id, session.created_at, session.closed_at)
 
-    # Re-fetch with relationships loaded
-    result = await db.execute(
-        select(ChatSession)
-        .options(
-            selectinload(ChatSession.department),
-            selectinload(ChatSession.assigned_agent)
+    # Notify all participants once the close is committed
+    enqueue_chat_broadcast(db, chat_session_id, {
+        "type": "chat_closed",
+        "chat_session_id": chat_session_id,
+        "message": "Chat session has been closed"
+    })
+
+    # Offer the agent their next chat after the response, so the close returns at once
+    if agent_id and department_id:
+        enqueue_job(
+            db, "chat_close_assignment", PRIORITY_HIGH,
+            agent_id=agent_id, department_id=department_id
         )
-        .where(ChatSession.id == chat_session_id)
-    )
-    session = result.scalar_one_or_none()
 
-    # Notify all participants
-    await manager.broadcast_to_chat(
-        {
-            "type": "chat_closed",
-            "chat_session_id": chat_session_id,
-            "message": "Chat session has been closed"
-        },
-        chat_session_id
-    )
+    await db.commit()
+    # updated_at is set by the database and expired by the commit
+    await db.refresh(session, ["updated_at"])
+    chat_history.close_chat(chat_session_id)
+    message_cache.evict(chat_session_id)
 
-    # Handle auto-assignment for the agent who closed the chat
-    if agent_id and department_id:
-        await handle_chat_close_assignment(db, agent_id, department_id)
+    # Feed the handle time of agent-served chats into the wait-time estimator
+    if agent_id and not already_closed:
+        wait_time_estimator.record_closed_chat(department_id, session.created_at, session.closed_at)
 
     return session
 
@@ -377,9 +451,9 @@ async def decline_incoming_assignment(
 
     if agent:
         agent.agent_status = AgentStatus.OFFLINE
-        await db.commit()
 
-    # Try to assign to another agent
-    await auto_assign_chat(db, chat_session_id)
+    # Try to assign to another agent after the response
+    enqueue_job(db, "auto_assign_chat", PRIORITY_HIGH, chat_session_id=chat_session_id)
+    await db.commit()
 
     return {"message": "Assignment declined, status set to offline"}
@@ -2,17 +2,31 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_
 from sqlalchemy.orm import selectinload
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
+from datetime import date
+import json
 from app.database import get_db
-from app.models.models import Review, ChatSession, User, Department
+from app.models.models import Review, ChatSession, User, Department, ReviewInsight, ReviewTrend
 from app.schemas.schemas import (
     Review as ReviewSchema,
     ReviewCreate,
-    ReviewStats
+    ReviewStats,
+    ReviewInsight as ReviewInsightSchema,
+    ReviewTrend as ReviewTrendSchema
 )
+from app.services.review_insights import SCOPE_AGENT, SCOPE_DEPARTMENT
+from app.services.scorecards import record_review
+from app.services.serialization import RowSerializer
 
 router = APIRouter(prefix="/api/reviews", tags=["reviews"])
 
+review_rows = RowSerializer(
+    ReviewSchema,
+    Review,
+    columns={"agent_name": User.full_name, "department_name": Department.name}
+)
+
 
 @router.post("/", response_model=ReviewSchema, status_code=status.HTTP_201_CREATED)
 async def create_review(
@@ -44,16 +58,6 @@ async def create_review(
             detail="Chat session not found"
         )
 
-    # Check if review already exists
-    existing_result = await db.execute(
-        select(Review).where(Review.chat_session_id == review_data.chat_session_id)
-    )
-    if existing_result.scalar_one_or_none():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Review already submitted for this chat session"
-        )
-
     # Create review
     db_review = Review(
         chat_session_id=review_data.chat_session_id,
@@ -65,8 +69,19 @@ async def create_review(
         department_id=chat_session.department_id
     )
 
+    # One review per chat is enforced by the unique constraint, so concurrent
+    # submissions cannot both pass a check-then-insert
     db.add(db_review)
-    await db.commit()
+    try:
+        if db_review.agent_id:
+            await record_review(db, db_review.agent_id, db_review.rating)
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Review already submitted for this chat session"
+        )
 
     # Fetch with relationships
     result = await db.execute(
@@ -93,9 +108,10 @@ async def get_reviews(
     db: AsyncSession = Depends(get_db)
 ):
     """Get all reviews with optional filters"""
-    query = select(Review).options(
-        selectinload(Review.agent),
-        selectinload(Review.department)
+    query = (
+        review_rows.select()
+        .outerjoin(User, Review.agent_id == User.id)
+        .outerjoin(Department, Review.department_id == Department.id)
     )
 
     if department_id:
@@ -109,9 +125,7 @@ async def get_reviews(
 
     query = query.order_by(Review.created_at.desc()).offset(offset).limit(limit)
     result = await db.execute(query)
-    reviews = result.scalars().all()
-
-    return [_review_to_schema(r) for r in reviews]
+    return review_rows.response(result.all())
 
 
 @router.get("/stats", response_model=ReviewStats)
@@ -156,6 +170,88 @@ async def get_review_stats(
     )
 
 
+@router.get("/insights", response_model=List[ReviewInsightSchema])
+async def get_review_insights(
+    department_id: Optional[int] = None,
+    agent_id: Optional[int] = None,
+    sentiment: Optional[str] = None,
+    limit: int = 50,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get per-review sentiment and keywords computed by the insights pipeline"""
+    query = select(Review, ReviewInsight).join(ReviewInsight, ReviewInsight.review_id == Review.id)
+
+    if department_id:
+        query = query.where(Review.department_id == department_id)
+    if agent_id:
+        query = query.where(Review.agent_id == agent_id)
+    if sentiment:
+        query = query.where(ReviewInsight.sentiment_label == sentiment)
+
+    query = query.order_by(Review.id.desc()).offset(offset).limit(limit)
+    result = await db.execute(query)
+
+    return [
+        ReviewInsightSchema(
+            review_id=review.id,
+            chat_session_id=review.chat_session_id,
+            rating=review.rating,
+            agent_id=review.agent_id,
+            department_id=review.department_id,
+            sentiment_score=insight.sentiment_score,
+            sentiment_label=insight.sentiment_label,
+            keywords=json.loads(insight.keywords),
+            created_at=review.created_at
+        )
+        for review, insight in result.all()
+    ]
+
+
+@router.get("/trends", response_model=List[ReviewTrendSchema])
+async def get_review_trends(
+    scope: str = SCOPE_DEPARTMENT,
+    scope_id: Optional[int] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get daily rating and sentiment trends per agent or department"""
+    if scope not in (SCOPE_AGENT, SCOPE_DEPARTMENT):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Scope must be 'agent' or 'department'"
+        )
+
+    query = select(ReviewTrend).where(ReviewTrend.scope == scope)
+    if scope_id:
+        query = query.where(ReviewTrend.scope_id == scope_id)
+    if date_from:
+        query = query.where(ReviewTrend.period >= date_from)
+    if date_to:
+        query = query.where(ReviewTrend.period <= date_to)
+
+    query = query.order_by(ReviewTrend.scope_id, ReviewTrend.period)
+    result = await db.execute(query)
+
+    return [
+        ReviewTrendSchema(
+            scope=trend.scope,
+            scope_id=trend.scope_id,
+            period=trend.period,
+            review_count=trend.review_count,
+            average_rating=round(trend.rating_sum / trend.review_count, 2) if trend.review_count else 0.0,
+            average_sentiment=(
+                round(trend.sentiment_sum / trend.sentiment_count, 3) if trend.sentiment_count else None
+            ),
+            positive_count=trend.positive_count,
+            negative_count=trend.negative_count,
+            top_keywords=list(json.loads(trend.keyword_counts))[:10]
+        )
+        for trend in result.scalars().all()
+    ]
+
+
 @router.get("/{review_id}", response_model=ReviewSchema)
 async def get_review(
     review_id: int,
@@ -4,12 +4,28 @@ from sqlalchemy import select, and_
 from sqlalchemy.orm import selectinload
 from typing import List
 from app.database import get_db
-from app.models.models import User, UserRole, AgentStatus
-from app.schemas.schemas import User as UserSchema, UserCreate, UserUpdate, UserWithDepartment
+from app.models.models import User, UserRole, AgentStatus, Department
+from app.schemas.schemas import (
+    Department as DepartmentSchema,
+    User as UserSchema,
+    UserCreate,
+    UserUpdate,
+    UserWithDepartment,
+    AgentScorecard
+)
 from app.services.auth import get_password_hash
+from app.services.presence import presence
+from app.services.scorecards import get_scorecards
+from app.services.serialization import RowSerializer
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
+user_rows = RowSerializer(
+    UserWithDepartment,
+    User,
+    nested={"department": (DepartmentSchema, Department)}
+)
+
 
 @router.get("/", response_model=List[UserWithDepartment])
 async def get_users(
@@ -20,7 +36,7 @@ async def get_users(
     db: AsyncSession = Depends(get_db)
 ):
     """Get all users with optional filters"""
-    query = select(User).options(selectinload(User.department))
+    query = user_rows.select().outerjoin(Department, User.department_id == Department.id)
 
     if role:
         query = query.where(User.role == role)
@@ -29,8 +45,7 @@ async def get_users(
 
     query = query.offset(skip).limit(limit)
     result = await db.execute(query)
-    users = result.scalars().all()
-    return users
+    return user_rows.response(result.all())
 
 
 @router.get("/agents/available", response_model=List[UserSchema])
@@ -55,6 +70,15 @@ async def get_available_agents(
     return agents
 
 
+@router.get("/agents/scorecards", response_model=List[AgentScorecard])
+async def get_agent_scorecards(
+    department_id: int = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get chats handled, handle time, rating and transfer rate for every agent"""
+    return await get_scorecards(db, department_id)
+
+
 @router.get("/{user_id}", response_model=UserWithDepartment)
 async def get_user(
     user_id: int,
@@ -166,6 +190,9 @@ async def update_agent_status(
 
     db_user.agent_status = agent_status
     await db.commit()
+
+    # An explicit status change wins over queued presence writes
+    presence.discard_pending(user_id)
     await db.refresh(db_user)
     return db_user
 
@@ -1,12 +1,17 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.database import get_db
-from app.models.models import ChatSession, Message, User
+from app.database import get_db, AsyncSessionLocal
+from app.models.models import ChatSession, Message, User, AgentStatus
 from app.services.websocket_manager import manager
+from app.services.presence import presence
+from app.services.typing_indicator import typing_coalescer
+from app.services.ws_protocol import negotiate_codec, compression_stats
+from app.services.chat_history import chat_history
+from app.services.supervisor import supervisor_hub
+from app.services.rate_limit import rate_limiter, admission, client_ip, WS_TRY_AGAIN_LATER
 from app.schemas.schemas import WSMessage
 from typing import Optional
-import json
 
 router = APIRouter(tags=["websocket"])
 
@@ -16,10 +21,22 @@ async def websocket_chat_endpoint(
     websocket: WebSocket,
     chat_session_id: int,
     sender_name: Optional[str] = "Anonymous",
-    sender_id: Optional[int] = None
+    sender_id: Optional[int] = None,
+    protocol: Optional[str] = None,
+    batch: Optional[bool] = None,
+    compress: bool = False,
+    resume_from: Optional[int] = None
 ):
-    """WebSocket endpoint for chat communication"""
-    await manager.connect_to_chat(websocket, chat_session_id)
+    """
+    WebSocket endpoint for chat communication.
+    `protocol` (json, compact or msgpack) and `batch` select the wire format;
+    `compress` deflates text frames above WS_COMPRESS_THRESHOLD_BYTES.
+    `resume_from` replays the messages after that sequence number.
+    """
+    codec = negotiate_codec(protocol, batch, compress)
+    # A resuming client gets live broadcasts only after the replay, so an
+    # older replayed message never arrives behind a newer live one
+    await manager.connect_to_chat(websocket, chat_session_id, codec, hold_broadcasts=resume_from is not None)
 
     try:
         # Send connection confirmation
@@ -27,11 +44,19 @@ async def websocket_chat_endpoint(
             {
                 "type": "connected",
                 "chat_session_id": chat_session_id,
-                "message": "Connected to chat"
+                "message": "Connected to chat",
+                "protocol": codec.name,
+                "batch": codec.batching,
+                "compress": codec.compress
             },
             websocket
         )
 
+        # Replay what a reconnecting client missed
+        if resume_from is not None:
+            await _replay_missed_events(websocket, chat_session_id, resume_from)
+            await manager.release_held_events(websocket)
+
         # Notify others that someone joined
         await manager.broadcast_to_chat(
             {
@@ -44,13 +69,31 @@ async def websocket_chat_endpoint(
 
         while True:
             # Receive message from WebSocket
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = await manager.receive(websocket)
 
             # Handle different message types
             msg_type = message_data.get("type", "message")
 
             if msg_type == "message":
+                if admission.rejection():
+                    # Overloaded: ask the client to come back later, then clean up as on any disconnect
+                    await websocket.close(code=WS_TRY_AGAIN_LATER)
+                    raise WebSocketDisconnect(WS_TRY_AGAIN_LATER)
+                retry_after = await rate_limiter.message(client_ip(websocket), chat_session_id, sender_id)
+                if retry_after:
+                    await manager.send_personal_message(
+                        {
+                            "type": "rate_limited",
+                            "chat_session_id": chat_session_id,
+                            "retry_after": round(retry_after, 3)
+                        },
+                        websocket
+                    )
+                    continue
+
+                # Sending a message ends the sender's typing state
+                await typing_coalescer.stop_typing(chat_session_id, sender_name)
+
                 # Broadcast the message to all participants
                 await manager.broadcast_to_chat(
                     {
@@ -65,19 +108,14 @@ async def websocket_chat_endpoint(
                 )
 
             elif msg_type == "typing":
-                # Broadcast typing indicator
-                await manager.broadcast_to_chat(
-                    {
-                        "type": "typing",
-                        "chat_session_id": chat_session_id,
-                        "sender_name": sender_name,
-                        "is_typing": message_data.get("is_typing", True)
-                    },
-                    chat_session_id
+                # Broadcast typing state transitions, not every keystroke
+                await typing_coalescer.handle_frame(
+                    chat_session_id, sender_name, message_data.get("is_typing", True)
                 )
 
     except WebSocketDisconnect:
         manager.disconnect_from_chat(websocket, chat_session_id)
+        await typing_coalescer.stop_typing(chat_session_id, sender_name)
         await manager.broadcast_to_chat(
             {
                 "type": "user_left",
@@ -91,14 +129,52 @@ async def websocket_chat_endpoint(
         manager.disconnect_from_chat(websocket, chat_session_id)
 
 
+async def _replay_missed_events(websocket: WebSocket, chat_session_id: int, resume_from: int):
+    """Send the events after `resume_from`, or ask the client to reload history"""
+    async with AsyncSessionLocal() as db:
+        events = await chat_history.replay(db, chat_session_id, resume_from)
+
+    if events is None:
+        await manager.send_personal_message(
+            {
+                "type": "resync_required",
+                "chat_session_id": chat_session_id,
+                "resume_from": resume_from
+            },
+            websocket
+        )
+        return
+
+    for event in events:
+        await manager.send_personal_message(event, websocket)
+
+    await manager.send_personal_message(
+        {
+            "type": "replay_complete",
+            "chat_session_id": chat_session_id,
+            "last_seq": events[-1]["seq"] if events else resume_from
+        },
+        websocket
+    )
+
+
 @router.websocket("/ws/agent/{agent_id}")
 async def websocket_agent_endpoint(
     websocket: WebSocket,
     agent_id: int,
-    department_id: Optional[int] = None
+    department_id: Optional[int] = None,
+    protocol: Optional[str] = None,
+    batch: Optional[bool] = None,
+    compress: bool = False
 ):
-    """WebSocket endpoint for agent notifications and status updates"""
-    await manager.connect_agent(websocket, agent_id)
+    """
+    WebSocket endpoint for agent notifications and status updates.
+    `protocol` (json, compact or msgpack) and `batch` select the wire format;
+    `compress` deflates text frames above WS_COMPRESS_THRESHOLD_BYTES.
+    """
+    codec = negotiate_codec(protocol, batch, compress)
+    await manager.connect_agent(websocket, agent_id, codec)
+    presence.agent_connected(agent_id, department_id)
 
     # Mark agent as available
     if department_id:
@@ -109,15 +185,20 @@ async def websocket_agent_endpoint(
             {
                 "type": "connected",
                 "agent_id": agent_id,
-                "message": "Connected to agent dashboard"
+                "message": "Connected to agent dashboard",
+                "protocol": codec.name,
+                "batch": codec.batching,
+                "compress": codec.compress
             },
             websocket
         )
 
         while True:
             # Receive status updates from agent
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
+            message_data = await manager.receive(websocket)
+
+            # Any frame, including explicit heartbeats, proves the agent is alive
+            presence.heartbeat(agent_id)
 
             msg_type = message_data.get("type")
 
@@ -128,6 +209,11 @@ async def websocket_agent_endpoint(
                 elif status == "busy" and department_id:
                     manager.mark_agent_busy(agent_id, department_id)
 
+                try:
+                    presence.set_status(agent_id, AgentStatus(status))
+                except ValueError:
+                    pass
+
                 await manager.send_personal_message(
                     {
                         "type": "status_updated",
@@ -137,11 +223,55 @@ async def websocket_agent_endpoint(
                 )
 
     except WebSocketDisconnect:
-        manager.disconnect_agent(agent_id)
-        if department_id:
-            manager.mark_agent_busy(agent_id, department_id)
+        if manager.disconnect_agent(agent_id, websocket):
+            presence.agent_disconnected(agent_id)
+            if department_id:
+                manager.mark_agent_busy(agent_id, department_id)
     except Exception as e:
         print(f"Agent WebSocket error: {e}")
-        manager.disconnect_agent(agent_id)
-        if department_id:
-            manager.mark_agent_busy(agent_id, department_id)
+        if manager.disconnect_agent(agent_id, websocket):
+            presence.agent_disconnected(agent_id)
+            if department_id:
+                manager.mark_agent_busy(agent_id, department_id)
+
+
+@router.websocket("/ws/supervisor")
+async def websocket_supervisor_endpoint(
+    websocket: WebSocket,
+    department_id: Optional[int] = None,
+    protocol: Optional[str] = None,
+    batch: Optional[bool] = None,
+    compress: bool = False
+):
+    """
+    Live queue and agent state for supervisor dashboards: a snapshot on
+    connect, then throttled deltas. `department_id` limits both to one department.
+    """
+    codec = negotiate_codec(protocol, batch, compress)
+    await manager.connect_supervisor(websocket, department_id, codec)
+
+    try:
+        await supervisor_hub.ensure_loaded()
+        await manager.send_personal_message(supervisor_hub.snapshot(department_id), websocket)
+
+        while True:
+            # Supervisors only send pongs; receiving keeps the socket alive
+            await manager.receive(websocket)
+
+    except WebSocketDisconnect:
+        manager.disconnect_supervisor(websocket)
+    except Exception as e:
+        print(f"Supervisor WebSocket error: {e}")
+        manager.disconnect_supervisor(websocket)
+
+
+@router.get("/ws/stats")
+async def websocket_stats():
+    """Connection gauges, heartbeat/reaping, typing, compression, replay and supervisor counters"""
+    return {
+        **manager.connection_stats(),
+        **typing_coalescer.stats(),
+        **compression_stats.as_dict(),
+        **chat_history.stats(),
+        **supervisor_hub.stats()
+    }
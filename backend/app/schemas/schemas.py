@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, date
 from app.models.models import UserRole, ChatStatus, AgentStatus
 
 
@@ -126,6 +126,18 @@ class Message(BaseModel):
         from_attributes = True
 
 
+class MessageSearchResult(BaseModel):
+    message_id: int
+    chat_session_id: int
+    sender_name: str
+    snippet: str
+    created_at: datetime
+    department_id: int
+    assigned_agent_id: Optional[int] = None
+    customer_name: Optional[str] = None
+    status: ChatStatus
+
+
 # WebSocket Message Schemas
 class WSMessage(BaseModel):
     type: str  # 'message', 'join', 'leave', 'transfer', 'typing', etc.
@@ -194,6 +206,43 @@ class ReviewStats(BaseModel):
     rating_distribution: dict
 
 
+class ReviewInsight(BaseModel):
+    review_id: int
+    chat_session_id: int
+    rating: int
+    agent_id: Optional[int] = None
+    department_id: int
+    sentiment_score: Optional[float] = None
+    sentiment_label: str
+    keywords: List[str]
+    created_at: datetime
+
+
+class ReviewTrend(BaseModel):
+    scope: str
+    scope_id: int
+    period: date
+    review_count: int
+    average_rating: float
+    average_sentiment: Optional[float] = None
+    positive_count: int
+    negative_count: int
+    top_keywords: List[str]
+
+
+class AgentScorecard(BaseModel):
+    agent_id: int
+    full_name: Optional[str] = None
+    department_id: Optional[int] = None
+    agent_status: AgentStatus
+    chats_handled: int
+    average_handle_minutes: Optional[float] = None
+    average_rating: Optional[float] = None
+    ratings_count: int
+    transfers_out: int
+    transfer_rate: float
+
+
 # Queue Status Schema
 class QueueStatus(BaseModel):
     chat_session_id: int
@@ -0,0 +1,326 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, and_, or_
+from sqlalchemy.exc import IntegrityError
+from app.database import AsyncSessionLocal
+from app.models.models import ChatSession, Message, ChatStatus, ArchivedChat, MaintenanceLock
+import asyncio
+import gzip
+import json
+import os
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+# Directory holding the monthly archive files
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+
+# Chats closed longer ago than this are moved out of the live tables
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+
+# Chats archived per batch, and message rows deleted per statement
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))
+ARCHIVE_DELETE_BATCH_SIZE = int(os.getenv("ARCHIVE_DELETE_BATCH_SIZE", "500"))
+
+# "gzip" or "zstd" (needs the zstandard package)
+ARCHIVE_CODEC = os.getenv("ARCHIVE_CODEC", "gzip").lower()
+
+# Run the archiver in the API process this often; 0 leaves it to maintenance.py
+ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "0"))
+
+# One archive run at a time (maintenance.py or the API process); a run that
+# died without releasing the lock is taken over once it has not renewed for this long
+ARCHIVE_LOCK_SECONDS = float(os.getenv("ARCHIVE_LOCK_SECONDS", "600"))
+
+_LOCK_NAME = "archive"
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _chat_record(chat: ChatSession) -> dict:
+    return {
+        "type": "chat",
+        "id": chat.id,
+        "customer_name": chat.customer_name,
+        "customer_email": chat.customer_email,
+        "department_id": chat.department_id,
+        "assigned_agent_id": chat.assigned_agent_id,
+        "status": chat.status.value if chat.status else None,
+        "transferred_from": chat.transferred_from,
+        "created_at": _isoformat(chat.created_at),
+        "closed_at": _isoformat(chat.closed_at)
+    }
+
+
+def _message_record(message: Message) -> dict:
+    return {
+        "type": "message",
+        "id": message.id,
+        "chat_session_id": message.chat_session_id,
+        "sender_id": message.sender_id,
+        "sender_name": message.sender_name,
+        "content": message.content,
+        "is_system_message": message.is_system_message,
+        "created_at": _isoformat(message.created_at)
+    }
+
+
+def _compress(data: bytes) -> bytes:
+    if ARCHIVE_CODEC == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor().compress(data)
+    return gzip.compress(data)
+
+
+def _decompress(path: str, data: bytes) -> bytes:
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"zstandard is required to read {path}")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _archive_file_name(closed_at: Optional[datetime]) -> str:
+    month = (closed_at or datetime.utcnow()).strftime("%Y-%m")
+    suffix = "zst" if ARCHIVE_CODEC == "zstd" and zstandard is not None else "gz"
+    return f"chats-{month}.ndjson.{suffix}"
+
+
+def _append_members(members: List[Tuple[int, str, bytes]]) -> Dict[int, Tuple[str, int, int]]:
+    """
+    Append one compressed member per chat to its monthly file and fsync.
+    Returns chat id -> (file name, offset, length).
+    """
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    locations: Dict[int, Tuple[str, int, int]] = {}
+
+    by_file: Dict[str, List[Tuple[int, bytes]]] = {}
+    for chat_id, file_name, data in members:
+        by_file.setdefault(file_name, []).append((chat_id, data))
+
+    for file_name, chats in by_file.items():
+        with open(os.path.join(ARCHIVE_DIR, file_name), "ab") as f:
+            f.seek(0, os.SEEK_END)
+            for chat_id, data in chats:
+                locations[chat_id] = (file_name, f.tell(), len(data))
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    return locations
+
+
+def _read_member(file_name: str, offset: int, length: int) -> bytes:
+    with open(os.path.join(ARCHIVE_DIR, file_name), "rb") as f:
+        f.seek(offset)
+        return _decompress(file_name, f.read(length))
+
+
+async def read_archived_messages(entry: ArchivedChat) -> List[dict]:
+    """Messages of an archived chat, in the order they were sent"""
+    data = await asyncio.to_thread(_read_member, entry.archive_path, entry.offset, entry.length)
+    messages = []
+    for line in data.splitlines():
+        record = json.loads(line)
+        if record.pop("type") == "message":
+            messages.append(record)
+    return messages
+
+
+async def purge_archived_messages(batch_size: int = ARCHIVE_DELETE_BATCH_SIZE) -> int:
+    """
+    Delete message rows of archived chats, one small transaction per batch so
+    live writers are never blocked for long. Also finishes purges a crash cut
+    short. Rows written after the chat's member was (last_message_id) are kept.
+    """
+    deleted = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Message.id)
+                .join(
+                    ArchivedChat,
+                    and_(
+                        ArchivedChat.chat_session_id == Message.chat_session_id,
+                        Message.id <= ArchivedChat.last_message_id
+                    )
+                )
+                .limit(batch_size)
+            )
+            message_ids = result.scalars().all()
+            if not message_ids:
+                return deleted
+            await db.execute(delete(Message).where(Message.id.in_(message_ids)))
+            await db.commit()
+        deleted += len(message_ids)
+        # Let request handlers run between batches
+        await asyncio.sleep(0)
+
+
+async def _archive_batch(cutoff: datetime, batch_size: int) -> int:
+    # Read phase: a short read-only transaction
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ChatSession)
+            .outerjoin(ArchivedChat, ArchivedChat.chat_session_id == ChatSession.id)
+            .where(
+                and_(
+                    ChatSession.status == ChatStatus.CLOSED,
+                    ChatSession.closed_at < cutoff,
+                    ArchivedChat.chat_session_id.is_(None)
+                )
+            )
+            .order_by(ChatSession.id)
+            .limit(batch_size)
+        )
+        chats = result.scalars().all()
+        if not chats:
+            return 0
+
+        result = await db.execute(
+            select(Message)
+            .where(Message.chat_session_id.in_([chat.id for chat in chats]))
+            .order_by(Message.id)
+        )
+        messages_by_chat: Dict[int, List[Message]] = {}
+        for message in result.scalars().all():
+            messages_by_chat.setdefault(message.chat_session_id, []).append(message)
+
+    # File phase: append and fsync before the database forgets anything
+    members = []
+    for chat in chats:
+        messages = messages_by_chat.get(chat.id, [])
+        lines = [_chat_record(chat)] + [_message_record(m) for m in messages]
+        data = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines).encode("utf-8")
+        members.append((chat.id, _archive_file_name(chat.closed_at), _compress(data)))
+    locations = await asyncio.to_thread(_append_members, members)
+
+    # Index phase: once committed, reads are served from the archive
+    async with AsyncSessionLocal() as db:
+        for chat in chats:
+            file_name, offset, length = locations[chat.id]
+            messages = messages_by_chat.get(chat.id, [])
+            db.add(ArchivedChat(
+                chat_session_id=chat.id,
+                archive_path=file_name,
+                offset=offset,
+                length=length,
+                message_count=len(messages),
+                last_message_id=messages[-1].id if messages else 0
+            ))
+        await db.commit()
+
+    return len(chats)
+
+
+async def archive_closed_chats(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE
+) -> dict:
+    """
+    Move the messages of chats closed more than `older_than_days` ago into
+    compressed NDJSON archive files. Chat rows stay, since reviews and
+    transfers reference them; their transcripts are read back from the archive.
+    Returns without doing anything while another run holds the archive lock.
+    """
+    owner = uuid.uuid4().hex
+    if not await _lock(owner):
+        return {"chats_archived": 0, "messages_deleted": 0, "locked": True}
+
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = 0
+    try:
+        deleted = await purge_archived_messages()
+
+        # Renewing before each batch also stops a run whose lock was taken over
+        while await _lock(owner):
+            count = await _archive_batch(cutoff, batch_size)
+            if not count:
+                break
+            archived += count
+            deleted += await purge_archived_messages()
+    finally:
+        await _unlock(owner)
+
+    return {"chats_archived": archived, "messages_deleted": deleted, "locked": False}
+
+
+async def _lock(owner: str) -> bool:
+    """Take or renew the archive lock; False while another live run holds it"""
+    now = datetime.utcnow()
+    locked_until = now + timedelta(seconds=ARCHIVE_LOCK_SECONDS)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(MaintenanceLock)
+            .where(
+                and_(
+                    MaintenanceLock.name == _LOCK_NAME,
+                    or_(MaintenanceLock.owner == owner, MaintenanceLock.locked_until < now)
+                )
+            )
+            .values(owner=owner, locked_until=locked_until)
+        )
+        if result.rowcount == 0:
+            # No lock row yet, or a live one; the primary key lets only one insert win
+            db.add(MaintenanceLock(name=_LOCK_NAME, owner=owner, locked_until=locked_until))
+        try:
+            await db.commit()
+        except IntegrityError:
+            return False
+    return True
+
+
+async def _unlock(owner: str):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            delete(MaintenanceLock).where(and_(MaintenanceLock.name == _LOCK_NAME, MaintenanceLock.owner == owner))
+        )
+        await db.commit()
+
+
+class ChatArchiver:
+    """Periodically archives old closed chats from inside the API process"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the archiver if ARCHIVE_INTERVAL_HOURS is set"""
+        if self._task is None and ARCHIVE_INTERVAL_HOURS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the archiver"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(ARCHIVE_INTERVAL_HOURS * 3600)
+            try:
+                result = await archive_closed_chats()
+                if result["locked"]:
+                    print("Chat archiver skipped: another archive run holds the lock")
+                    continue
+                print(f"Archived {result['chats_archived']} chats, deleted {result['messages_deleted']} messages")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Chat archiver error: {e}")
+
+
+# Global instance
+chat_archiver = ChatArchiver()
@@ -1,14 +1,28 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, asc
+from sqlalchemy import select, update, exists, and_, func, asc
 from sqlalchemy.orm import selectinload
 from app.models.models import User, ChatSession, Department, UserRole, AgentStatus, ChatStatus
+from app.services.outbox import enqueue_agent_notification, enqueue_chat_broadcast
+from app.services.wait_time_estimator import wait_time_estimator, handle_seconds
+from app.services.metrics import Histogram
+from app.services.tracing import traced
+from app.services.scorecards import record_transfer
+from app.services.jobs import job_queue, enqueue_job
 from app.services.websocket_manager import manager
+from app.services.supervisor import supervisor_hub
+from app.database import AsyncSessionLocal
 from typing import Optional, Tuple
+from datetime import datetime
 
-# Average chat duration in minutes (for wait time estimation)
-AVERAGE_CHAT_DURATION_MINUTES = 5
+time_to_assignment = Histogram(
+    "chat_time_to_assignment_seconds",
+    "Time from a chat's creation until its first agent is assigned",
+    ("department",),
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+)
 
 
+@traced()
 async def get_customer_care_department(db: AsyncSession) -> Optional[Department]:
     """Get the customer care department"""
     result = await db.execute(
@@ -19,16 +33,26 @@ async def get_customer_care_department(db: AsyncSession) -> Optional[Department]
     return result.scalar_one_or_none()
 
 
-async def get_queue_position(db: AsyncSession, chat_session_id: int) -> Tuple[int, int]:
+@traced()
+async def get_queue_position(
+    db: AsyncSession,
+    chat_session_id: int,
+    chat: Optional[ChatSession] = None,
+    agent_stats: Optional[Tuple[int, int]] = None
+) -> Tuple[int, int]:
     """
     Get the queue position for a waiting chat session.
     Returns (position, estimated_wait_minutes)
+
+    Callers that already loaded the chat or the department agent stats can
+    pass them in to avoid re-querying.
     """
     # Get the chat session
-    result = await db.execute(
-        select(ChatSession).where(ChatSession.id == chat_session_id)
-    )
-    chat = result.scalar_one_or_none()
+    if chat is None:
+        result = await db.execute(
+            select(ChatSession).where(ChatSession.id == chat_session_id)
+        )
+        chat = result.scalar_one_or_none()
 
     if not chat or chat.status != ChatStatus.WAITING:
         return (0, 0)
@@ -45,57 +69,39 @@ async def get_queue_position(db: AsyncSession, chat_session_id: int) -> Tuple[in
     )
     position = (count_result.scalar() or 0) + 1
 
-    # Get available agent count for wait time estimation
-    agents_result = await db.execute(
-        select(func.count(User.id)).where(
-            and_(
-                User.department_id == chat.department_id,
-                User.role == UserRole.AGENT,
-                User.is_active == True,
-                User.agent_status == AgentStatus.AVAILABLE
-            )
-        )
-    )
-    available_agents = agents_result.scalar() or 0
+    # Get live agent counts for wait time estimation
+    if agent_stats is None:
+        agent_stats = await get_department_agent_stats(db, chat.department_id)
+    available_agents, busy_agents = agent_stats
 
-    # Estimate wait time
-    if available_agents > 0:
-        estimated_wait = (position // max(available_agents, 1)) * AVERAGE_CHAT_DURATION_MINUTES
-    else:
-        estimated_wait = position * AVERAGE_CHAT_DURATION_MINUTES
+    estimated_wait = wait_time_estimator.estimate_wait_minutes(
+        chat.department_id, position, available_agents, busy_agents
+    )
 
     return (position, estimated_wait)
 
 
+@traced()
 async def get_department_agent_stats(db: AsyncSession, department_id: int) -> Tuple[int, int]:
     """Get count of available and busy agents in a department"""
-    available_result = await db.execute(
-        select(func.count(User.id)).where(
-            and_(
-                User.department_id == department_id,
-                User.role == UserRole.AGENT,
-                User.is_active == True,
-                User.agent_status == AgentStatus.AVAILABLE
-            )
-        )
-    )
-    available = available_result.scalar() or 0
-
-    busy_result = await db.execute(
-        select(func.count(User.id)).where(
+    result = await db.execute(
+        select(User.agent_status, func.count(User.id))
+        .where(
             and_(
                 User.department_id == department_id,
                 User.role == UserRole.AGENT,
                 User.is_active == True,
-                User.agent_status == AgentStatus.BUSY
+                User.agent_status.in_([AgentStatus.AVAILABLE, AgentStatus.BUSY])
             )
         )
+        .group_by(User.agent_status)
     )
-    busy = busy_result.scalar() or 0
+    counts = dict(result.all())
 
-    return (available, busy)
+    return (counts.get(AgentStatus.AVAILABLE, 0), counts.get(AgentStatus.BUSY, 0))
 
 
+@traced()
 async def get_available_agent_in_department(db: AsyncSession, department_id: int) -> Optional[User]:
     """
     Find an available agent in a department who is:
@@ -139,6 +145,7 @@ async def get_available_agent_in_department(db: AsyncSession, department_id: int
     return None
 
 
+@traced()
 async def agent_has_active_chat(db: AsyncSession, agent_id: int) -> bool:
     """Check if agent already has an active chat"""
     result = await db.execute(
@@ -153,6 +160,35 @@ async def agent_has_active_chat(db: AsyncSession, agent_id: int) -> bool:
     return count > 0
 
 
+async def set_status_if_free(db: AsyncSession, agent_id: int, status: AgentStatus) -> bool:
+    """
+    Set an agent's status unless they are OFFLINE or hold an ACTIVE chat.
+
+    For work that runs after the request that caused it: by then the agent
+    may have claimed or accepted another chat, or gone offline, and that
+    stands. A single conditional UPDATE, so a claim cannot slip in between
+    the check and the write; the caller commits.
+    """
+    result = await db.execute(
+        update(User)
+        .where(
+            and_(
+                User.id == agent_id,
+                User.agent_status != AgentStatus.OFFLINE,
+                ~exists().where(
+                    and_(
+                        ChatSession.assigned_agent_id == User.id,
+                        ChatSession.status == ChatStatus.ACTIVE
+                    )
+                )
+            )
+        )
+        .values(agent_status=status)
+    )
+    return result.rowcount > 0
+
+
+@traced()
 async def assign_chat_to_agent(
     db: AsyncSession,
     chat_session: ChatSession,
@@ -160,6 +196,12 @@ async def assign_chat_to_agent(
     set_agent_busy: bool = True
 ) -> ChatSession:
     """Assign a chat session to an agent and optionally set agent status to BUSY"""
+    # A transferred chat was timed at its first assignment; timing it again from
+    # creation would count its whole first handle time as waiting
+    waited = None if chat_session.transferred_from else handle_seconds(chat_session.created_at, datetime.utcnow())
+    if waited is not None:
+        time_to_assignment.labels(chat_session.department_id).observe(max(waited, 0.0))
+
     chat_session.assigned_agent_id = agent.id
     chat_session.status = ChatStatus.ACTIVE
 
@@ -167,6 +209,21 @@ async def assign_chat_to_agent(
     if set_agent_busy:
         agent.agent_status = AgentStatus.BUSY
 
+    # Notify the agent about the new assignment and the customer that the
+    # agent has joined; both are sent by the outbox relay after commit
+    enqueue_agent_notification(db, agent.id, {
+        "type": "new_assignment",
+        "chat_session_id": chat_session.id,
+        "customer_name": chat_session.customer_name,
+        "customer_email": chat_session.customer_email
+    })
+    enqueue_chat_broadcast(db, chat_session.id, {
+        "type": "agent_assigned",
+        "chat_session_id": chat_session.id,
+        "agent_name": agent.full_name or agent.username,
+        "message": f"{agent.full_name or agent.username} has joined the chat."
+    })
+
     await db.commit()
 
     # Re-fetch with relationships loaded
@@ -177,37 +234,14 @@ async def assign_chat_to_agent(
             selectinload(ChatSession.assigned_agent)
         )
         .where(ChatSession.id == chat_session.id)
+        .execution_options(populate_existing=True)
     )
     chat_session = result.scalar_one_or_none()
 
-    # Notify the agent about the new assignment
-    try:
-        await manager.notify_agent(agent.id, {
-            "type": "new_assignment",
-            "chat_session_id": chat_session.id,
-            "customer_name": chat_session.customer_name,
-            "customer_email": chat_session.customer_email
-        })
-    except Exception as e:
-        print(f"Could not notify agent: {e}")
-
-    # Notify the customer that agent has joined
-    try:
-        await manager.broadcast_to_chat(
-            {
-                "type": "agent_assigned",
-                "chat_session_id": chat_session.id,
-                "agent_name": agent.full_name or agent.username,
-                "message": f"{agent.full_name or agent.username} has joined the chat."
-            },
-            chat_session.id
-        )
-    except Exception as e:
-        print(f"Could not notify customer: {e}")
-
     return chat_session
 
 
+@traced()
 async def auto_assign_chat(db: AsyncSession, chat_session_id: int) -> Optional[ChatSession]:
     """
     Automatically assign a chat to an available agent
@@ -237,23 +271,18 @@ async def auto_assign_chat(db: AsyncSession, chat_session_id: int) -> Optional[C
     else:
         # No agent available, chat remains in WAITING status
         chat_session.status = ChatStatus.WAITING
-        await db.commit()
 
         # Notify customer they're in queue
-        position, wait_time = await get_queue_position(db, chat_session_id)
-        try:
-            await manager.broadcast_to_chat(
-                {
-                    "type": "queue_status",
-                    "chat_session_id": chat_session_id,
-                    "position": position,
-                    "estimated_wait_minutes": wait_time,
-                    "message": f"All agents are currently busy. You are #{position} in queue. Estimated wait: {wait_time} minutes."
-                },
-                chat_session_id
-            )
-        except Exception as e:
-            print(f"Could not notify customer of queue status: {e}")
+        position, wait_time = await get_queue_position(db, chat_session_id, chat=chat_session)
+        enqueue_chat_broadcast(db, chat_session_id, {
+            "type": "queue_status",
+            "chat_session_id": chat_session_id,
+            "position": position,
+            "estimated_wait_minutes": wait_time,
+            "message": f"All agents are currently busy. You are #{position} in queue. Estimated wait: {wait_time} minutes."
+        })
+
+        await db.commit()
 
         # Re-fetch with relationships loaded
         result = await db.execute(
@@ -267,6 +296,7 @@ async def auto_assign_chat(db: AsyncSession, chat_session_id: int) -> Optional[C
         return result.scalar_one_or_none()
 
 
+@traced()
 async def get_next_waiting_chat(db: AsyncSession, department_id: int) -> Optional[ChatSession]:
     """Get the oldest waiting chat in a department (FIFO)"""
     result = await db.execute(
@@ -287,6 +317,7 @@ async def get_next_waiting_chat(db: AsyncSession, department_id: int) -> Optiona
     return result.scalar_one_or_none()
 
 
+@traced()
 async def claim_chat_with_lock(
     db: AsyncSession,
     chat_session_id: int,
@@ -330,6 +361,7 @@ async def claim_chat_with_lock(
     return await assign_chat_to_agent(db, chat_session, agent)
 
 
+@traced()
 async def handle_chat_close_assignment(
     db: AsyncSession,
     agent_id: int,
@@ -339,44 +371,37 @@ async def handle_chat_close_assignment(
     Handle auto-assignment when an agent closes a chat.
     Finds the next waiting chat and sends notification to agent.
     Agent stays BUSY until they accept/decline or if no waiting chats.
+    Does nothing if the agent has gone offline or taken another chat since.
     """
-    agent_result = await db.execute(
-        select(User).where(User.id == agent_id)
-    )
-    agent = agent_result.scalar_one_or_none()
-
-    if not agent:
-        return None
-
     # Find next waiting chat
     next_chat = await get_next_waiting_chat(db, department_id)
 
-    if next_chat:
-        # Keep agent BUSY - they'll get the notification with timer
-        # Only becomes AVAILABLE after accepting (then busy again) or declining (offline)
-        agent.agent_status = AgentStatus.BUSY
-        await db.commit()
+    # Keep agent BUSY - they'll get the notification with timer
+    # Only becomes AVAILABLE after accepting (then busy again) or declining (offline)
+    status = AgentStatus.BUSY if next_chat else AgentStatus.AVAILABLE
+    if not await set_status_if_free(db, agent_id, status):
+        await db.rollback()
+        return None
 
+    if next_chat:
         # Notify agent of incoming assignment with 10-second timer
-        try:
-            await manager.notify_agent(agent_id, {
-                "type": "incoming_assignment",
-                "chat_session_id": next_chat.id,
-                "customer_name": next_chat.customer_name,
-                "customer_email": next_chat.customer_email,
-                "timeout_seconds": 10,
-                "message": f"New customer waiting: {next_chat.customer_name}. Accept within 10 seconds or change your status."
-            })
-        except Exception as e:
-            print(f"Could not notify agent of incoming assignment: {e}")
-    else:
-        # No waiting chats - set agent to AVAILABLE
-        agent.agent_status = AgentStatus.AVAILABLE
-        await db.commit()
+        enqueue_agent_notification(db, agent_id, {
+            "type": "incoming_assignment",
+            "chat_session_id": next_chat.id,
+            "customer_name": next_chat.customer_name,
+            "customer_email": next_chat.customer_email,
+            "timeout_seconds": 10,
+            "message": f"New customer waiting: {next_chat.customer_name}. Accept within 10 seconds or change your status."
+        })
+
+    await db.commit()
+    # The bulk UPDATE bypasses the ORM events that feed the supervisor stream
+    supervisor_hub.set_agent_status([agent_id], status)
 
     return next_chat
 
 
+@traced()
 async def transfer_chat(
     db: AsyncSession,
     chat_session_id: int,
@@ -420,37 +445,62 @@ async def transfer_chat(
     chat_session.status = ChatStatus.WAITING
     chat_session.transferred_from = chat_session_id
 
-    await db.commit()
+    # Send system message about transfer
+    transfer_message = f"Chat transferred from {old_dept_name} to {target_dept.name}."
+    if reason:
+        transfer_message += f" Reason: {reason}"
+
+    enqueue_chat_broadcast(db, chat_session_id, {
+        "type": "system_message",
+        "chat_session_id": chat_session_id,
+        "content": transfer_message,
+        "is_system_message": True
+    })
 
-    # Set previous agent back to AVAILABLE
     if old_agent_id:
-        agent_result = await db.execute(
-            select(User).where(User.id == old_agent_id)
-        )
-        old_agent = agent_result.scalar_one_or_none()
-        if old_agent:
-            old_agent.agent_status = AgentStatus.AVAILABLE
-            await db.commit()
+        await record_transfer(db, old_agent_id)
+        # Set previous agent back to AVAILABLE after the response
+        enqueue_job(db, "release_agent", agent_id=old_agent_id)
+
+    await db.commit()
 
     # Try to auto-assign in new department
-    chat_session = await auto_assign_chat(db, chat_session_id)
+    return await auto_assign_chat(db, chat_session_id)
 
-    # Send system message about transfer
-    transfer_message = f"Chat transferred from {old_dept_name} to {target_dept.name}."
-    if reason:
-        transfer_message += f" Reason: {reason}"
 
-    try:
-        await manager.broadcast_to_chat(
-            {
-                "type": "system_message",
-                "chat_session_id": chat_session_id,
-                "content": transfer_message,
-                "is_system_message": True
-            },
-            chat_session_id
-        )
-    except Exception as e:
-        print(f"Could not broadcast transfer message: {e}")
+# Jobs run by the job queue after the request that queued them has returned
 
-    return chat_session
+@job_queue.handler("chat_close_assignment")
+async def _chat_close_assignment_job(agent_id: int, department_id: int):
+    async with AsyncSessionLocal() as db:
+        await handle_chat_close_assignment(db, agent_id, department_id)
+
+
+@job_queue.handler("auto_assign_chat")
+async def _auto_assign_chat_job(chat_session_id: int):
+    async with AsyncSessionLocal() as db:
+        await auto_assign_chat(db, chat_session_id)
+
+
+@job_queue.handler("release_agent")
+async def _release_agent_job(agent_id: int):
+    async with AsyncSessionLocal() as db:
+        if await set_status_if_free(db, agent_id, AgentStatus.AVAILABLE):
+            await db.commit()
+            supervisor_hub.set_agent_status([agent_id], AgentStatus.AVAILABLE)
+
+
+@job_queue.handler("announce_agent_joined")
+async def _announce_agent_joined_job(chat_session_id: int, agent_id: int):
+    async with AsyncSessionLocal() as db:
+        agent = await db.get(User, agent_id)
+    name = (agent.full_name or agent.username) if agent else None
+    await manager.broadcast_to_chat(
+        {
+            "type": "agent_assigned",
+            "chat_session_id": chat_session_id,
+            "agent_name": name or "Agent",
+            "message": f"{name or 'An agent'} has joined the chat."
+        },
+        chat_session_id
+    )
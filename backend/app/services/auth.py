@@ -1,10 +1,11 @@
 from datetime import datetime, timedelta
 from typing import Optional
-from jose import JWTError, jwt
-import bcrypt
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from app.models.models import User
+from app.database import get_db
+from app.models.models import User, UserRole
 from app.schemas.schemas import TokenData
 import os
 from dotenv import load_dotenv
@@ -15,18 +16,26 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+# jose (with cryptography) and bcrypt are imported on first use; most
+# requests never touch them, so they are kept off the cold-start path
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
+    import bcrypt
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
 
 def get_password_hash(password: str) -> str:
+    import bcrypt
     salt = bcrypt.gensalt()
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    from jose import jwt
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -49,3 +58,41 @@ async def authenticate_user(db: AsyncSession, username: str, password: str) -> O
     if not verify_password(password, user.hashed_password):
         return None
     return user
+
+
+async def get_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    db: AsyncSession = Depends(get_db)
+) -> User:
+    """Dependency resolving the bearer token to an active user"""
+    from jose import JWTError, jwt
+
+    unauthorized = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    if credentials is None:
+        raise unauthorized
+    try:
+        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        token_data = TokenData(username=payload.get("sub"))
+    except JWTError:
+        raise unauthorized
+    if token_data.username is None:
+        raise unauthorized
+
+    user = await get_user_by_username(db, token_data.username)
+    if user is None or not user.is_active:
+        raise unauthorized
+    return user
+
+
+async def get_current_admin(user: User = Depends(get_current_user)) -> User:
+    """Dependency allowing only admins through"""
+    if user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return user
@@ -0,0 +1,170 @@
+from typing import Deque, List, Optional
+from collections import OrderedDict, deque
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_
+from app.models.models import Message
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Replayable events kept in memory per active chat
+CHAT_REPLAY_BUFFER_SIZE = int(os.getenv("CHAT_REPLAY_BUFFER_SIZE", "200"))
+
+# Chats with a replay buffer; the least recently used one is dropped beyond this
+CHAT_REPLAY_MAX_CHATS = int(os.getenv("CHAT_REPLAY_MAX_CHATS", "10000"))
+
+
+def message_event(message: Message) -> dict:
+    """
+    WebSocket event for a persisted message. The message id doubles as the
+    chat's sequence number: ids only grow, so they are monotonic per chat.
+    """
+    return {
+        "type": "message",
+        "seq": message.id,
+        "message_id": message.id,
+        "chat_session_id": message.chat_session_id,
+        "sender_name": message.sender_name,
+        "content": message.content,
+        "is_system_message": message.is_system_message,
+        "created_at": str(message.created_at)
+    }
+
+
+class _ReplayBuffer:
+    __slots__ = ("events", "complete_after", "evicted_up_to")
+
+    def __init__(self, complete_after: Optional[int] = None):
+        self.events: Deque[dict] = deque()
+        # Every event with seq > complete_after is in `events`; None if unknown
+        self.complete_after = complete_after
+        # Highest seq dropped from the front of `events`
+        self.evicted_up_to = 0
+
+
+class ChatReplayBuffer:
+    """
+    Ring buffer of recent persisted events per active chat.
+
+    Lets a reconnecting client resume from the last sequence number it saw.
+    A buffer knows which range it covers completely; requests outside that
+    range fall back to the database, and the result seeds the buffer so the
+    next reconnect for the same chat is served from memory.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = CHAT_REPLAY_BUFFER_SIZE,
+        max_chats: int = CHAT_REPLAY_MAX_CHATS
+    ):
+        self.buffer_size = buffer_size
+        self.max_chats = max_chats
+
+        # Maps: chat_session_id -> replay buffer, in least recently used order
+        self.buffers: "OrderedDict[int, _ReplayBuffer]" = OrderedDict()
+
+        self.replay_hits = 0
+        self.replay_misses = 0
+
+    def _get(self, chat_session_id: int, create: bool = False) -> Optional[_ReplayBuffer]:
+        buffer = self.buffers.get(chat_session_id)
+        if buffer is not None:
+            self.buffers.move_to_end(chat_session_id)
+        elif create:
+            buffer = self.buffers[chat_session_id] = _ReplayBuffer()
+            while len(self.buffers) > self.max_chats:
+                self.buffers.popitem(last=False)
+        return buffer
+
+    def _trim(self, buffer: _ReplayBuffer):
+        while len(buffer.events) > self.buffer_size:
+            evicted = buffer.events.popleft()
+            buffer.evicted_up_to = max(buffer.evicted_up_to, evicted["seq"])
+            if buffer.complete_after is not None:
+                buffer.complete_after = max(buffer.complete_after, evicted["seq"])
+
+    def start_chat(self, chat_session_id: int):
+        """Create the buffer for a new chat, which has no history yet"""
+        self.buffers[chat_session_id] = _ReplayBuffer(complete_after=0)
+        self.buffers.move_to_end(chat_session_id)
+        while len(self.buffers) > self.max_chats:
+            self.buffers.popitem(last=False)
+
+    def record(self, chat_session_id: int, event: dict):
+        """Append a committed event carrying a `seq`"""
+        buffer = self._get(chat_session_id, create=True)
+        buffer.events.append(event)
+        self._trim(buffer)
+
+    def events_after(self, chat_session_id: int, seq: int) -> Optional[List[dict]]:
+        """Events newer than `seq`, or None if the buffer cannot vouch for them"""
+        buffer = self._get(chat_session_id)
+        if buffer is None or buffer.complete_after is None or seq < buffer.complete_after:
+            self.replay_misses += 1
+            return None
+        self.replay_hits += 1
+        return [event for event in buffer.events if event["seq"] > seq]
+
+    def seed(self, chat_session_id: int, seq: int, events: List[dict]):
+        """
+        Merge every event after `seq`, as loaded from the database, into the
+        buffer. Events recorded since the query are kept, so the buffer then
+        covers everything after `seq` unless it evicted some of them meanwhile.
+        """
+        buffer = self._get(chat_session_id, create=True)
+        db_max = events[-1]["seq"] if events else seq
+
+        merged = {event["seq"]: event for event in events}
+        for event in buffer.events:
+            merged.setdefault(event["seq"], event)
+        buffer.events = deque(merged[key] for key in sorted(merged))
+
+        if buffer.evicted_up_to <= db_max:
+            if buffer.complete_after is None or seq < buffer.complete_after:
+                buffer.complete_after = seq
+        self._trim(buffer)
+
+    async def replay(self, db: AsyncSession, chat_session_id: int, seq: int) -> Optional[List[dict]]:
+        """
+        Events a client that last saw `seq` has missed, from memory when
+        possible and otherwise from the messages table. Returns None when more
+        than a buffer's worth was missed and the client should reload instead.
+        """
+        events = self.events_after(chat_session_id, seq)
+        if events is not None:
+            return events
+
+        result = await db.execute(
+            select(Message)
+            .where(
+                and_(
+                    Message.chat_session_id == chat_session_id,
+                    Message.id > seq
+                )
+            )
+            .order_by(Message.id)
+            .limit(self.buffer_size + 1)
+        )
+        messages = result.scalars().all()
+        if len(messages) > self.buffer_size:
+            return None
+
+        events = [message_event(m) for m in messages]
+        self.seed(chat_session_id, seq, events)
+        return events
+
+    def close_chat(self, chat_session_id: int):
+        """Drop the buffer of a closed chat"""
+        self.buffers.pop(chat_session_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "replay_buffers": len(self.buffers),
+            "replay_hits": self.replay_hits,
+            "replay_misses": self.replay_misses
+        }
+
+
+# Global instance
+chat_history = ChatReplayBuffer()
@@ -0,0 +1,73 @@
+from typing import Optional
+from app.services.websocket_manager import manager, AGENT_CONNECTION
+from app.services.presence import presence
+import asyncio
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How often every connected socket is pinged
+WS_HEARTBEAT_INTERVAL_SECONDS = float(os.getenv("WS_HEARTBEAT_INTERVAL_SECONDS", "25"))
+
+# Sockets that send nothing (not even a pong) for this long are reaped
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "75"))
+
+# Per-socket limit on a single ping send
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+
+
+class HeartbeatScheduler:
+    """
+    One background task that pings every WebSocket and reaps dead ones.
+
+    Clients answer pings with a pong frame; any received frame refreshes the
+    socket's activity time. Sockets that stay silent past the idle timeout, or
+    whose ping cannot be sent, are closed and dropped from the manager.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the scheduler on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the scheduler"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL_SECONDS)
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Heartbeat scheduler error: {e}")
+
+    async def tick(self):
+        """Reap idle sockets, then ping the rest"""
+        for websocket in manager.idle_connections(WS_IDLE_TIMEOUT_SECONDS):
+            await self._reap(websocket)
+
+        for websocket in await manager.ping_all(WS_SEND_TIMEOUT_SECONDS):
+            await self._reap(websocket)
+
+    async def _reap(self, websocket):
+        owner = await manager.reap(websocket)
+        if owner and owner[0] == AGENT_CONNECTION:
+            presence.agent_disconnected(owner[1])
+
+
+# Global instance
+heartbeat_scheduler = HeartbeatScheduler()
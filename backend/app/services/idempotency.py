@@ -0,0 +1,219 @@
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import time
+from dotenv import load_dotenv
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+from app.services.metrics import Counter, Gauge
+from app.services.rate_limit import client_ip
+
+load_dotenv()
+
+IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+
+# How long a key's response is replayed, and how many keys are kept at most
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+
+# Larger responses are sent but not kept for replay
+IDEMPOTENCY_MAX_BODY_BYTES = int(os.getenv("IDEMPOTENCY_MAX_BODY_BYTES", "65536"))
+
+MAX_KEY_LENGTH = 255
+
+# 4xx answers that may change on retry (timeouts, conflicts, rate limits) are never replayed
+_TRANSIENT_STATUSES = {408, 409, 425, 429}
+
+idempotent_requests = Counter(
+    "idempotent_requests_total",
+    "POST requests carrying an Idempotency-Key, by outcome (executed, replayed, mismatch)",
+    ("outcome",)
+)
+
+
+class _Entry:
+    __slots__ = ("fingerprint", "expires_at", "done", "response")
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        # Set once the first request finished; response is None if it failed
+        self.done = asyncio.Event()
+        self.response: Optional[Tuple[int, List[Tuple[bytes, bytes]], bytes]] = None
+
+
+class IdempotencyStore:
+    """
+    Responses by idempotency key, kept for IDEMPOTENCY_TTL_SECONDS and at
+    most IDEMPOTENCY_MAX_KEYS of them. Every entry lives equally long, so
+    insertion order is expiry order and expired keys are trimmed from the
+    front, passing over entries whose request is still running.
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._entries: Dict[str, _Entry] = {}
+
+    def begin(self, key: str, fingerprint: str) -> Tuple[_Entry, bool]:
+        """The key's entry, and whether it was just created (the caller must then run the request)"""
+        now = time.monotonic()
+        self._trim(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry, False
+        entry = self._entries[key] = _Entry(fingerprint, now + self.ttl)
+        return entry, True
+
+    def complete(self, key: str, entry: _Entry, response: Optional[tuple]):
+        """Keep the response for replay, or forget the key (response None) so a retry runs again"""
+        entry.response = response
+        if response is None and self._entries.get(key) is entry:
+            del self._entries[key]
+        entry.done.set()
+
+    def _trim(self, now: float):
+        entries = self._entries
+        # Room for the key about to be added
+        excess = len(entries) - self.max_keys + 1
+        stale = []
+        for key, entry in entries.items():
+            if entry.expires_at > now and excess <= 0:
+                break
+            # A request still running keeps its entry, or its retries would run it again
+            if not entry.done.is_set():
+                continue
+            stale.append(key)
+            excess -= 1
+        for key in stale:
+            del entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def _storable(status_code: int) -> bool:
+    """Successes and 4xx answers a retry would get again; never 5xx or transient 4xx"""
+    return 200 <= status_code < 300 or (400 <= status_code < 500 and status_code not in _TRANSIENT_STATUSES)
+
+
+def _client_identity(scope) -> str:
+    """Who sent the request: a digest of its credentials, else its address"""
+    authorization = dict(scope["headers"]).get(b"authorization")
+    if authorization:
+        return "auth:" + hashlib.sha256(authorization).hexdigest()[:32]
+    return "ip:" + client_ip(HTTPConnection(scope))
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware making POST requests with an `Idempotency-Key` header safe
+    to retry. The first request with a key runs; later ones with the same key,
+    method and path wait for it if it is still running, then get its response
+    replayed without touching the route or the database. Keys are scoped to
+    the client (its credentials, else its address), so one client cannot
+    replay another's response. A key reused with a different body is refused
+    with 422. Only successes and 4xx answers a retry would get again are
+    kept; after a server error, conflict or rate limit the retry runs again.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not IDEMPOTENCY_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        key = dict(scope["headers"]).get(b"idempotency-key")
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": "Idempotency-Key is too long"}, status_code=400)
+            await response(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        store_key = f"{_client_identity(scope)}:{scope['path']}:{key.decode('latin-1')}"
+
+        while True:
+            entry, created = idempotency_store.begin(store_key, fingerprint)
+            if created:
+                break
+            if entry.fingerprint != fingerprint:
+                idempotent_requests.labels("mismatch").inc()
+                response = JSONResponse(
+                    {"detail": "Idempotency-Key was already used with a different request"},
+                    status_code=422
+                )
+                await response(scope, receive, send)
+                return
+            await entry.done.wait()
+            if entry.response is not None:
+                idempotent_requests.labels("replayed").inc()
+                status_code, headers, cached_body = entry.response
+                await send({
+                    "type": "http.response.start",
+                    "status": status_code,
+                    "headers": headers + [(b"idempotent-replayed", b"true")]
+                })
+                await send({"type": "http.response.body", "body": cached_body})
+                return
+            # The first attempt failed; run this one instead
+
+        idempotent_requests.labels("executed").inc()
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start = None
+        chunks = []
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                chunk = message.get("body", b"")
+                chunks.append(chunk)
+                size += len(chunk)
+            await send(message)
+
+        response = None
+        try:
+            await self.app(scope, replay_receive, send_wrapper)
+            if start is not None and _storable(start["status"]) and size <= IDEMPOTENCY_MAX_BODY_BYTES:
+                response = (start["status"], list(start.get("headers", [])), b"".join(chunks))
+        finally:
+            idempotency_store.complete(store_key, entry, response)
+
+
+# Global instance
+idempotency_store = IdempotencyStore()
+
+idempotency_keys = Gauge(
+    "idempotency_keys",
+    "Idempotency keys whose responses are kept for replay",
+    callback=lambda: len(idempotency_store)
+)
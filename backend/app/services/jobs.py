@@ -0,0 +1,374 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, and_, or_, event
+from sqlalchemy.orm import Session, aliased
+from app.database import AsyncSessionLocal
+from app.models.models import Job
+from app.services.metrics import Counter, Gauge, Histogram
+from datetime import datetime, timedelta
+import asyncio
+import itertools
+import json
+import os
+import time
+import uuid
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "memory" (lost on restart) or "database" (kept in the jobs table until done)
+JOB_STORE = os.getenv("JOB_STORE", "memory").lower()
+
+# Jobs running at once
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "0.5"))
+
+# How long shutdown waits for queued jobs before leaving them (to the next start, when durable)
+JOB_DRAIN_SECONDS = float(os.getenv("JOB_DRAIN_SECONDS", "10"))
+
+# How often the database store looks for due retries
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1.0"))
+
+# How long a process holds the jobs it claimed from the database store. The
+# lease is renewed while they are queued or running; once it lapses (the
+# process died) another process takes them over
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_FAILED = "failed"
+
+# Session.info key holding jobs to queue once the transaction commits
+_PENDING_KEY = "jobs_pending"
+
+jobs_finished = Counter(
+    "jobs_total",
+    "Background jobs finished, by job and outcome (succeeded, retried, failed)",
+    ("job", "outcome")
+)
+job_duration = Histogram(
+    "job_duration_seconds",
+    "Time a background job took to run",
+    ("job",)
+)
+
+
+class _QueuedJob:
+    __slots__ = ("name", "kwargs", "priority", "attempts", "job_id")
+
+    def __init__(self, name: str, kwargs: dict, priority: int, attempts: int = 0, job_id: Optional[int] = None):
+        self.name = name
+        self.kwargs = kwargs
+        self.priority = priority
+        self.attempts = attempts
+        # Row in the jobs table, in the database store
+        self.job_id = job_id
+
+
+class JobQueue:
+    """
+    In-process queue for work that can happen after the response is sent.
+
+    Jobs are registered handlers called with JSON-serializable keyword
+    arguments, so they can be stored. JOB_CONCURRENCY workers take them in
+    priority order (lower first, FIFO within a priority); failures are
+    retried with exponential backoff up to JOB_MAX_ATTEMPTS. With
+    JOB_STORE=database jobs are rows written in the caller's transaction.
+    Any number of processes can share the table: each claims rows with a
+    conditional UPDATE that leases them for JOB_LEASE_SECONDS, and rows
+    whose lease lapsed (a crashed process) are claimed again.
+    """
+
+    def __init__(self, durable: bool = JOB_STORE == "database"):
+        self.durable = durable
+        self.handlers: Dict[str, Callable[..., Awaitable[None]]] = {}
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._workers: List[asyncio.Task] = []
+        self._feeder: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # Retries waiting out their backoff, in the memory store
+        self._retry_timers: List[asyncio.TimerHandle] = []
+        # Lease holder name and the rows this process holds, in the database store
+        self._owner = uuid.uuid4().hex
+        self._held: Set[int] = set()
+        self._renewed_at = 0.0
+
+    def handler(self, name: str):
+        """Register the decorated coroutine function as the job `name`"""
+        def register(func):
+            self.handlers[name] = func
+            return func
+        return register
+
+    def start(self):
+        """Start the workers (and the database feeder) on the running event loop"""
+        if self._workers:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(JOB_CONCURRENCY)]
+        if self.durable:
+            self._wakeup = asyncio.Event()
+            self._feeder = asyncio.create_task(self._feed())
+
+    async def stop(self):
+        """Let queued jobs finish for up to JOB_DRAIN_SECONDS, then stop the workers"""
+        if not self._workers:
+            return
+        if self._feeder is not None:
+            self._feeder.cancel()
+            try:
+                await self._feeder
+            except asyncio.CancelledError:
+                pass
+            self._feeder = None
+        for timer in self._retry_timers:
+            timer.cancel()
+        self._retry_timers.clear()
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=JOB_DRAIN_SECONDS)
+        except asyncio.TimeoutError:
+            left = self._queue.qsize()
+            print(f"Job queue stopped with {left} jobs left" + (" for the next start" if self.durable else ""))
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self._held:
+            # Hand unfinished jobs back rather than making others wait out the lease
+            try:
+                await self._release_held()
+            except Exception as e:
+                print(f"Job queue could not release its jobs: {e}")
+
+    async def join(self):
+        """Wait until every job queued so far has run or is waiting out a retry (for tests and benchmarks)"""
+        while self._queue is not None:
+            await self._queue.join()
+            if not self.durable or not await self._due_jobs_left():
+                return
+            self.wake()
+            await asyncio.sleep(0.01)
+
+    async def _due_jobs_left(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Job.id).where(_claimable(Job, datetime.utcnow())).limit(1))
+            return result.first() is not None
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _put(self, job: _QueuedJob):
+        if self._queue is None:
+            print(f"Job queue not running; dropping job {job.name}")
+            return
+        self._queue.put_nowait((job.priority, next(self._seq), job))
+
+    def wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def submit(self, name: str, priority: int = PRIORITY_NORMAL, **kwargs):
+        """Queue a job now, outside any transaction"""
+        if self.durable:
+            async with AsyncSessionLocal() as db:
+                enqueue_job(db, name, priority, **kwargs)
+                await db.commit()
+        else:
+            self._put(_QueuedJob(name, kwargs, priority))
+
+    async def _work(self):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                await self._execute(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job queue error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _execute(self, job: _QueuedJob):
+        handler = self.handlers.get(job.name)
+        start = time.perf_counter()
+        try:
+            if handler is None:
+                raise LookupError(f"no handler registered for job {job.name}")
+            await handler(**job.kwargs)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._held.discard(job.job_id)
+            job.attempts += 1
+            retry = job.attempts < JOB_MAX_ATTEMPTS and handler is not None
+            jobs_finished.labels(job.name, "retried" if retry else "failed").inc()
+            print(f"Job {job.name} failed (attempt {job.attempts}): {e}")
+            delay = JOB_RETRY_BASE_SECONDS * (2 ** (job.attempts - 1))
+            if self.durable:
+                await self._record_failure(job, str(e), retry, delay)
+            elif retry:
+                loop = asyncio.get_running_loop()
+                self._retry_timers = [t for t in self._retry_timers if t.when() > loop.time()]
+                self._retry_timers.append(loop.call_later(delay, self._put, job))
+            return
+        finally:
+            job_duration.labels(job.name).observe(time.perf_counter() - start)
+
+        jobs_finished.labels(job.name, "succeeded").inc()
+        if self.durable:
+            self._held.discard(job.job_id)
+            async with AsyncSessionLocal() as db:
+                # A job whose lease lapsed belongs to whoever took it over
+                await db.execute(delete(Job).where(and_(Job.id == job.job_id, Job.locked_by == self._owner)))
+                await db.commit()
+
+    async def _record_failure(self, job: _QueuedJob, error: str, retry: bool, delay: float):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job)
+                .where(and_(Job.id == job.job_id, Job.locked_by == self._owner))
+                .values(
+                    status=STATUS_PENDING if retry else STATUS_FAILED,
+                    attempts=job.attempts,
+                    last_error=error,
+                    next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+                    locked_by=None,
+                    locked_until=None
+                )
+            )
+            await db.commit()
+
+    async def _renew_leases(self):
+        """Extend the lease on every row this process still holds"""
+        self._renewed_at = time.monotonic()
+        if not self._held:
+            return
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job)
+                .where(and_(Job.id.in_(list(self._held)), Job.locked_by == self._owner))
+                .values(locked_until=datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS))
+            )
+            await db.commit()
+
+    async def _release_held(self):
+        held, self._held = list(self._held), set()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Job)
+                .where(and_(Job.id.in_(held), Job.locked_by == self._owner))
+                .values(status=STATUS_PENDING, locked_by=None, locked_until=None)
+            )
+            await db.commit()
+
+    async def _feed(self):
+        """Move due jobs from the table onto the queue, keeping at most one batch claimed"""
+        while True:
+            try:
+                if time.monotonic() - self._renewed_at >= JOB_LEASE_SECONDS / 3:
+                    await self._renew_leases()
+                await self._claim_due_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job feeder error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _claim_due_jobs(self):
+        while True:
+            free = JOB_CONCURRENCY * 2 - self._queue.qsize()
+            if free <= 0:
+                return
+            now = datetime.utcnow()
+            candidate = aliased(Job)
+            due = (
+                select(candidate.id)
+                .where(_claimable(candidate, now))
+                .order_by(candidate.priority, candidate.id)
+                .limit(free)
+            )
+            async with AsyncSessionLocal() as db:
+                # The claim condition is checked again by the UPDATE itself, so of
+                # two processes picking the same rows only one gets each of them
+                result = await db.execute(
+                    update(Job)
+                    .where(and_(Job.id.in_(due), _claimable(Job, now)))
+                    .values(
+                        status=STATUS_RUNNING,
+                        locked_by=self._owner,
+                        locked_until=now + timedelta(seconds=JOB_LEASE_SECONDS)
+                    )
+                    .returning(Job.id, Job.name, Job.payload, Job.priority, Job.attempts)
+                )
+                rows = sorted(result.all(), key=lambda row: (row.priority, row.id))
+                await db.commit()
+            if not rows:
+                return
+            for row in rows:
+                self._held.add(row.id)
+                self._put(_QueuedJob(row.name, json.loads(row.payload), row.priority, row.attempts, row.id))
+            if len(rows) < free:
+                return
+            # The queue is full until workers catch up
+            await asyncio.sleep(0)
+
+
+def _claimable(job, now: datetime):
+    """Due pending rows, and running rows whose holder stopped renewing the lease"""
+    return or_(
+        and_(
+            job.status == STATUS_PENDING,
+            or_(job.next_attempt_at == None, job.next_attempt_at <= now)
+        ),
+        and_(job.status == STATUS_RUNNING, or_(job.locked_until == None, job.locked_until < now))
+    )
+
+
+# Global instance
+job_queue = JobQueue()
+
+job_queue_depth = Gauge(
+    "job_queue_depth",
+    "Background jobs queued in this process and not yet started",
+    callback=job_queue.depth
+)
+
+
+def enqueue_job(db: AsyncSession, name: str, priority: int = PRIORITY_NORMAL, **kwargs):
+    """Queue a job to run once the transaction commits; nothing runs if it rolls back"""
+    if job_queue.durable:
+        db.add(Job(name=name, payload=json.dumps(kwargs, default=str), priority=priority))
+        db.info[_PENDING_KEY] = True
+    else:
+        db.info.setdefault(_PENDING_KEY, []).append(_QueuedJob(name, kwargs, priority))
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_jobs_after_commit(session: Session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    if job_queue.durable:
+        job_queue.wake()
+    else:
+        for job in pending:
+            job_queue._put(job)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_jobs_after_rollback(session: Session):
+    session.info.pop(_PENDING_KEY, None)
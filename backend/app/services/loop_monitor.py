@@ -0,0 +1,175 @@
+from typing import Deque, List, Optional, Tuple
+from collections import deque
+from datetime import datetime
+import asyncio
+import sys
+import threading
+import time
+import traceback
+import os
+from dotenv import load_dotenv
+from app.services.metrics import Counter, Gauge, Histogram
+
+load_dotenv()
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+
+# How often the probe task wakes up to measure lag (milliseconds)
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100")) / 1000
+
+# Lag at which the loop counts as blocked and the blocking stack is captured (milliseconds)
+LOOP_BLOCK_THRESHOLD_SECONDS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000
+
+# Lag samples kept for the rolling percentiles (600 = one minute at 100ms)
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", "600"))
+
+# Most recent blocking events kept with their stacks
+LOOP_BLOCKS_KEPT = int(os.getenv("LOOP_BLOCKS_KEPT", "20"))
+
+loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "Delay between when the lag probe should have woken up and when it did",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+loop_blocks = Counter(
+    "event_loop_blocks_total",
+    "Times the event loop was blocked for longer than LOOP_BLOCK_THRESHOLD_MS"
+)
+
+
+def _percentile(ordered: List[float], pct: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class LoopMonitor:
+    """
+    Watchdog for the event loop.
+
+    A probe task sleeps LOOP_LAG_INTERVAL_MS at a time and records how late
+    it wakes up. A watchdog thread checks the probe's heartbeat; when it is
+    overdue by more than LOOP_BLOCK_THRESHOLD_MS the loop is stuck in some
+    synchronous call, and the thread captures the loop thread's stack while
+    it is still inside that call.
+    """
+
+    def __init__(self):
+        self.lag_window: Deque[float] = deque(maxlen=LOOP_LAG_WINDOW)
+        self.blocks: Deque[dict] = deque(maxlen=LOOP_BLOCKS_KEPT)
+
+        # Heartbeat written by the probe task, read by the watchdog thread
+        self._beat = time.monotonic()
+        self._beat_seq = 0
+        # (heartbeat seq, stack) captured during the current stall
+        self._captured: Optional[Tuple[int, List[str]]] = None
+
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def start(self):
+        """Start the probe task and the watchdog thread"""
+        if self._task is not None or not LOOP_MONITOR_ENABLED:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop_event.clear()
+        self._task = asyncio.create_task(self._run())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self):
+        """Stop the probe task and the watchdog thread"""
+        if self._task is None:
+            return
+        self._stop_event.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+
+    async def _run(self):
+        while True:
+            expected = time.monotonic() + LOOP_LAG_INTERVAL_SECONDS
+            await asyncio.sleep(LOOP_LAG_INTERVAL_SECONDS)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            seq = self._beat_seq
+            self._beat = now
+            self._beat_seq = seq + 1
+
+            loop_lag.observe(lag)
+            self.lag_window.append(lag)
+            if lag >= LOOP_BLOCK_THRESHOLD_SECONDS:
+                self._record_block(lag, seq)
+
+    def _record_block(self, lag: float, seq: int):
+        captured = self._captured
+        stack = captured[1] if captured is not None and captured[0] == seq else None
+        self._captured = None
+        loop_blocks.inc()
+        self.blocks.append({
+            "at": datetime.utcnow(),
+            "lag_ms": round(lag * 1000, 1),
+            "stack": stack
+        })
+        where = stack[-1] if stack else "unknown location"
+        print(f"Event loop blocked for {lag * 1000:.0f}ms at {where}")
+
+    def _watch(self):
+        check = max(LOOP_BLOCK_THRESHOLD_SECONDS / 4, 0.005)
+        while not self._stop_event.wait(check):
+            seq = self._beat_seq
+            overdue = time.monotonic() - self._beat - LOOP_LAG_INTERVAL_SECONDS
+            if overdue < LOOP_BLOCK_THRESHOLD_SECONDS:
+                continue
+            if self._captured is not None and self._captured[0] == seq:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            summary = traceback.StackSummary.extract(traceback.walk_stack(frame), lookup_lines=False)
+            del frame
+            # Root first, like a traceback
+            self._captured = (seq, [f"{fs.filename}:{fs.lineno} in {fs.name}" for fs in reversed(summary)])
+
+    def percentiles(self) -> dict:
+        """Lag percentiles over the rolling window, in seconds"""
+        ordered = sorted(self.lag_window)
+        if not ordered:
+            return {}
+        return {
+            "0.5": _percentile(ordered, 0.5),
+            "0.9": _percentile(ordered, 0.9),
+            "0.99": _percentile(ordered, 0.99),
+            "max": ordered[-1],
+        }
+
+    def recent_lag(self, samples: int = 5) -> float:
+        """Worst lag of the last few probes, in seconds"""
+        window = self.lag_window
+        return max((window[-i] for i in range(1, min(samples, len(window)) + 1)), default=0.0)
+
+    def summary(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "threshold_ms": LOOP_BLOCK_THRESHOLD_SECONDS * 1000,
+            "lag_ms": {key: round(value * 1000, 3) for key, value in self.percentiles().items()},
+            "samples": len(self.lag_window),
+            "recent_blocks": list(self.blocks)
+        }
+
+
+# Global instance
+loop_monitor = LoopMonitor()
+
+loop_lag_window = Gauge(
+    "event_loop_lag_window_seconds",
+    "Event loop lag percentiles over the last LOOP_LAG_WINDOW probes",
+    ("quantile",),
+    callback=loop_monitor.percentiles
+)
@@ -0,0 +1,163 @@
+from typing import Deque, List, Optional
+from collections import OrderedDict, deque
+from app.schemas.schemas import Message as MessageSchema
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Most recent messages kept per active chat
+MESSAGE_CACHE_PER_CHAT = int(os.getenv("MESSAGE_CACHE_PER_CHAT", "100"))
+
+# Upper bounds for the whole cache; least recently used chats are evicted first
+MESSAGE_CACHE_MAX_CHATS = int(os.getenv("MESSAGE_CACHE_MAX_CHATS", "5000"))
+MESSAGE_CACHE_MAX_BYTES = int(os.getenv("MESSAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Rough per-message cost of the model object on top of its text fields
+_MESSAGE_OVERHEAD_BYTES = 400
+
+
+def _message_size(message: MessageSchema) -> int:
+    return _MESSAGE_OVERHEAD_BYTES + len(message.content) + len(message.sender_name)
+
+
+class _CachedChat:
+    __slots__ = ("messages", "total", "size")
+
+    def __init__(self, total: int = 0):
+        self.messages: Deque[MessageSchema] = deque()
+        self.total = total   # messages in the chat, cached or not
+        self.size = 0        # estimated bytes of `messages`
+
+
+class MessageCache:
+    """
+    Bounded LRU cache of the latest messages of active chats.
+
+    Each entry holds the tail of a chat's history in order, plus the chat's
+    total message count, so a page can be served whenever it falls inside the
+    cached tail. Entries are written through on new messages, dropped when a
+    chat closes, and evicted least recently used first beyond the chat and
+    memory caps.
+    """
+
+    def __init__(
+        self,
+        per_chat: int = MESSAGE_CACHE_PER_CHAT,
+        max_chats: int = MESSAGE_CACHE_MAX_CHATS,
+        max_bytes: int = MESSAGE_CACHE_MAX_BYTES
+    ):
+        self.per_chat = per_chat
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+
+        # Maps: chat_session_id -> cached tail, in least recently used order
+        self.chats: "OrderedDict[int, _CachedChat]" = OrderedDict()
+        self.bytes = 0
+
+        # Sequence number of the latest write; read it before loading a chat to fill
+        self.writes = 0
+        # Maps: chat_session_id -> sequence number of its latest write, oldest first.
+        # Bounded: sequences of forgotten chats are covered by _forgotten_writes
+        self._last_write: "OrderedDict[int, int]" = OrderedDict()
+        self._forgotten_writes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chat_session_id: int, skip: int, limit: int) -> Optional[List[MessageSchema]]:
+        """A page of the chat's messages, or None if it is not fully cached"""
+        entry = self.chats.get(chat_session_id)
+        first = entry.total - len(entry.messages) if entry is not None else 0
+        if entry is None or skip < first:
+            self.misses += 1
+            return None
+
+        self.chats.move_to_end(chat_session_id)
+        self.hits += 1
+        start = skip - first
+        return [entry.messages[i] for i in range(start, min(start + limit, len(entry.messages)))]
+
+    def start_chat(self, chat_session_id: int):
+        """Cache a new chat, which has no messages yet"""
+        self._record_write(chat_session_id)
+        self._store(chat_session_id, _CachedChat())
+
+    def fill(self, chat_session_id: int, messages: List[MessageSchema], writes: int):
+        """
+        Cache the complete history of a chat as loaded from the database.
+        `writes` is the sequence read before the query; the fill is dropped if
+        the chat was written since, as the loaded history may be stale.
+        Writes to other chats do not matter.
+        """
+        last_write = self._last_write.get(chat_session_id, self._forgotten_writes)
+        if last_write > writes or chat_session_id in self.chats:
+            return
+        entry = _CachedChat(total=len(messages))
+        for message in messages[-self.per_chat:]:
+            entry.messages.append(message)
+            entry.size += _message_size(message)
+        self._store(chat_session_id, entry)
+
+    def append(self, chat_session_id: int, message: MessageSchema):
+        """Write a new message through to the chat's entry, if it is cached"""
+        self._record_write(chat_session_id)
+        entry = self.chats.get(chat_session_id)
+        if entry is None:
+            return
+
+        self.chats.move_to_end(chat_session_id)
+        entry.messages.append(message)
+        entry.total += 1
+        size = _message_size(message)
+        entry.size += size
+        self.bytes += size
+
+        while len(entry.messages) > self.per_chat:
+            size = _message_size(entry.messages.popleft())
+            entry.size -= size
+            self.bytes -= size
+        self._enforce_limits()
+
+    def evict(self, chat_session_id: int):
+        """Drop a chat, e.g. once it is closed"""
+        self._record_write(chat_session_id)
+        entry = self.chats.pop(chat_session_id, None)
+        if entry is not None:
+            self.bytes -= entry.size
+
+    def _record_write(self, chat_session_id: int):
+        self.writes += 1
+        self._last_write[chat_session_id] = self.writes
+        self._last_write.move_to_end(chat_session_id)
+        if len(self._last_write) > self.max_chats:
+            _, self._forgotten_writes = self._last_write.popitem(last=False)
+
+    def _store(self, chat_session_id: int, entry: _CachedChat):
+        self.evict(chat_session_id)
+        self.chats[chat_session_id] = entry
+        self.bytes += entry.size
+        self._enforce_limits()
+
+    def _enforce_limits(self):
+        while self.chats and (len(self.chats) > self.max_chats or self.bytes > self.max_bytes):
+            _, entry = self.chats.popitem(last=False)
+            self.bytes -= entry.size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cached_chats": len(self.chats),
+            "cached_bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+
+# Global instance
+message_cache = MessageCache()
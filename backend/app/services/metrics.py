@@ -0,0 +1,267 @@
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from bisect import bisect_left
+import math
+import time
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Set to false to turn every metric update into a no-op and drop the request middleware
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text format"""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric") -> "_Metric":
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), registry: Optional[MetricsRegistry] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.registry = registry if registry is not None else metrics_registry
+        # Maps: label values -> child holding the value for that series
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self.registry.register(self)
+
+    def labels(self, *values):
+        """The series for these label values, created on first use"""
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "registry")
+
+    def __init__(self, registry: MetricsRegistry):
+        self.value = 0.0
+        self.registry = registry
+
+    def inc(self, amount: float = 1.0):
+        if self.registry.enabled:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild(self.registry)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"
+            for key, child in self._children.items()
+        ]
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class Gauge(_Metric):
+    """
+    Value that goes up and down. With a callback the value is read at scrape
+    time instead: the callback returns a number, or for labelled gauges a dict
+    of label values -> number.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 callback: Optional[Callable[[], object]] = None, registry: Optional[MetricsRegistry] = None):
+        super().__init__(name, help, labelnames, registry)
+        self.callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+
+    def _values(self) -> Dict[Tuple[str, ...], float]:
+        if self.callback is None:
+            return {key: child.value for key, child in self._children.items()}
+        try:
+            value = self.callback()
+        except Exception as e:
+            print(f"Error reading gauge {self.name}: {e}")
+            return {}
+        if not isinstance(value, dict):
+            return {(): value}
+        return {
+            (key if isinstance(key, tuple) else (key,)): number
+            for key, number in value.items()
+        }
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, tuple(str(v) for v in key))} {_format_value(value)}"
+            for key, value in self._values().items()
+        ]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "registry")
+
+    def __init__(self, bounds: Tuple[float, ...], registry: MetricsRegistry):
+        self.bounds = bounds
+        # One slot per bucket plus +Inf; made cumulative only when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.registry = registry
+
+    def observe(self, value: float):
+        if self.registry.enabled:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values over fixed buckets"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS, registry: Optional[MetricsRegistry] = None):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, self.registry)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# Global instance
+metrics_registry = MetricsRegistry(enabled=METRICS_ENABLED)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing HTTP requests. Requests are labelled with the
+    matched route template (/api/chats/{chat_session_id}), never the raw
+    path, so the number of series stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics_registry.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            http_request_duration.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                status_code
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,211 @@
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, and_, or_, event, exists
+from sqlalchemy.orm import Session, aliased
+from app.database import AsyncSessionLocal
+from app.models.models import OutboxEvent, OutboxDeadLetter
+from app.services.websocket_manager import manager
+from datetime import datetime, timedelta
+import asyncio
+import json
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "1.0"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("OUTBOX_RETRY_BASE_SECONDS", "0.5"))
+
+TARGET_AGENT = "agent"
+TARGET_CHAT = "chat"
+
+# Session.info flag telling the commit hook that events were recorded
+_PENDING_FLAG = "outbox_pending"
+
+
+def _enqueue(db: AsyncSession, target_type: str, target_id: int, message: dict):
+    db.add(OutboxEvent(
+        target_type=target_type,
+        target_id=target_id,
+        payload=json.dumps(message, default=str)
+    ))
+    db.info[_PENDING_FLAG] = True
+
+
+def enqueue_agent_notification(db: AsyncSession, agent_id: int, message: dict):
+    """Record a notification for an agent; it is sent once the transaction commits"""
+    _enqueue(db, TARGET_AGENT, agent_id, message)
+
+
+def enqueue_chat_broadcast(db: AsyncSession, chat_session_id: int, message: dict):
+    """Record a broadcast to a chat; it is sent once the transaction commits"""
+    _enqueue(db, TARGET_CHAT, chat_session_id, message)
+
+
+class OutboxRelay:
+    """
+    Background task delivering committed outbox events over WebSocket.
+
+    Events are read in batches, delivered concurrently per target (in order
+    within a target) and deleted once sent. Undelivered events, including
+    notifications for an agent who is not connected, are retried with
+    exponential backoff; later events for the same target wait behind them.
+    After OUTBOX_MAX_ATTEMPTS an event moves to the dead-letter table.
+    """
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        """Start the relay loop on the running event loop"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Deliver what is pending and stop the relay loop"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.deliver_pending()
+        except Exception as e:
+            print(f"Outbox relay could not drain on shutdown: {e}")
+
+    def wake(self):
+        """Ask the relay to deliver now instead of waiting for the next poll"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            try:
+                await self.deliver_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Outbox relay error: {e}")
+
+    async def deliver_pending(self):
+        """Deliver due events until a batch comes back short"""
+        while await self._deliver_batch() >= OUTBOX_BATCH_SIZE:
+            pass
+
+    async def _deliver_batch(self) -> int:
+        now = datetime.utcnow()
+        # An event waiting out a retry holds back later events for its target
+        earlier = aliased(OutboxEvent)
+        blocked = exists().where(
+            and_(
+                earlier.target_type == OutboxEvent.target_type,
+                earlier.target_id == OutboxEvent.target_id,
+                earlier.id < OutboxEvent.id,
+                earlier.next_attempt_at > now
+            )
+        )
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(OutboxEvent)
+                .where(
+                    and_(
+                        or_(
+                            OutboxEvent.next_attempt_at == None,
+                            OutboxEvent.next_attempt_at <= now
+                        ),
+                        ~blocked
+                    )
+                )
+                .order_by(OutboxEvent.id)
+                .limit(OUTBOX_BATCH_SIZE)
+            )
+            events = result.scalars().all()
+            if not events:
+                return 0
+
+            # Group by target so one slow socket does not hold up the others
+            groups: Dict[Tuple[str, int], List[OutboxEvent]] = {}
+            for outbox_event in events:
+                groups.setdefault((outbox_event.target_type, outbox_event.target_id), []).append(outbox_event)
+
+            outcomes = await asyncio.gather(*(self._deliver_group(group) for group in groups.values()))
+
+            done_ids = []
+            for delivered, failed, error in outcomes:
+                done_ids.extend(e.id for e in delivered)
+                if failed:
+                    failed.attempts += 1
+                    failed.last_error = error
+                    failed.next_attempt_at = now + timedelta(
+                        seconds=OUTBOX_RETRY_BASE_SECONDS * (2 ** (failed.attempts - 1))
+                    )
+                    if failed.attempts >= OUTBOX_MAX_ATTEMPTS:
+                        print(f"Outbox event {failed.id} dead-lettered after {failed.attempts} attempts: {error}")
+                        db.add(OutboxDeadLetter(
+                            event_id=failed.id,
+                            target_type=failed.target_type,
+                            target_id=failed.target_id,
+                            payload=failed.payload,
+                            attempts=failed.attempts,
+                            last_error=error,
+                            created_at=failed.created_at,
+                            failed_at=now
+                        ))
+                        done_ids.append(failed.id)
+
+            if done_ids:
+                await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(done_ids)))
+            await db.commit()
+
+            return len(events)
+
+    async def _deliver_group(
+        self,
+        group: List[OutboxEvent]
+    ) -> Tuple[List[OutboxEvent], Optional[OutboxEvent], Optional[str]]:
+        """
+        Send events for one target in order, stopping at the first one not
+        delivered. Sends bypass batching, so an event only counts as delivered
+        once it is on the wire.
+        """
+        delivered = []
+        for outbox_event in group:
+            try:
+                message = json.loads(outbox_event.payload)
+                if outbox_event.target_type == TARGET_AGENT:
+                    if not await manager.notify_agent(outbox_event.target_id, message, immediate=True):
+                        return delivered, outbox_event, "agent not connected or send failed"
+                elif not await manager.broadcast_to_chat(message, outbox_event.target_id, immediate=True):
+                    return delivered, outbox_event, "send to every chat client failed"
+            except Exception as e:
+                return delivered, outbox_event, str(e)
+            delivered.append(outbox_event)
+        return delivered, None, None
+
+
+# Global instance
+outbox_relay = OutboxRelay()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_relay_after_commit(session: Session):
+    if session.info.pop(_PENDING_FLAG, False):
+        outbox_relay.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_pending_after_rollback(session: Session):
+    session.info.pop(_PENDING_FLAG, None)
@@ -0,0 +1,237 @@
+from typing import Dict, List, Optional, Set
+from sqlalchemy import select, update, and_, exists
+from app.database import AsyncSessionLocal
+from app.models.models import User, UserRole, AgentStatus, ChatSession, ChatStatus
+from app.services.websocket_manager import manager
+from app.services.supervisor import supervisor_hub
+import asyncio
+import time
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How long a disconnected agent keeps its status before being marked OFFLINE
+PRESENCE_GRACE_SECONDS = float(os.getenv("PRESENCE_GRACE_SECONDS", "30"))
+
+# A connected agent that has not sent anything for this long is treated as gone
+PRESENCE_HEARTBEAT_TIMEOUT_SECONDS = float(os.getenv("PRESENCE_HEARTBEAT_TIMEOUT_SECONDS", "90"))
+
+# How often expired agents are collected and pending status writes flushed
+PRESENCE_SWEEP_SECONDS = float(os.getenv("PRESENCE_SWEEP_SECONDS", "5"))
+
+# How often the users table is checked for agents that are not connected at all
+PRESENCE_RECONCILE_SECONDS = float(os.getenv("PRESENCE_RECONCILE_SECONDS", "60"))
+
+# Maximum number of ids per UPDATE statement
+PRESENCE_WRITE_BATCH_SIZE = int(os.getenv("PRESENCE_WRITE_BATCH_SIZE", "500"))
+
+
+class PresenceTracker:
+    """
+    Keeps User.agent_status in line with the agent WebSocket connections.
+
+    Heartbeats only touch in-memory state. Status changes are coalesced per
+    agent and written in batched UPDATEs by a background sweep, so the number
+    of writes depends on status transitions rather than on heartbeat volume.
+    """
+
+    def __init__(self):
+        # Maps: agent_user_id -> monotonic time of last heartbeat (connected agents)
+        self.last_seen: Dict[int, float] = {}
+
+        # Maps: agent_user_id -> department_id
+        self.departments: Dict[int, Optional[int]] = {}
+
+        # Maps: agent_user_id -> monotonic time of disconnect (agents in grace period)
+        self.disconnected_at: Dict[int, float] = {}
+
+        # Maps: agent_user_id -> status waiting to be written to the database
+        self.pending_status: Dict[int, AgentStatus] = {}
+
+        # Agents marked OFFLINE by the tracker rather than by themselves
+        self.expired: Set[int] = set()
+
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = time.monotonic()
+        self._last_reconcile = self._started_at
+
+    def agent_connected(self, agent_id: int, department_id: Optional[int] = None):
+        """Register an agent WebSocket connection"""
+        self.last_seen[agent_id] = time.monotonic()
+        self.departments[agent_id] = department_id
+        self.disconnected_at.pop(agent_id, None)
+
+        # Agents we took offline come back as available (unless they still
+        # hold an active chat, see flush); a pending OFFLINE write for them
+        # is simply overwritten
+        if agent_id in self.expired:
+            self.expired.discard(agent_id)
+            self.pending_status[agent_id] = AgentStatus.AVAILABLE
+        elif self.pending_status.get(agent_id) == AgentStatus.OFFLINE:
+            del self.pending_status[agent_id]
+
+    def heartbeat(self, agent_id: int):
+        """Record that a connected agent is still alive"""
+        if agent_id in self.last_seen:
+            self.last_seen[agent_id] = time.monotonic()
+
+    def agent_disconnected(self, agent_id: int):
+        """Start the grace period for an agent whose socket went away"""
+        if self.last_seen.pop(agent_id, None) is not None:
+            self.disconnected_at[agent_id] = time.monotonic()
+
+    def set_status(self, agent_id: int, status: AgentStatus):
+        """Queue a status change reported over the agent socket"""
+        self.pending_status[agent_id] = status
+        self.expired.discard(agent_id)
+
+    def discard_pending(self, agent_id: int):
+        """Drop queued writes for an agent whose status was set directly"""
+        self.pending_status.pop(agent_id, None)
+        self.expired.discard(agent_id)
+
+    def is_online(self, agent_id: int) -> bool:
+        """Whether an agent is connected or still inside the grace period"""
+        return agent_id in self.last_seen or agent_id in self.disconnected_at
+
+    def start(self):
+        """Start the background sweep on the running event loop"""
+        if self._task is None:
+            self._started_at = time.monotonic()
+            self._last_reconcile = self._started_at
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the sweep and write out pending status changes"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"Presence tracker could not flush on shutdown: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(PRESENCE_SWEEP_SECONDS)
+            try:
+                self.expire_stale()
+                now = time.monotonic()
+                # Give agents a grace period to reconnect after a restart
+                # before offlining everyone the database still thinks is online
+                if (now - self._started_at >= PRESENCE_GRACE_SECONDS
+                        and now - self._last_reconcile >= PRESENCE_RECONCILE_SECONDS):
+                    self._last_reconcile = now
+                    await self.reconcile()
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Presence sweep error: {e}")
+
+    def expire_stale(self) -> List[int]:
+        """Queue OFFLINE for agents past their grace period or heartbeat timeout"""
+        now = time.monotonic()
+
+        silent = [
+            agent_id for agent_id, seen in self.last_seen.items()
+            if now - seen > PRESENCE_HEARTBEAT_TIMEOUT_SECONDS
+        ]
+        for agent_id in silent:
+            self.agent_disconnected(agent_id)
+            # The silent socket is dead; start the grace period from its last sign of life
+            self.disconnected_at[agent_id] = now - PRESENCE_HEARTBEAT_TIMEOUT_SECONDS
+
+        expired = [
+            agent_id for agent_id, since in self.disconnected_at.items()
+            if now - since > PRESENCE_GRACE_SECONDS
+        ]
+        for agent_id in expired:
+            del self.disconnected_at[agent_id]
+            department_id = self.departments.pop(agent_id, None)
+            if department_id:
+                manager.mark_agent_busy(agent_id, department_id)
+            self.pending_status[agent_id] = AgentStatus.OFFLINE
+            self.expired.add(agent_id)
+
+        return expired
+
+    async def reconcile(self):
+        """Queue OFFLINE for agents the database shows online but who never connected"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(User.id).where(
+                    and_(
+                        User.role == UserRole.AGENT,
+                        User.agent_status != AgentStatus.OFFLINE
+                    )
+                )
+            )
+            for agent_id in result.scalars().all():
+                if not self.is_online(agent_id) and agent_id not in self.pending_status:
+                    self.pending_status[agent_id] = AgentStatus.OFFLINE
+                    self.expired.add(agent_id)
+
+    async def flush(self):
+        """
+        Write queued status changes, one UPDATE per status and id batch.
+
+        AVAILABLE is not written for agents holding an active chat: the
+        assignment that made them BUSY may have committed after the write was
+        queued, and it wins.
+        """
+        if not self.pending_status:
+            return
+
+        pending, self.pending_status = self.pending_status, {}
+
+        by_status: Dict[AgentStatus, List[int]] = {}
+        for agent_id, status in pending.items():
+            by_status.setdefault(status, []).append(agent_id)
+
+        has_active_chat = exists().where(
+            and_(
+                ChatSession.assigned_agent_id == User.id,
+                ChatSession.status == ChatStatus.ACTIVE
+            )
+        )
+
+        updated: Dict[AgentStatus, List[int]] = {}
+        try:
+            async with AsyncSessionLocal() as db:
+                for status, agent_ids in by_status.items():
+                    for i in range(0, len(agent_ids), PRESENCE_WRITE_BATCH_SIZE):
+                        batch = agent_ids[i:i + PRESENCE_WRITE_BATCH_SIZE]
+                        conditions = [
+                            User.id.in_(batch),
+                            User.role == UserRole.AGENT,
+                            User.agent_status != status
+                        ]
+                        if status == AgentStatus.AVAILABLE:
+                            conditions.append(~has_active_chat)
+                        result = await db.execute(
+                            update(User)
+                            .where(and_(*conditions))
+                            .values(agent_status=status)
+                            .returning(User.id)
+                        )
+                        updated.setdefault(status, []).extend(result.scalars().all())
+                await db.commit()
+            # Bulk UPDATEs bypass the ORM events that feed the supervisor stream
+            for status, agent_ids in updated.items():
+                supervisor_hub.set_agent_status(agent_ids, status)
+        except Exception:
+            # Put the writes back unless newer ones were queued meanwhile
+            for agent_id, status in pending.items():
+                self.pending_status.setdefault(agent_id, status)
+            raise
+
+
+# Global instance
+presence = PresenceTracker()
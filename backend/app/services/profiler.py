@@ -0,0 +1,272 @@
+from typing import Dict, List, Optional
+from collections import Counter
+from datetime import datetime
+from html import escape
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import zlib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Default and longest profiling window an admin can request (seconds)
+PROFILER_DEFAULT_SECONDS = float(os.getenv("PROFILER_DEFAULT_SECONDS", "30"))
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", "300"))
+
+# How often the event loop thread's stack is sampled (milliseconds)
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+
+# Profile this many seconds right after startup; 0 disables
+PROFILER_STARTUP_SECONDS = float(os.getenv("PROFILER_STARTUP_SECONDS", "0"))
+
+# How often loop lag is measured while profiling (seconds)
+LAG_PROBE_SECONDS = 0.05
+
+# Endpoint names for samples taken outside a request
+IDLE = "(idle)"
+BACKGROUND = "(background)"
+
+# Frames below the innermost of these are event loop plumbing and are cut off
+_LOOP_FRAMES = {("events.py", "_run"), ("base_events.py", "_run_once")}
+
+
+def _frame_label(code) -> str:
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+def _collapse(frame) -> str:
+    """The frame's stack, root first, as one semicolon-separated collapsed line"""
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        if (code.co_filename.rsplit("/", 1)[-1], code.co_name) in _LOOP_FRAMES:
+            break
+        labels.append(_frame_label(code))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels) or "(event loop)"
+
+
+def _endpoint(scope: Optional[dict]) -> str:
+    if scope is None:
+        return BACKGROUND
+    route = scope.get("route")
+    return f"{scope.get('method', 'WS')} {route.path if route is not None else scope['path']}"
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler for the event loop thread.
+
+    While a session runs, a background thread reads the loop thread's stack
+    every PROFILER_INTERVAL_MS and files it under the endpoint of the task
+    running at that moment, so blocking calls (bcrypt, logging to stdout)
+    show up on the flamegraph of the request that made them. A probe task
+    measures event loop lag over the same window.
+    """
+
+    def __init__(self):
+        self.running = False
+        self.started_at: Optional[datetime] = None
+        self.duration = 0.0
+        self.interval = PROFILER_INTERVAL_MS / 1000
+        self.samples = 0
+
+        # Maps: endpoint -> collapsed stack -> sample count
+        self.stacks: Dict[str, Counter] = {}
+        self.lag_samples: List[float] = []
+
+        # Maps: asyncio.Task -> ASGI scope of the request it serves
+        self._task_scopes: Dict[asyncio.Task, dict] = {}
+
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, seconds: float = PROFILER_DEFAULT_SECONDS, interval_ms: float = PROFILER_INTERVAL_MS):
+        """Start a session on the running event loop, replacing the previous results"""
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+
+        self._loop = asyncio.get_running_loop()
+        self.duration = min(max(seconds, 0.1), PROFILER_MAX_SECONDS)
+        self.interval = max(interval_ms, 1.0) / 1000
+        self.started_at = datetime.utcnow()
+        self.samples = 0
+        self.stacks = {}
+        self.lag_samples = []
+        self.running = True
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._sample, args=(threading.get_ident(),), name="profiler", daemon=True
+        )
+        self._thread.start()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """End the session early; results stay available until the next start"""
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        await self._finish()
+
+    async def _run(self):
+        # Probe loop lag until the window ends
+        deadline = time.monotonic() + self.duration
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            await asyncio.sleep(LAG_PROBE_SECONDS)
+            self.lag_samples.append(max(time.perf_counter() - start - LAG_PROBE_SECONDS, 0.0))
+        await self._finish()
+
+    async def _finish(self):
+        if not self.running:
+            return
+        self.running = False
+        self.duration = (datetime.utcnow() - self.started_at).total_seconds()
+        self._stop_event.set()
+        self._task_scopes.clear()
+        await asyncio.to_thread(self._thread.join)
+
+    def track(self, scope: dict):
+        """Attribute samples taken while the current task runs to this request"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._task_scopes[task] = scope
+
+    def untrack(self):
+        task = asyncio.current_task()
+        if task is not None:
+            self._task_scopes.pop(task, None)
+
+    def _sample(self, loop_thread_id: int):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(loop_thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            if task is None:
+                endpoint = IDLE if frame.f_code.co_name in ("select", "poll", "control") else BACKGROUND
+            else:
+                endpoint = _endpoint(self._task_scopes.get(task))
+            stack = _collapse(frame)
+            del frame
+            with self._lock:
+                self.stacks.setdefault(endpoint, Counter())[stack] += 1
+                self.samples += 1
+
+    def collapsed(self, endpoint: Optional[str] = None) -> str:
+        """Collapsed stacks (flamegraph.pl / speedscope input) for one endpoint or all of them"""
+        with self._lock:
+            items = [
+                (stack if endpoint else f"{name};{stack}", count)
+                for name, stacks in self.stacks.items()
+                if endpoint is None or name == endpoint
+                for stack, count in stacks.items()
+            ]
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(items))
+
+    def summary(self) -> dict:
+        with self._lock:
+            endpoints = {name: sum(stacks.values()) for name, stacks in self.stacks.items()}
+        lag = sorted(self.lag_samples)
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "duration_seconds": round(self.duration, 3),
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "endpoints": dict(sorted(endpoints.items(), key=lambda item: -item[1])),
+            "loop_lag_ms": {
+                "p50": round(statistics.median(lag) * 1000, 3),
+                "p99": round(lag[min(len(lag) - 1, int(len(lag) * 0.99))] * 1000, 3),
+                "max": round(lag[-1] * 1000, 3),
+                "probes": len(lag)
+            } if lag else None
+        }
+
+
+# Global instance
+profiler = SamplingProfiler()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware telling the profiler which request each task serves"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not profiler.running or scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        profiler.track(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.untrack()
+
+
+def flamegraph_svg(collapsed: str, title: str = "Flame graph", width: int = 1200) -> str:
+    """Render collapsed stacks as a self-contained SVG flame graph (root at the bottom)"""
+    root = {"children": {}, "value": 0}
+    for line in collapsed.splitlines():
+        stack, _, count = line.rpartition(" ")
+        if not stack:
+            continue
+        node = root
+        node["value"] += int(count)
+        for frame in stack.split(";"):
+            node = node["children"].setdefault(frame, {"children": {}, "value": 0})
+            node["value"] += int(count)
+
+    total = root["value"] or 1
+    row = 16
+    rects = []
+    depth_max = 0
+
+    def layout(node, name, x, depth):
+        nonlocal depth_max
+        w = node["value"] / total * (width - 20)
+        if w < 0.3:
+            return
+        depth_max = max(depth_max, depth)
+        rects.append((name, node["value"], x, depth, w))
+        child_x = x
+        for child_name, child in sorted(node["children"].items()):
+            layout(child, child_name, child_x, depth + 1)
+            child_x += child["value"] / total * (width - 20)
+
+    layout(root, "all", 10, 0)
+    height = (depth_max + 1) * row + 50
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'font-family="Verdana" font-size="11">',
+        '<rect width="100%" height="100%" fill="#f8f8f8"/>',
+        f'<text x="{width // 2}" y="20" text-anchor="middle" font-size="15">{escape(title)}</text>',
+    ]
+    for name, value, x, depth, w in rects:
+        y = height - (depth + 1) * row - 10
+        # Stable warm colour per frame name
+        hue = zlib.crc32(name.encode()) % 55
+        label = escape(name[:int(w / 7)]) if w > 21 else ""
+        parts.append(
+            f'<g><title>{escape(name)} ({value} samples, {value / total * 100:.2f}%)</title>'
+            f'<rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" '
+            f'fill="hsl({hue},85%,60%)" rx="2"/>'
+            f'<text x="{x + 3:.1f}" y="{y + row - 4}">{label}</text></g>'
+        )
+    parts.append("</svg>")
+    return "\n".join(parts)
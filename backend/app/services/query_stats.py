@@ -0,0 +1,188 @@
+from typing import Dict, Optional, Tuple
+from collections import Counter as StatementCounter
+from contextvars import ContextVar
+import os
+import re
+import time
+from dotenv import load_dotenv
+from app.services.metrics import Counter, Histogram
+
+load_dotenv()
+
+# Add X-DB-Query-Count and X-DB-Time-Ms to every HTTP response (development only)
+QUERY_STATS_HEADERS = os.getenv("QUERY_STATS_HEADERS", "false").lower() == "true"
+
+# A statement repeated this many times in one request is reported as a likely
+# N+1 (a query per row instead of one query for all rows); 0 turns it off
+QUERY_REPEAT_THRESHOLD = int(os.getenv("QUERY_REPEAT_THRESHOLD", "5"))
+
+# Expanded IN lists differ only in their number of placeholders
+_PLACEHOLDER_LIST_RE = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))*\s*\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+db_queries_per_request = Histogram(
+    "http_request_db_queries",
+    "SQL statements executed while serving an HTTP request",
+    ("method", "route"),
+    buckets=(1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+)
+db_time_per_request = Histogram(
+    "http_request_db_seconds",
+    "Time spent in SQL statements while serving an HTTP request",
+    ("method", "route"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+repeated_statements = Counter(
+    "http_request_repeated_statements_total",
+    "Requests that ran one statement QUERY_REPEAT_THRESHOLD times or more (likely N+1)",
+    ("method", "route")
+)
+
+
+def normalize_statement(statement: str) -> str:
+    """The statement with placeholder lists collapsed, so repeats of one query compare equal"""
+    return _PLACEHOLDER_LIST_RE.sub("(?)", _WHITESPACE_RE.sub(" ", statement).strip())
+
+
+class QueryStats:
+    """Statements and database time of one request (or one query budget)"""
+    __slots__ = ("count", "seconds", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        # Maps: normalized statement -> times executed
+        self.statements: Dict[str, int] = StatementCounter()
+
+    def add(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[normalize_statement(statement)] += 1
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Statements executed at least `threshold` times"""
+        return {s: n for s, n in self.statements.items() if n >= threshold}
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+# Active query_budget blocks of the current context. Tasks started before a
+# block (the outbox relay, job workers, pollers) do not see it, so their
+# statements never count against a request's budget
+_budgets: ContextVar[Tuple[QueryStats, ...]] = ContextVar("query_budgets", default=())
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+class query_budget:
+    """
+    Fail when the block runs more than `max_queries` statements. Meant for
+    tests, around one call to an endpoint through an in-process client
+    (httpx.ASGITransport serves the request in the caller's context):
+
+        with query_budget(4):
+            await client.get("/api/chats/")
+
+    Only statements run in this context count; work handed to background
+    tasks, such as jobs queued by the endpoint, does not.
+    """
+
+    def __init__(self, max_queries: int, label: str = ""):
+        self.max_queries = max_queries
+        self.label = label
+        self.stats = QueryStats()
+        self._token = None
+
+    def __enter__(self) -> QueryStats:
+        self._token = _budgets.set(_budgets.get() + (self.stats,))
+        return self.stats
+
+    def __exit__(self, exc_type, exc, tb):
+        _budgets.reset(self._token)
+        if exc_type is None and self.stats.count > self.max_queries:
+            statements = "\n".join(
+                f"  {n}x {statement}" for statement, n in self.stats.statements.most_common()
+            )
+            raise AssertionError(
+                f"{self.label or 'Block'} ran {self.stats.count} SQL statements, "
+                f"budget is {self.max_queries}:\n{statements}"
+            )
+        return False
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware counting the SQL statements and database time of each
+    HTTP request. Totals go to metrics, and to response headers when
+    QUERY_STATS_HEADERS is on; statements repeated QUERY_REPEAT_THRESHOLD
+    times are logged as likely N+1 queries.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and QUERY_STATS_HEADERS:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-db-query-count", str(stats.count).encode("latin-1")),
+                    (b"x-db-time-ms", f"{stats.seconds * 1000:.2f}".encode("latin-1")),
+                ]
+            await send(message)
+
+        token = _current_stats.set(stats)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_stats.reset(token)
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            db_queries_per_request.labels(scope["method"], route_path).observe(stats.count)
+            db_time_per_request.labels(scope["method"], route_path).observe(stats.seconds)
+            if QUERY_REPEAT_THRESHOLD > 0:
+                repeated = stats.repeated(QUERY_REPEAT_THRESHOLD)
+                if repeated:
+                    repeated_statements.labels(scope["method"], route_path).inc()
+                    for statement, n in repeated.items():
+                        print(f"Possible N+1 in {scope['method']} {route_path}: {n}x {statement[:200]}")
+
+
+def track_engine(engine):
+    """Count every statement and its duration against the current request and open budgets"""
+    from sqlalchemy import event
+
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start_statement(conn, cursor, statement, parameters, context, executemany):
+        if _current_stats.get() is not None or _budgets.get():
+            conn.info.setdefault("query_stats_started", []).append(time.perf_counter())
+
+    def _finish(conn, statement):
+        started = conn.info.get("query_stats_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.add(statement, elapsed)
+        for budget in _budgets.get():
+            if budget is not stats:
+                budget.add(statement, elapsed)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _end_statement(conn, cursor, statement, parameters, context, executemany):
+        _finish(conn, statement)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _fail_statement(exception_context):
+        if exception_context.connection is not None:
+            _finish(exception_context.connection, exception_context.statement or "")
@@ -0,0 +1,266 @@
+from typing import Dict, Optional, Tuple
+import math
+import os
+import time
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+from starlette.requests import HTTPConnection
+from app.services.metrics import Counter
+from app.services.loop_monitor import loop_monitor
+from app.services.supervisor import supervisor_hub
+
+load_dotenv()
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # redis is optional; the in-memory store is always available
+    redis = None
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+# "memory" (per worker) or "redis" (shared by every worker, needs the redis package)
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+
+# Keys tracked by the memory store before idle ones are dropped
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Take X-Forwarded-For as the client address (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+# Shed new work above these; 0 turns a check off
+ADMISSION_MAX_WAITING_CHATS = int(os.getenv("ADMISSION_MAX_WAITING_CHATS", "500"))
+ADMISSION_MAX_LOOP_LAG_MS = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "250"))
+
+# Retry-After sent when shedding load
+ADMISSION_RETRY_AFTER_SECONDS = 5
+
+# How long an admission decision is reused
+ADMISSION_CHECK_INTERVAL_SECONDS = 0.25
+
+# WebSocket close code 1013: Try Again Later
+WS_TRY_AGAIN_LATER = 1013
+
+rate_limited = Counter(
+    "rate_limited_total",
+    "Requests and WebSocket frames rejected by a rate limit",
+    ("limit",)
+)
+admission_rejections = Counter(
+    "admission_rejections_total",
+    "Requests and WebSocket frames shed because the server was overloaded",
+    ("reason",)
+)
+
+
+class RateLimit:
+    """
+    A token bucket holding `count` tokens that refills completely over
+    `seconds`, written as "count/seconds" in the environment.
+    """
+    __slots__ = ("name", "count", "interval")
+
+    def __init__(self, name: str, spec: str):
+        self.name = name
+        count, _, seconds = spec.partition("/")
+        self.count = int(count or 0)
+        # Seconds to earn back one token
+        self.interval = float(seconds or 1) / self.count if self.count > 0 else 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 0
+
+
+CHATS_PER_IP = RateLimit("chats_per_ip", os.getenv("RATE_LIMIT_CHATS_PER_IP", "10/60"))
+MESSAGES_PER_IP = RateLimit("messages_per_ip", os.getenv("RATE_LIMIT_MESSAGES_PER_IP", "600/60"))
+MESSAGES_PER_CHAT = RateLimit("messages_per_chat", os.getenv("RATE_LIMIT_MESSAGES_PER_CHAT", "60/60"))
+MESSAGES_PER_AGENT = RateLimit("messages_per_agent", os.getenv("RATE_LIMIT_MESSAGES_PER_AGENT", "120/60"))
+
+
+class MemoryStore:
+    """
+    Token buckets kept as one float per key: the time the bucket will be
+    full again (GCRA). A key whose time has passed holds a full bucket and
+    carries no state, so it can be dropped at any point.
+    """
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        # Maps: key -> monotonic time the bucket is full again; least recently used first
+        self._full_at: Dict[str, float] = {}
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        """Take a token; returns 0 when allowed, else the seconds until one is available"""
+        now = time.monotonic()
+        full_at = max(self._full_at.pop(key, now), now)
+        new_full_at = full_at + limit.interval
+        wait = new_full_at - limit.count * limit.interval - now
+        # Tolerance for float rounding on the last token of a burst
+        allowed = wait <= 1e-9
+        self._full_at[key] = new_full_at if allowed else full_at
+        if len(self._full_at) > self.max_keys:
+            self._prune(now)
+        return 0.0 if allowed else wait
+
+    def _prune(self, now: float):
+        for key in [k for k, full_at in self._full_at.items() if full_at <= now]:
+            del self._full_at[key]
+        # Still too many active clients: forget the least recently used tenth
+        excess = len(self._full_at) - self.max_keys
+        if excess > 0:
+            for key in list(self._full_at)[:excess + self.max_keys // 10]:
+                del self._full_at[key]
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+
+# The same GCRA step as MemoryStore.acquire, atomic on the Redis server and
+# timed by its clock so every worker agrees
+_REDIS_ACQUIRE = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local count = tonumber(ARGV[2])
+local full_at = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+local new_full_at = full_at + interval
+local wait = new_full_at - count * interval - now
+if wait > 1e-9 then
+    return tostring(wait)
+end
+redis.call('SET', KEYS[1], tostring(new_full_at), 'PX', math.ceil((new_full_at - now) * 1000))
+return '0'
+"""
+
+
+class RedisStore:
+    """Token buckets shared by every worker; keys expire once their bucket is full"""
+
+    def __init__(self, url: str):
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_ACQUIRE)
+
+    async def acquire(self, key: str, limit: RateLimit) -> float:
+        try:
+            wait = await self._script(keys=[f"ratelimit:{key}"], args=[limit.interval, limit.count])
+        except Exception as e:
+            # Fail open: an unreachable store should not take the chat down with it
+            print(f"Rate limit store error: {e}")
+            return 0.0
+        return float(wait)
+
+
+def _create_store():
+    if RATE_LIMIT_STORE == "redis":
+        if redis is not None:
+            return RedisStore(RATE_LIMIT_REDIS_URL)
+        print("RATE_LIMIT_STORE=redis needs the redis package; using the in-memory store")
+    return MemoryStore()
+
+
+class RateLimiter:
+    """Applies the per-IP, per-chat and per-agent limits"""
+
+    def __init__(self, store=None):
+        self.store = store or _create_store()
+
+    async def hit(self, *checks: Tuple[RateLimit, Optional[object]]) -> float:
+        """
+        Take a token from each (limit, key) bucket in turn; returns 0 when all
+        allowed, else the wait reported by the first that refused.
+        """
+        if not RATE_LIMIT_ENABLED:
+            return 0.0
+        for limit, key in checks:
+            if not limit.enabled or key is None:
+                continue
+            wait = await self.store.acquire(f"{limit.name}:{key}", limit)
+            if wait > 0:
+                rate_limited.labels(limit.name).inc()
+                return wait
+        return 0.0
+
+    async def chat_creation(self, ip: str) -> float:
+        return await self.hit((CHATS_PER_IP, ip))
+
+    async def message(self, ip: str, chat_session_id: int, sender_id: Optional[int]) -> float:
+        return await self.hit(
+            (MESSAGES_PER_IP, ip),
+            (MESSAGES_PER_CHAT, chat_session_id),
+            (MESSAGES_PER_AGENT, sender_id)
+        )
+
+
+class AdmissionController:
+    """
+    Sheds load globally: new chats while too many are already waiting for an
+    agent, and any new work while the event loop is lagging.
+    """
+
+    def __init__(self):
+        self._checked_at = 0.0
+        self._reason: Optional[str] = None
+        self._queue_full = False
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._checked_at < ADMISSION_CHECK_INTERVAL_SECONDS:
+            return
+        self._checked_at = now
+        self._reason = None
+        if ADMISSION_MAX_LOOP_LAG_MS > 0 and loop_monitor.recent_lag() * 1000 > ADMISSION_MAX_LOOP_LAG_MS:
+            self._reason = "loop_lag"
+        self._queue_full = (
+            ADMISSION_MAX_WAITING_CHATS > 0
+            and supervisor_hub.waiting_count() >= ADMISSION_MAX_WAITING_CHATS
+        )
+
+    def rejection(self, new_chat: bool = False) -> Optional[str]:
+        """Why new work should be refused right now, or None to admit it"""
+        if not RATE_LIMIT_ENABLED:
+            return None
+        self._refresh()
+        reason = self._reason or ("queue_depth" if new_chat and self._queue_full else None)
+        if reason is not None:
+            admission_rejections.labels(reason).inc()
+        return reason
+
+
+def client_ip(connection: HTTPConnection) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = connection.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return connection.client.host if connection.client else "unknown"
+
+
+def _too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+async def limit_chat_creation(request: Request):
+    """Dependency refusing new chats from busy clients or while the server is overloaded"""
+    if admission.rejection(new_chat=True):
+        raise _too_many_requests("Server is busy, please try again shortly", ADMISSION_RETRY_AFTER_SECONDS)
+    wait = await rate_limiter.chat_creation(client_ip(request))
+    if wait:
+        raise _too_many_requests("Too many chats started, please wait", wait)
+
+
+async def limit_message(request: Request, chat_session_id: int, sender_id: Optional[int]):
+    """Refuse a message over the IP, chat or agent limit, or while the server is overloaded"""
+    if admission.rejection():
+        raise _too_many_requests("Server is busy, please try again shortly", ADMISSION_RETRY_AFTER_SECONDS)
+    wait = await rate_limiter.message(client_ip(request), chat_session_id, sender_id)
+    if wait:
+        raise _too_many_requests("Too many messages, please slow down", wait)
+
+
+# Global instances
+rate_limiter = RateLimiter()
+admission = AdmissionController()
@@ -0,0 +1,287 @@
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import select, and_, func
+from app.database import AsyncSessionLocal
+from app.models.models import Review, ReviewInsight, ReviewTrend, PipelineWatermark
+import asyncio
+import json
+import re
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Reviews analysed per transaction
+REVIEW_INSIGHTS_CHUNK_SIZE = int(os.getenv("REVIEW_INSIGHTS_CHUNK_SIZE", "500"))
+
+# Run the pipeline in the API process this often; 0 leaves it to maintenance.py
+REVIEW_INSIGHTS_INTERVAL_SECONDS = float(os.getenv("REVIEW_INSIGHTS_INTERVAL_SECONDS", "0"))
+
+# Ids are handed out at insert but become visible at commit, so a review may
+# appear below ids already seen. The watermark only passes reviews older than
+# this; newer ones are told apart by their review_insights row
+REVIEW_INSIGHTS_GRACE_SECONDS = float(os.getenv("REVIEW_INSIGHTS_GRACE_SECONDS", "300"))
+
+# Keywords kept per review, and per trend row
+KEYWORDS_PER_REVIEW = 5
+KEYWORDS_PER_TREND = 50
+
+WATERMARK_NAME = "review_insights"
+
+SCOPE_AGENT = "agent"
+SCOPE_DEPARTMENT = "department"
+
+POSITIVE_WORDS = {
+    "good": 1.0, "great": 1.5, "excellent": 2.0, "amazing": 2.0, "awesome": 2.0,
+    "fantastic": 2.0, "helpful": 1.5, "friendly": 1.2, "polite": 1.0, "quick": 1.0,
+    "fast": 1.0, "efficient": 1.2, "resolved": 1.5, "solved": 1.5, "fixed": 1.2,
+    "thanks": 0.8, "thank": 0.8, "happy": 1.5, "satisfied": 1.5, "pleased": 1.2,
+    "love": 1.8, "perfect": 2.0, "professional": 1.2, "clear": 0.8, "easy": 1.0,
+    "knowledgeable": 1.5, "patient": 1.2, "recommend": 1.5, "best": 1.8, "nice": 1.0,
+    "smooth": 1.0, "kind": 1.0, "appreciate": 1.2, "responsive": 1.2,
+}
+
+NEGATIVE_WORDS = {
+    "bad": -1.5, "terrible": -2.0, "awful": -2.0, "horrible": -2.0, "worst": -2.0,
+    "slow": -1.2, "rude": -2.0, "unhelpful": -1.8, "useless": -2.0, "poor": -1.5,
+    "waiting": -0.8, "waited": -1.0, "wait": -0.6, "late": -1.0, "delay": -1.0,
+    "delayed": -1.0, "unresolved": -1.8, "problem": -0.8, "issue": -0.6, "broken": -1.2,
+    "angry": -1.8, "frustrated": -1.8, "frustrating": -1.8, "disappointed": -1.8,
+    "disappointing": -1.8, "confusing": -1.2, "confused": -1.0, "never": -0.8,
+    "refund": -0.4, "cancel": -0.6, "transferred": -0.5, "ignored": -1.8, "hate": -2.0,
+    "annoying": -1.5, "wrong": -1.2, "incompetent": -2.0, "impatient": -1.2,
+}
+
+NEGATIONS = {"not", "no", "never", "dont", "didnt", "wasnt", "isnt", "cant", "couldnt", "wont", "hardly"}
+INTENSIFIERS = {"very": 1.5, "really": 1.4, "extremely": 1.8, "so": 1.3, "super": 1.5, "quite": 1.2}
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "if", "then", "so", "to", "of", "in", "on", "at",
+    "for", "with", "from", "by", "about", "as", "is", "was", "were", "are", "be", "been",
+    "it", "its", "this", "that", "these", "those", "i", "me", "my", "we", "our", "you",
+    "your", "he", "she", "they", "them", "their", "his", "her", "had", "has", "have",
+    "do", "did", "does", "just", "very", "really", "also", "too", "all", "any", "some",
+    "would", "could", "should", "will", "can", "get", "got", "one", "there", "what",
+    "when", "which", "who", "how", "up", "out", "again", "more", "much", "after",
+    "before", "still", "even", "am", "im", "ive", "quite", "super", "extremely",
+} | NEGATIONS
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+_CLAUSE_RE = re.compile(r"[.,;:!?()\n]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower().replace("'", ""))
+
+
+def sentiment(tokens: List[str]) -> Optional[float]:
+    """
+    Lexicon score in [-1, 1], or None if no sentiment word occurs. A negation
+    within the three preceding words flips a word, an intensifier right
+    before it scales it.
+    """
+    total = 0.0
+    matched = 0
+    for i, token in enumerate(tokens):
+        weight = POSITIVE_WORDS.get(token) or NEGATIVE_WORDS.get(token)
+        if weight is None:
+            continue
+        if i > 0 and tokens[i - 1] in INTENSIFIERS:
+            weight *= INTENSIFIERS[tokens[i - 1]]
+        if any(t in NEGATIONS for t in tokens[max(0, i - 3):i]):
+            weight *= -0.8
+        total += weight
+        matched += 1
+    if not matched:
+        return None
+    # Squash into [-1, 1]; more matched words give a more confident score
+    return max(-1.0, min(1.0, total / (matched + 1)))
+
+
+def keywords(text: str, limit: int = KEYWORDS_PER_REVIEW) -> List[str]:
+    """Most frequent content words, and two-word phrases within a clause"""
+    counts: Counter = Counter()
+    for clause in _CLAUSE_RE.split(text):
+        tokens = tokenize(clause)
+        counts.update(t for t in tokens if t not in STOPWORDS and len(t) > 2)
+        for first, second in zip(tokens, tokens[1:]):
+            if first not in STOPWORDS and second not in STOPWORDS and len(first) > 2 and len(second) > 2:
+                # A repeated phrase outranks its single words
+                counts[f"{first} {second}"] += 1.5
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], -len(item[0]), item[0]))
+    return [word for word, _ in ranked[:limit]]
+
+
+def analyze_comment(comment: Optional[str]) -> Tuple[Optional[float], str, List[str]]:
+    """Sentiment score, label and keywords for one review comment"""
+    score = sentiment(tokenize(comment or ""))
+    if score is None or -0.15 < score < 0.15:
+        label = "neutral"
+    else:
+        label = "positive" if score > 0 else "negative"
+    return score, label, keywords(comment or "")
+
+
+def _period(review: Review):
+    return (review.created_at or datetime.utcnow()).date()
+
+
+async def _process_chunk(chunk_size: int) -> int:
+    """
+    Analyse the next chunk of reviews past the watermark that have no insight
+    yet; insights, trends and watermark commit together.
+    """
+    async with AsyncSessionLocal() as db:
+        watermark = await db.get(PipelineWatermark, WATERMARK_NAME)
+        if watermark is None:
+            watermark = PipelineWatermark(name=WATERMARK_NAME, last_id=0)
+            db.add(watermark)
+
+        result = await db.execute(
+            select(Review)
+            .outerjoin(ReviewInsight, ReviewInsight.review_id == Review.id)
+            .where(
+                and_(
+                    Review.id > watermark.last_id,
+                    ReviewInsight.review_id.is_(None)
+                )
+            )
+            .order_by(Review.id)
+            .limit(chunk_size)
+        )
+        reviews = result.scalars().all()
+        if not reviews:
+            return 0
+
+        # Aggregate the chunk in memory before touching the trend rows
+        deltas: Dict[Tuple[str, int, object], dict] = {}
+        for review in reviews:
+            score, label, review_keywords = analyze_comment(review.comment)
+            db.add(ReviewInsight(
+                review_id=review.id,
+                sentiment_score=score,
+                sentiment_label=label,
+                keywords=json.dumps(review_keywords)
+            ))
+
+            scopes = [(SCOPE_DEPARTMENT, review.department_id)]
+            if review.agent_id:
+                scopes.append((SCOPE_AGENT, review.agent_id))
+            for scope, scope_id in scopes:
+                delta = deltas.setdefault((scope, scope_id, _period(review)), {
+                    "review_count": 0, "rating_sum": 0, "sentiment_count": 0, "sentiment_sum": 0.0,
+                    "positive_count": 0, "negative_count": 0, "keywords": Counter()
+                })
+                delta["review_count"] += 1
+                delta["rating_sum"] += review.rating
+                if score is not None:
+                    delta["sentiment_count"] += 1
+                    delta["sentiment_sum"] += score
+                delta["positive_count"] += label == "positive"
+                delta["negative_count"] += label == "negative"
+                delta["keywords"].update(review_keywords)
+
+        # Load the affected trend rows (plus a few neighbours) in one query and fold the deltas in
+        result = await db.execute(
+            select(ReviewTrend).where(
+                and_(
+                    ReviewTrend.scope_id.in_({scope_id for _, scope_id, _ in deltas}),
+                    ReviewTrend.period.in_({period for _, _, period in deltas})
+                )
+            )
+        )
+        trends = {(t.scope, t.scope_id, t.period): t for t in result.scalars().all()}
+
+        for key, delta in deltas.items():
+            trend = trends.get(key)
+            if trend is None:
+                scope, scope_id, period = key
+                trend = ReviewTrend(
+                    scope=scope, scope_id=scope_id, period=period,
+                    review_count=0, rating_sum=0, sentiment_count=0, sentiment_sum=0.0,
+                    positive_count=0, negative_count=0, keyword_counts="{}"
+                )
+                db.add(trend)
+            trend.review_count += delta["review_count"]
+            trend.rating_sum += delta["rating_sum"]
+            trend.sentiment_count += delta["sentiment_count"]
+            trend.sentiment_sum += delta["sentiment_sum"]
+            trend.positive_count += delta["positive_count"]
+            trend.negative_count += delta["negative_count"]
+            keyword_counts = Counter(json.loads(trend.keyword_counts))
+            keyword_counts.update(delta["keywords"])
+            trend.keyword_counts = json.dumps(dict(keyword_counts.most_common(KEYWORDS_PER_TREND)))
+
+        await db.flush()
+        watermark.last_id = await _settled_watermark(db, watermark.last_id)
+        await db.commit()
+        return len(reviews)
+
+
+async def _settled_watermark(db, last_id: int) -> int:
+    """
+    The highest id the watermark can move to: past reviews old enough that
+    no lower id can still be committing, and never past one not yet analysed
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=REVIEW_INSIGHTS_GRACE_SECONDS)
+    settled = await db.scalar(
+        select(func.max(Review.id)).where(and_(Review.id > last_id, Review.created_at < cutoff))
+    )
+    if settled is None:
+        return last_id
+    pending = await db.scalar(
+        select(func.min(Review.id))
+        .outerjoin(ReviewInsight, ReviewInsight.review_id == Review.id)
+        .where(and_(Review.id > last_id, Review.id <= settled, ReviewInsight.review_id.is_(None)))
+    )
+    return settled if pending is None else pending - 1
+
+
+async def process_new_reviews(chunk_size: int = REVIEW_INSIGHTS_CHUNK_SIZE) -> dict:
+    """Analyse every review submitted since the last run, one chunk at a time"""
+    processed = 0
+    while True:
+        count = await _process_chunk(chunk_size)
+        processed += count
+        if count < chunk_size:
+            return {"reviews_processed": processed}
+        # Let request handlers run between chunks
+        await asyncio.sleep(0)
+
+
+class ReviewInsightsRunner:
+    """Periodically runs the review insights pipeline from inside the API process"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the runner if REVIEW_INSIGHTS_INTERVAL_SECONDS is set"""
+        if self._task is None and REVIEW_INSIGHTS_INTERVAL_SECONDS > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the runner"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(REVIEW_INSIGHTS_INTERVAL_SECONDS)
+            try:
+                await process_new_reviews()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Review insights error: {e}")
+
+
+# Global instance
+review_insights_runner = ReviewInsightsRunner()
@@ -0,0 +1,159 @@
+from typing import List, Optional
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func, and_
+from sqlalchemy.dialects import sqlite, postgresql
+from app.models.models import AgentScorecard, ChatSession, Review, User, UserRole, ChatStatus
+from app.services.wait_time_estimator import handle_seconds
+
+_COUNTERS = ("chats_closed", "handle_seconds_total", "ratings_count", "rating_sum", "transfers_out")
+
+
+async def _increment(db: AsyncSession, agent_id: int, **deltas):
+    """
+    Add to an agent's scorecard counters inside the caller's transaction.
+    Uses a single upsert where the dialect has one.
+    """
+    values = {name: deltas.get(name, 0) for name in _COUNTERS}
+    dialect = db.bind.dialect.name if db.bind is not None else ""
+
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(AgentScorecard).values(agent_id=agent_id, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AgentScorecard.agent_id],
+            set_={
+                name: getattr(AgentScorecard, name) + getattr(stmt.excluded, name)
+                for name in deltas
+            }
+        )
+        await db.execute(stmt)
+        return
+
+    result = await db.execute(
+        update(AgentScorecard)
+        .where(AgentScorecard.agent_id == agent_id)
+        .values({name: getattr(AgentScorecard, name) + value for name, value in deltas.items()})
+    )
+    if result.rowcount == 0:
+        db.add(AgentScorecard(agent_id=agent_id, **values))
+
+
+async def record_chat_closed(
+    db: AsyncSession,
+    agent_id: int,
+    created_at: Optional[datetime],
+    closed_at: Optional[datetime]
+):
+    """Count a closed chat and its handle time for the agent who had it"""
+    await _increment(
+        db, agent_id,
+        chats_closed=1,
+        handle_seconds_total=max(handle_seconds(created_at, closed_at) or 0.0, 0.0)
+    )
+
+
+async def record_review(db: AsyncSession, agent_id: int, rating: int):
+    """Count a review rating for the agent who handled the chat"""
+    await _increment(db, agent_id, ratings_count=1, rating_sum=rating)
+
+
+async def record_transfer(db: AsyncSession, agent_id: int):
+    """Count a chat the agent transferred to another department"""
+    await _increment(db, agent_id, transfers_out=1)
+
+
+async def get_scorecards(db: AsyncSession, department_id: Optional[int] = None) -> List[dict]:
+    """Scorecards for every agent, in one query over the aggregate table"""
+    query = (
+        select(
+            User.id, User.full_name, User.department_id, User.agent_status,
+            AgentScorecard.chats_closed, AgentScorecard.handle_seconds_total,
+            AgentScorecard.ratings_count, AgentScorecard.rating_sum, AgentScorecard.transfers_out
+        )
+        .outerjoin(AgentScorecard, AgentScorecard.agent_id == User.id)
+        .where(User.role == UserRole.AGENT)
+        .order_by(User.id)
+    )
+    if department_id:
+        query = query.where(User.department_id == department_id)
+
+    result = await db.execute(query)
+    scorecards = []
+    for (agent_id, full_name, agent_department_id, agent_status,
+         chats_closed, handle_total, ratings_count, rating_sum, transfers_out) in result.all():
+        chats_closed = chats_closed or 0
+        ratings_count = ratings_count or 0
+        transfers_out = transfers_out or 0
+        handled = chats_closed + transfers_out
+        scorecards.append({
+            "agent_id": agent_id,
+            "full_name": full_name,
+            "department_id": agent_department_id,
+            "agent_status": agent_status,
+            "chats_handled": chats_closed,
+            "average_handle_minutes": round(handle_total / chats_closed / 60, 2) if chats_closed else None,
+            "average_rating": round(rating_sum / ratings_count, 2) if ratings_count else None,
+            "ratings_count": ratings_count,
+            "transfers_out": transfers_out,
+            "transfer_rate": round(transfers_out / handled, 4) if handled else 0.0
+        })
+    return scorecards
+
+
+async def rebuild_scorecards(db: AsyncSession) -> int:
+    """
+    Recompute chat and rating counters from chat_sessions and reviews.
+    Transfers leave no trace in those tables, so transfer counts are kept.
+    """
+    transfers = dict((await db.execute(
+        select(AgentScorecard.agent_id, AgentScorecard.transfers_out)
+    )).all())
+
+    if db.bind.dialect.name == "sqlite":
+        duration = (func.julianday(ChatSession.closed_at) - func.julianday(ChatSession.created_at)) * 86400
+    else:
+        duration = func.extract("epoch", ChatSession.closed_at - ChatSession.created_at)
+
+    chats = {
+        agent_id: (count, total or 0.0)
+        for agent_id, count, total in (await db.execute(
+            select(
+                ChatSession.assigned_agent_id,
+                func.count(ChatSession.id),
+                func.sum(duration)
+            )
+            .where(
+                and_(
+                    ChatSession.status == ChatStatus.CLOSED,
+                    ChatSession.assigned_agent_id.isnot(None)
+                )
+            )
+            .group_by(ChatSession.assigned_agent_id)
+        )).all()
+    }
+
+    ratings = {
+        agent_id: (count, total or 0)
+        for agent_id, count, total in (await db.execute(
+            select(Review.agent_id, func.count(Review.id), func.sum(Review.rating))
+            .where(Review.agent_id.isnot(None))
+            .group_by(Review.agent_id)
+        )).all()
+    }
+
+    await db.execute(delete(AgentScorecard))
+    agent_ids = set(transfers) | set(chats) | set(ratings)
+    for agent_id in agent_ids:
+        chats_closed, handle_total = chats.get(agent_id, (0, 0.0))
+        ratings_count, rating_sum = ratings.get(agent_id, (0, 0))
+        db.add(AgentScorecard(
+            agent_id=agent_id,
+            chats_closed=chats_closed,
+            handle_seconds_total=max(handle_total, 0.0),
+            ratings_count=ratings_count,
+            rating_sum=rating_sum,
+            transfers_out=transfers.get(agent_id, 0)
+        ))
+    await db.commit()
+    return len(agent_ids)
@@ -0,0 +1,179 @@
+from typing import List, Optional
+from datetime import datetime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text, func, and_, desc, table, column, literal_column
+from app.database import engine
+from app.models.models import ChatSession, Message
+import re
+
+# Search backends, picked at startup from the database dialect
+BACKEND_FTS5 = "fts5"
+BACKEND_TSVECTOR = "tsvector"
+BACKEND_LIKE = "like"
+
+# Longest snippet returned by the LIKE fallback
+SNIPPET_CHARS = 160
+
+# External-content FTS5 index over messages.content, kept in sync by triggers
+_SQLITE_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts
+    USING fts5(content, content='messages', content_rowid='id', tokenize='unicode61 remove_diacritics 2')
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+]
+
+# Expression index, so the planner can use it for to_tsvector('simple', content) @@ ...
+_POSTGRES_FTS_DDL = [
+    """
+    CREATE INDEX IF NOT EXISTS ix_messages_content_tsv
+    ON messages USING GIN (to_tsvector('simple', content))
+    """,
+]
+
+messages_fts = table("messages_fts", column("rowid"), column("content"))
+
+
+def fts5_query(query: str) -> str:
+    """Turn free text into an FTS5 query matching every word, the last one as a prefix"""
+    words = re.findall(r"\w+", query)
+    if not words:
+        return ""
+    terms = ['"' + word + '"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+class SearchIndex:
+    """
+    Full-text search over message content.
+
+    SQLite uses an FTS5 index and PostgreSQL a GIN index on a tsvector
+    expression; both are maintained by the database as messages are written.
+    Other databases fall back to a LIKE scan.
+    """
+
+    def __init__(self):
+        self.backend = BACKEND_LIKE
+
+    async def setup(self):
+        """Create the index for the current database and backfill it if new"""
+        dialect = engine.dialect.name
+        try:
+            async with engine.begin() as conn:
+                if dialect == "sqlite":
+                    result = await conn.execute(
+                        text("SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'")
+                    )
+                    existed = result.first() is not None
+                    for statement in _SQLITE_FTS_DDL:
+                        await conn.execute(text(statement))
+                    if not existed:
+                        await conn.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+                    self.backend = BACKEND_FTS5
+                elif dialect == "postgresql":
+                    for statement in _POSTGRES_FTS_DDL:
+                        await conn.execute(text(statement))
+                    self.backend = BACKEND_TSVECTOR
+        except Exception as e:
+            print(f"Full-text index unavailable, falling back to LIKE search: {e}")
+            self.backend = BACKEND_LIKE
+
+    async def search(
+        self,
+        db: AsyncSession,
+        query: str,
+        department_id: Optional[int] = None,
+        agent_id: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        skip: int = 0,
+        limit: int = 50
+    ) -> List[dict]:
+        """Matching messages, newest first, with their chat's department and agent"""
+        if self.backend == BACKEND_FTS5:
+            match = fts5_query(query)
+            if not match:
+                return []
+            snippet = func.snippet(literal_column("messages_fts"), 0, "[", "]", "...", 16)
+            stmt = (
+                select(Message, snippet.label("snippet"))
+                .join(messages_fts, messages_fts.c.rowid == Message.id)
+                .where(text("messages_fts MATCH :match").bindparams(match=match))
+            )
+            # FTS5 walks its index in rowid order, so this stops after `limit` matches
+            order = desc(messages_fts.c.rowid)
+        elif self.backend == BACKEND_TSVECTOR:
+            tsquery = func.plainto_tsquery("simple", query)
+            snippet = func.ts_headline(
+                "simple", Message.content, tsquery,
+                "StartSel=[, StopSel=], MaxWords=24, MinWords=8"
+            )
+            stmt = (
+                select(Message, snippet.label("snippet"))
+                .where(func.to_tsvector("simple", Message.content).op("@@")(tsquery))
+            )
+            order = desc(Message.id)
+        else:
+            if not query.strip():
+                return []
+            pattern = "%" + query.strip().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            stmt = (
+                select(Message, func.substr(Message.content, 1, SNIPPET_CHARS).label("snippet"))
+                .where(Message.content.ilike(pattern, escape="\\"))
+            )
+            order = desc(Message.id)
+
+        stmt = stmt.add_columns(
+            ChatSession.department_id,
+            ChatSession.assigned_agent_id,
+            ChatSession.customer_name,
+            ChatSession.status
+        ).join(ChatSession, ChatSession.id == Message.chat_session_id)
+
+        filters = []
+        if department_id:
+            filters.append(ChatSession.department_id == department_id)
+        if agent_id:
+            filters.append(ChatSession.assigned_agent_id == agent_id)
+        if date_from:
+            filters.append(Message.created_at >= date_from)
+        if date_to:
+            filters.append(Message.created_at <= date_to)
+        if filters:
+            stmt = stmt.where(and_(*filters))
+
+        result = await db.execute(stmt.order_by(order).offset(skip).limit(limit))
+        return [
+            {
+                "message_id": message.id,
+                "chat_session_id": message.chat_session_id,
+                "sender_name": message.sender_name,
+                "snippet": snippet_text,
+                "created_at": message.created_at,
+                "department_id": department,
+                "assigned_agent_id": agent,
+                "customer_name": customer_name,
+                "status": chat_status
+            }
+            for message, snippet_text, department, agent, customer_name, chat_status in result.all()
+        ]
+
+
+# Global instance
+search_index = SearchIndex()
@@ -0,0 +1,104 @@
+from typing import Dict, List, Optional
+import importlib
+import os
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Print the startup phase timings once the app is ready
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "false").lower() == "true"
+
+# Import back-office routers (departments, users, reviews, admin) on their
+# first request instead of at startup
+LAZY_ROUTERS = os.getenv("LAZY_ROUTERS", "true").lower() == "true"
+
+
+class StartupProfile:
+    """Wall time of each startup phase, measured from the import of app.main"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases: List[dict] = []
+        self.ready_ms: Optional[float] = None
+        self.first_request_ms: Optional[float] = None
+
+    def mark(self, name: str):
+        """Close the phase running since the previous mark under `name`"""
+        now = time.perf_counter()
+        self.phases.append({"phase": name, "ms": round((now - self._last) * 1000, 1)})
+        self._last = now
+
+    def ready(self):
+        """The app is about to accept requests"""
+        self.ready_ms = round((time.perf_counter() - self.started) * 1000, 1)
+        if STARTUP_PROFILE:
+            print(self.format())
+
+    def request_served(self):
+        if self.first_request_ms is None:
+            self.first_request_ms = round((time.perf_counter() - self.started) * 1000, 1)
+
+    def format(self) -> str:
+        lines = [f"Startup profile ({self.ready_ms}ms to ready):"]
+        lines.extend(f"  {p['phase']:<28}{p['ms']:>9.1f}ms" for p in self.phases)
+        return "\n".join(lines)
+
+    def report(self) -> dict:
+        return {
+            "phases": self.phases,
+            "ready_ms": self.ready_ms,
+            "first_request_ms": self.first_request_ms,
+            "lazy_routers": LAZY_ROUTERS,
+        }
+
+
+# Global instance
+startup_profile = StartupProfile()
+
+
+class LazyRouterMiddleware:
+    """
+    ASGI middleware including routers on demand. `routers` maps a path
+    prefix to the module holding `router`; the module is imported and its
+    router included when the first request under the prefix arrives, or
+    when the OpenAPI schema is asked for. Requests are routed per call, so
+    routes added this way are served straight away.
+    """
+
+    def __init__(self, app, fastapi_app, routers: Dict[str, str]):
+        self.app = app
+        self.fastapi_app = fastapi_app
+        self.pending = dict(routers)
+
+    def _load(self, prefix: str):
+        module_name = self.pending.pop(prefix, None)
+        if module_name is None:
+            return
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        self.fastapi_app.include_router(module.router)
+        # The schema may have been generated without these routes
+        self.fastapi_app.openapi_schema = None
+        startup_profile.phases.append({
+            "phase": f"lazy load {module_name.rsplit('.', 1)[-1]}",
+            "ms": round((time.perf_counter() - start) * 1000, 1)
+        })
+
+    def load_all(self):
+        for prefix in list(self.pending):
+            self._load(prefix)
+
+    async def __call__(self, scope, receive, send):
+        if self.pending and scope["type"] in ("http", "websocket"):
+            path = scope["path"]
+            if path in (self.fastapi_app.openapi_url, self.fastapi_app.docs_url, self.fastapi_app.redoc_url):
+                self.load_all()
+            else:
+                for prefix in list(self.pending):
+                    if path == prefix or path.startswith(prefix + "/"):
+                        self._load(prefix)
+        await self.app(scope, receive, send)
+        if scope["type"] == "http" and startup_profile.first_request_ms is None:
+            startup_profile.request_served()
@@ -0,0 +1,382 @@
+from typing import Dict, List, Optional, Set
+from datetime import datetime
+from sqlalchemy import select, event, inspect
+from sqlalchemy.orm import Session
+from app.database import AsyncSessionLocal
+from app.models.models import ChatSession, User, UserRole, ChatStatus, AgentStatus
+from app.services.websocket_manager import manager
+from app.services.metrics import Gauge
+import asyncio
+import time
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Changes are collected and sent to supervisors at most this often
+SUPERVISOR_TICK_SECONDS = float(os.getenv("SUPERVISOR_TICK_MS", "500")) / 1000
+
+# The in-memory state is checked against the database this often, to pick up
+# changes made outside the ORM (for example bulk UPDATEs)
+SUPERVISOR_RESYNC_SECONDS = float(os.getenv("SUPERVISOR_RESYNC_SECONDS", "60"))
+
+# Session.info key holding state changes flushed in the current transaction
+_CHANGES_KEY = "supervisor_changes"
+
+# Model columns -> keys of the state sent to supervisors
+_CHAT_FIELDS = {
+    "id": "chat_session_id",
+    "department_id": "department_id",
+    "assigned_agent_id": "assigned_agent_id",
+    "status": "status",
+    "customer_name": "customer_name",
+    "created_at": "created_at",
+}
+_AGENT_FIELDS = {
+    "id": "agent_id",
+    "full_name": "full_name",
+    "department_id": "department_id",
+    "agent_status": "status",
+}
+
+
+def _value(value):
+    if isinstance(value, (ChatStatus, AgentStatus)):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _state(mapping: Dict[str, str], fields: dict, base: Optional[dict] = None) -> dict:
+    """Merge the given column values into a state dict; absent columns keep their value"""
+    state = dict(base) if base is not None else {key: None for key in mapping.values()}
+    for column, key in mapping.items():
+        if column in fields:
+            state[key] = _value(fields[column])
+    return state
+
+
+# Department recorded for a chat or agent that did not exist at the last tick
+_NEW = object()
+
+
+class SupervisorHub:
+    """
+    In-memory view of open chats and agents for the /ws/supervisor stream.
+
+    Committed ORM changes to chats and agents are applied as they happen.
+    A background tick turns the accumulated changes into one delta per
+    department filter, encoded once and sent to every supervisor with that
+    filter, so the cost per tick does not grow with the number of supervisors.
+    """
+
+    def __init__(self):
+        # Maps: chat_session_id -> state, for chats that are not closed
+        self.chats: Dict[int, dict] = {}
+
+        # Maps: agent_user_id -> state, for active agents
+        self.agents: Dict[int, dict] = {}
+
+        # Changes since the last tick; removed chats remember their department
+        self._changed_chats: Set[int] = set()
+        self._removed_chats: Dict[int, Optional[int]] = {}
+        self._changed_agents: Set[int] = set()
+        # Department of each changed chat and agent at the last tick (_NEW if absent),
+        # so a department's supervisors hear only about what they have seen
+        self._chats_before: Dict[int, object] = {}
+        self._agents_before: Dict[int, object] = {}
+
+        self.loaded = False
+        self.deltas_sent = 0
+        self._load_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def ensure_loaded(self):
+        """Load the initial state from the database once"""
+        if self.loaded:
+            return
+        async with self._load_lock:
+            if not self.loaded:
+                await self.resync()
+                self.loaded = True
+
+    async def resync(self):
+        """Reload chats and agents from the database, recording any difference as a change"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(ChatSession).where(ChatSession.status != ChatStatus.CLOSED)
+            )
+            chats = {
+                chat.id: _state(_CHAT_FIELDS, {f: getattr(chat, f) for f in _CHAT_FIELDS})
+                for chat in result.scalars()
+            }
+            result = await db.execute(
+                select(User).where(User.role == UserRole.AGENT, User.is_active == True)
+            )
+            agents = {
+                user.id: _state(_AGENT_FIELDS, {f: getattr(user, f) for f in _AGENT_FIELDS})
+                for user in result.scalars()
+            }
+
+        for chat_id in set(self.chats) - set(chats):
+            self._remove_chat(chat_id)
+        for chat_id, state in chats.items():
+            if self.chats.get(chat_id) != state:
+                self._chat_changed(chat_id, self.chats.get(chat_id))
+                self.chats[chat_id] = state
+        for agent_id in set(self.agents) - set(agents):
+            self._agent_changed(agent_id, self.agents.pop(agent_id))
+        for agent_id, state in agents.items():
+            if self.agents.get(agent_id) != state:
+                self._agent_changed(agent_id, self.agents.get(agent_id))
+                self.agents[agent_id] = state
+
+    def _chat_changed(self, chat_id: int, before: Optional[dict]):
+        """Mark a chat changed, given its state before this change"""
+        if chat_id not in self._changed_chats:
+            self._chats_before[chat_id] = (
+                before["department_id"] if before is not None
+                else self._removed_chats.get(chat_id, _NEW)
+            )
+            self._changed_chats.add(chat_id)
+        self._removed_chats.pop(chat_id, None)
+
+    def _agent_changed(self, agent_id: int, before: Optional[dict]):
+        """Mark an agent changed, given its state before this change"""
+        if agent_id not in self._changed_agents:
+            self._agents_before[agent_id] = before["department_id"] if before is not None else _NEW
+            self._changed_agents.add(agent_id)
+
+    def _remove_chat(self, chat_id: int):
+        state = self.chats.pop(chat_id, None)
+        if state is None:
+            return
+        department_id = self._chats_before.pop(chat_id, state["department_id"])
+        self._changed_chats.discard(chat_id)
+        # A chat opened and closed within one tick was never sent
+        if department_id is not _NEW:
+            self._removed_chats[chat_id] = department_id
+
+    def apply_chat(self, fields: dict):
+        """Apply the committed column values of a chat"""
+        chat_id = fields["id"]
+        if fields.get("status") == ChatStatus.CLOSED:
+            self._remove_chat(chat_id)
+            return
+
+        state = self.chats.get(chat_id)
+        updated = _state(_CHAT_FIELDS, fields, state)
+        if updated["created_at"] is None:
+            updated["created_at"] = datetime.utcnow().isoformat()
+        if state != updated:
+            self._chat_changed(chat_id, state)
+            self.chats[chat_id] = updated
+
+    def apply_agent(self, fields: dict):
+        """Apply the committed column values of a user, ignoring non-agents"""
+        agent_id = fields["id"]
+        state = self.agents.get(agent_id)
+        role = fields.get("role")
+        if (role is not None and role != UserRole.AGENT) or fields.get("is_active") is False:
+            if state is not None:
+                del self.agents[agent_id]
+                self._agent_changed(agent_id, state)
+            return
+        if state is None and role is None:
+            # A partially loaded user we have never seen; the next resync picks it up
+            return
+
+        updated = _state(_AGENT_FIELDS, fields, state)
+        if state != updated:
+            self._agent_changed(agent_id, state)
+            self.agents[agent_id] = updated
+
+    def set_agent_status(self, agent_ids: List[int], status: AgentStatus):
+        """Apply a status written with a bulk UPDATE"""
+        for agent_id in agent_ids:
+            state = self.agents.get(agent_id)
+            if state is not None and state["status"] != status.value:
+                self._agent_changed(agent_id, state)
+                state["status"] = status.value
+
+    def _summary(self, department_id: Optional[int]) -> dict:
+        summary: Dict[int, dict] = {}
+
+        def department(dept_id):
+            return summary.setdefault(dept_id, {
+                "waiting": 0, "active": 0,
+                "agents_available": 0, "agents_busy": 0, "agents_offline": 0
+            })
+
+        for chat in self.chats.values():
+            if department_id is None or chat["department_id"] == department_id:
+                if chat["status"] == ChatStatus.WAITING.value:
+                    department(chat["department_id"])["waiting"] += 1
+                elif chat["status"] == ChatStatus.ACTIVE.value:
+                    department(chat["department_id"])["active"] += 1
+        for agent in self.agents.values():
+            if department_id is None or agent["department_id"] == department_id:
+                department(agent["department_id"])["agents_" + (agent["status"] or "offline")] += 1
+        return {str(dept_id): counts for dept_id, counts in summary.items()}
+
+    def waiting_count(self) -> int:
+        """Chats waiting for an agent across all departments"""
+        return sum(1 for chat in self.chats.values() if chat["status"] == ChatStatus.WAITING.value)
+
+    def snapshot(self, department_id: Optional[int] = None) -> dict:
+        """Full state for a newly connected supervisor"""
+        return {
+            "type": "supervisor_snapshot",
+            "department_id": department_id,
+            "chats": [
+                chat for chat in self.chats.values()
+                if department_id is None or chat["department_id"] == department_id
+            ],
+            "agents": [
+                agent for agent in self.agents.values()
+                if department_id is None or agent["department_id"] == department_id
+            ],
+            "summary": self._summary(department_id)
+        }
+
+    def _delta(self, department_id: Optional[int]) -> Optional[dict]:
+        def visible(dept_id):
+            return department_id is None or dept_id == department_id
+
+        chats = [
+            self.chats[chat_id] for chat_id in self._changed_chats
+            if visible(self.chats[chat_id]["department_id"])
+        ]
+        # A transfer out of the department looks like a removal to its supervisors;
+        # chats that were never in it are left out
+        removed = [chat_id for chat_id, dept_id in self._removed_chats.items() if visible(dept_id)]
+        if department_id is not None:
+            removed += [
+                chat_id for chat_id in self._changed_chats
+                if self.chats[chat_id]["department_id"] != department_id
+                and self._chats_before[chat_id] == department_id
+            ]
+        agents = [self.agents[agent_id] for agent_id in self._changed_agents
+                  if agent_id in self.agents and visible(self.agents[agent_id]["department_id"])]
+        removed_agents = [
+            agent_id for agent_id in self._changed_agents
+            if self._agents_before[agent_id] is not _NEW and visible(self._agents_before[agent_id])
+            and (agent_id not in self.agents or not visible(self.agents[agent_id]["department_id"]))
+        ]
+
+        if not (chats or removed or agents or removed_agents):
+            return None
+        return {
+            "type": "supervisor_delta",
+            "department_id": department_id,
+            "chats": chats,
+            "removed_chats": removed,
+            "agents": agents,
+            "removed_agents": removed_agents,
+            "summary": self._summary(department_id)
+        }
+
+    async def tick(self):
+        """Send the changes since the last tick to every supervisor group"""
+        if not (self._changed_chats or self._removed_chats or self._changed_agents):
+            return
+
+        groups = set(manager.supervisor_connections.values())
+        deltas = {department_id: self._delta(department_id) for department_id in groups}
+
+        self._changed_chats.clear()
+        self._removed_chats.clear()
+        self._changed_agents.clear()
+        self._chats_before.clear()
+        self._agents_before.clear()
+
+        for department_id, delta in deltas.items():
+            if delta is not None:
+                await manager.broadcast_to_supervisors(delta, department_id)
+                self.deltas_sent += 1
+
+    def start(self):
+        """Start the background tick on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background tick"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        last_resync = time.monotonic()
+        while True:
+            await asyncio.sleep(SUPERVISOR_TICK_SECONDS)
+            try:
+                await self.ensure_loaded()
+                if time.monotonic() - last_resync >= SUPERVISOR_RESYNC_SECONDS:
+                    last_resync = time.monotonic()
+                    await self.resync()
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Supervisor hub error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "supervisor_chats": len(self.chats),
+            "supervisor_agents": len(self.agents),
+            "supervisor_deltas_sent": self.deltas_sent
+        }
+
+
+# Global instance
+supervisor_hub = SupervisorHub()
+
+queue_depth = Gauge(
+    "chat_queue_depth",
+    "Chats waiting for an agent, by department",
+    ("department",),
+    callback=lambda: {
+        department_id: counts["waiting"]
+        for department_id, counts in supervisor_hub._summary(None).items()
+    }
+)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_supervisor_changes(session: Session, flush_context):
+    # Read only loaded values: touching an expired attribute here would load it
+    changes = session.info.setdefault(_CHANGES_KEY, [])
+    for instance in list(session.new) + list(session.dirty):
+        if isinstance(instance, ChatSession):
+            loaded = inspect(instance).dict
+            changes.append(("chat", {f: loaded[f] for f in _CHAT_FIELDS if f in loaded}))
+        elif isinstance(instance, User):
+            loaded = inspect(instance).dict
+            columns = list(_AGENT_FIELDS) + ["role", "is_active"]
+            changes.append(("agent", {f: loaded[f] for f in columns if f in loaded}))
+    for instance in session.deleted:
+        if isinstance(instance, User):
+            changes.append(("agent", {"id": instance.id, "is_active": False}))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_supervisor_changes(session: Session):
+    for kind, fields in session.info.pop(_CHANGES_KEY, []):
+        if fields.get("id") is None:
+            continue
+        if kind == "chat":
+            supervisor_hub.apply_chat(fields)
+        else:
+            supervisor_hub.apply_agent(fields)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_supervisor_changes(session: Session):
+    session.info.pop(_CHANGES_KEY, None)
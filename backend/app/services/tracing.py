@@ -0,0 +1,332 @@
+from typing import Callable, Dict, List, Optional
+from contextvars import ContextVar
+from functools import wraps
+import json
+import os
+import re
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Fraction of new traces recorded; 0 turns tracing off. Requests carrying a
+# sampled `traceparent` header are always recorded (parent-based sampling).
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "0"))
+
+# Where finished spans go: "console" (one OTLP-style JSON line per span) or "memory"
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "console")
+
+# Longest SQL statement kept as a span attribute
+MAX_STATEMENT_CHARS = 500
+
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+STATUS_UNSET = "UNSET"
+STATUS_ERROR = "ERROR"
+
+
+class Span:
+    """One timed operation, with the same identifiers and fields as an OpenTelemetry span"""
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns",
+                 "attributes", "status", "status_message", "_token")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Optional[dict] = None):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes or {}
+        self.status = STATUS_UNSET
+        self.status_message: Optional[str] = None
+        self._token = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(exc).__name__}: {exc}"
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns is not None else None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict:
+        """The span in OTLP JSON field names"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message or ""},
+        }
+
+
+class ConsoleSpanExporter:
+    """Prints each finished span as one JSON line"""
+
+    def export(self, spans: List[Span]):
+        for span in spans:
+            print(json.dumps(span.to_dict(), default=str))
+
+
+class InMemorySpanExporter:
+    """Keeps finished spans in a list, for tests and benchmarks"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, spans: List[Span]):
+        self.spans.extend(spans)
+
+    def get_finished_spans(self) -> List[Span]:
+        return list(self.spans)
+
+    def clear(self):
+        self.spans.clear()
+
+
+# The span new spans are parented to; None outside a sampled trace
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanScope:
+    """Context manager making a span current for its duration"""
+    __slots__ = ("tracer", "span")
+
+    def __init__(self, tracer: "Tracer", span: Span):
+        self.tracer = tracer
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.span._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.span.record_exception(exc)
+        _current_span.reset(self.span._token)
+        self.tracer.end(self.span)
+        return False
+
+
+class _NoopScope:
+    """Returned when nothing is being traced; costs one call and no allocation"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SCOPE = _NoopScope()
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace_id, parent span_id, sampled) from a W3C traceparent header, or None"""
+    if not header:
+        return None
+    match = _TRACEPARENT_RE.match(header.strip().lower())
+    if match is None or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the exporter.
+
+    Only requests picked by the sampler get a root span; everything else
+    sees no current span and skips span creation, so unsampled requests and
+    the disabled mode cost a context variable lookup per instrumented call.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, exporter=None):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.spans_exported = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 and self.exporter is not None
+
+    def configure(self, sample_rate: float, exporter=None):
+        """Change the sampler and exporter at runtime"""
+        self.sample_rate = sample_rate
+        if exporter is not None:
+            self.exporter = exporter
+
+    def _sampled(self, trace_id: str) -> bool:
+        # Decided from the trace id, like OpenTelemetry's TraceIdRatioBased sampler
+        return int(trace_id[16:], 16) < self.sample_rate * (1 << 64)
+
+    def start_root(self, name: str, traceparent: Optional[str] = None, attributes: Optional[dict] = None) -> Optional[Span]:
+        """
+        A root span for an incoming request, continuing the caller's trace if
+        it sent a traceparent header; None if the request is not sampled.
+        """
+        if not self.enabled:
+            return None
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = self._sampled(trace_id)
+        if not sampled:
+            return None
+        return Span(name, trace_id, parent_id, attributes)
+
+    def activate(self, span: Span) -> _SpanScope:
+        return _SpanScope(self, span)
+
+    def span(self, name: str, attributes: Optional[dict] = None):
+        """Context manager for a child of the current span; does nothing outside a trace"""
+        parent = _current_span.get()
+        if parent is None:
+            return _NOOP_SCOPE
+        return _SpanScope(self, Span(name, parent.trace_id, parent.span_id, attributes))
+
+    def start_span(self, name: str, attributes: Optional[dict] = None) -> Optional[Span]:
+        """A child of the current span that is not made current; end it with end()"""
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        return Span(name, parent.trace_id, parent.span_id, attributes)
+
+    def end(self, span: Span):
+        span.end_ns = time.time_ns()
+        exporter = self.exporter
+        if exporter is not None:
+            try:
+                exporter.export([span])
+                self.spans_exported += 1
+            except Exception as e:
+                print(f"Error exporting span: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "tracing_sample_rate": self.sample_rate,
+            "tracing_spans_exported": self.spans_exported
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def _make_exporter(name: str):
+    if name == "memory":
+        return InMemorySpanExporter()
+    if name == "console":
+        return ConsoleSpanExporter()
+    return None
+
+
+# Global instance
+tracer = Tracer(TRACING_SAMPLE_RATE, _make_exporter(TRACING_EXPORTER))
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """Decorator wrapping an async function in a span named after it"""
+    def decorator(func):
+        span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return await func(*args, **kwargs)
+            with tracer.span(span_name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening the root span of each sampled HTTP request. The
+    span is named after the matched route template once routing is done, and
+    the response carries its `traceparent` so clients can find the trace.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers: Dict[bytes, bytes] = dict(scope["headers"])
+        traceparent = headers.get(b"traceparent")
+        span = tracer.start_root(
+            f"HTTP {scope['method']}",
+            traceparent.decode("latin-1") if traceparent else None,
+            {"http.method": scope["method"], "http.target": scope["path"]}
+        )
+        if span is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.status = STATUS_ERROR
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"traceparent", span.traceparent.encode("latin-1"))
+                ]
+            await send(message)
+
+        with tracer.activate(span):
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"HTTP {scope['method']} {route.path}"
+                    span.set_attribute("http.route", route.path)
+
+
+def instrument_engine(engine):
+    """Record a span for every SQL statement executed inside a trace"""
+    from sqlalchemy import event
+
+    sync_engine = engine.sync_engine
+    system = sync_engine.dialect.name
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start_statement(conn, cursor, statement, parameters, context, executemany):
+        if _current_span.get() is None:
+            return
+        span = tracer.start_span("db.query", {
+            "db.system": system,
+            "db.statement": statement[:MAX_STATEMENT_CHARS],
+        })
+        conn.info.setdefault("tracing_spans", []).append(span)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _end_statement(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("tracing_spans")
+        if spans:
+            tracer.end(spans.pop())
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _fail_statement(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("tracing_spans") if conn is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(exception_context.original_exception)
+            tracer.end(span)
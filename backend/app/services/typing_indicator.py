@@ -0,0 +1,146 @@
+from typing import Dict, Optional, Tuple
+from app.services.websocket_manager import manager
+import asyncio
+import time
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Minimum time between two broadcast transitions for the same (chat, sender)
+TYPING_MIN_INTERVAL_SECONDS = float(os.getenv("TYPING_MIN_INTERVAL_SECONDS", "1.0"))
+
+# A sender that stops sending typing frames is shown as not typing after this long
+TYPING_EXPIRY_SECONDS = float(os.getenv("TYPING_EXPIRY_SECONDS", "5.0"))
+
+# How often deferred transitions and expiries are processed
+TYPING_TICK_SECONDS = float(os.getenv("TYPING_TICK_SECONDS", "0.25"))
+
+
+class _TypingState:
+    __slots__ = ("shown", "wanted", "last_emit", "last_frame")
+
+    def __init__(self):
+        self.shown = False       # value last broadcast to the chat
+        self.wanted = False      # value the sender last reported
+        self.last_emit = 0.0
+        self.last_frame = 0.0
+
+
+class TypingCoalescer:
+    """
+    Collapses per-keystroke typing frames into typing state transitions.
+
+    Only changes of a sender's typing state are broadcast, at most one per
+    TYPING_MIN_INTERVAL_SECONDS; changes that arrive sooner are deferred to
+    the background tick. A sender that goes quiet is expired to not typing.
+    """
+
+    def __init__(self):
+        # Maps: (chat_session_id, sender_name) -> typing state
+        self.states: Dict[Tuple[int, str], _TypingState] = {}
+
+        self.frames_received = 0
+        self.frames_suppressed = 0
+        self.transitions_emitted = 0
+        self.expirations = 0
+
+        self._task: Optional[asyncio.Task] = None
+
+    async def handle_frame(self, chat_session_id: int, sender_name: str, is_typing: bool):
+        """Process a typing frame, broadcasting only if it is a due transition"""
+        now = time.monotonic()
+        key = (chat_session_id, sender_name)
+        state = self.states.get(key)
+        if state is None:
+            state = self.states[key] = _TypingState()
+
+        self.frames_received += 1
+        state.last_frame = now
+        state.wanted = bool(is_typing)
+
+        if state.wanted == state.shown or now - state.last_emit < TYPING_MIN_INTERVAL_SECONDS:
+            self.frames_suppressed += 1
+            return
+
+        await self._emit(key, state, now)
+
+    async def stop_typing(self, chat_session_id: int, sender_name: str):
+        """Clear a sender's typing state right away (message sent or sender left)"""
+        state = self.states.pop((chat_session_id, sender_name), None)
+        if state is not None and state.shown:
+            state.wanted = False
+            await self._emit((chat_session_id, sender_name), state, time.monotonic())
+
+    async def _emit(self, key: Tuple[int, str], state: _TypingState, now: float):
+        state.shown = state.wanted
+        state.last_emit = now
+        self.transitions_emitted += 1
+        chat_session_id, sender_name = key
+        await manager.broadcast_to_chat(
+            {
+                "type": "typing",
+                "chat_session_id": chat_session_id,
+                "sender_name": sender_name,
+                "is_typing": state.shown
+            },
+            chat_session_id
+        )
+
+    async def tick(self):
+        """Emit deferred transitions, expire quiet typists and drop idle state"""
+        now = time.monotonic()
+        idle = []
+        for key, state in list(self.states.items()):
+            if state.wanted and now - state.last_frame > TYPING_EXPIRY_SECONDS:
+                state.wanted = False
+                self.expirations += 1
+
+            if state.wanted != state.shown:
+                if now - state.last_emit >= TYPING_MIN_INTERVAL_SECONDS:
+                    await self._emit(key, state, now)
+            elif not state.shown and now - state.last_frame > TYPING_EXPIRY_SECONDS:
+                idle.append(key)
+
+        for key in idle:
+            self.states.pop(key, None)
+
+    def start(self):
+        """Start the background tick on the running event loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background tick"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(TYPING_TICK_SECONDS)
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Typing coalescer error: {e}")
+
+    def stats(self) -> dict:
+        """Counters for typing frames received, suppressed and broadcast"""
+        return {
+            "typing_frames_received": self.frames_received,
+            "typing_frames_suppressed": self.frames_suppressed,
+            "typing_transitions_emitted": self.transitions_emitted,
+            "typing_expirations": self.expirations,
+            "typing_states": len(self.states)
+        }
+
+
+# Global instance
+typing_coalescer = TypingCoalescer()
@@ -0,0 +1,113 @@
+from typing import Dict, Optional
+from datetime import datetime, timezone
+import math
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Prior used for departments that have not closed any chat yet
+DEFAULT_CHAT_DURATION_MINUTES = float(os.getenv("AVERAGE_CHAT_DURATION_MINUTES", "5"))
+
+# Weight of the newest sample in the moving average (0 < alpha <= 1)
+HANDLE_TIME_EWMA_ALPHA = float(os.getenv("HANDLE_TIME_EWMA_ALPHA", "0.2"))
+
+
+def _to_utc_naive(value: datetime) -> datetime:
+    """Normalize aware datetimes to naive UTC so they compare with utcnow()"""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def handle_seconds(created_at: Optional[datetime], closed_at: Optional[datetime]) -> Optional[float]:
+    """Seconds between a chat's creation and its close, if both are known"""
+    if not created_at or not closed_at:
+        return None
+    return (_to_utc_naive(closed_at) - _to_utc_naive(created_at)).total_seconds()
+
+
+class WaitTimeEstimator:
+    """
+    Online estimator of chat handle time per department.
+
+    Keeps an exponentially weighted moving average of closed_at - created_at,
+    updated incrementally when a chat is closed. Memory is O(1) per department
+    and estimates never touch the database.
+    """
+
+    def __init__(
+        self,
+        default_minutes: float = DEFAULT_CHAT_DURATION_MINUTES,
+        alpha: float = HANDLE_TIME_EWMA_ALPHA
+    ):
+        self.default_seconds = default_minutes * 60
+        self.alpha = alpha
+
+        # Maps: department_id -> EWMA of handle time in seconds
+        self.averages: Dict[int, float] = {}
+
+        # Maps: department_id -> number of samples seen
+        self.samples: Dict[int, int] = {}
+
+    def record(self, department_id: int, duration_seconds: float):
+        """Fold a handle-time sample into the department average"""
+        if duration_seconds <= 0:
+            return
+
+        current = self.averages.get(department_id)
+        if current is None:
+            self.averages[department_id] = duration_seconds
+        else:
+            self.averages[department_id] = current + self.alpha * (duration_seconds - current)
+        self.samples[department_id] = self.samples.get(department_id, 0) + 1
+
+    def record_closed_chat(
+        self,
+        department_id: int,
+        created_at: Optional[datetime],
+        closed_at: Optional[datetime]
+    ):
+        """Record the handle time of a chat that has just been closed"""
+        seconds = handle_seconds(created_at, closed_at)
+        if seconds is not None:
+            self.record(department_id, seconds)
+
+    def average_handle_seconds(self, department_id: int) -> float:
+        """Current handle-time estimate for a department"""
+        return self.averages.get(department_id, self.default_seconds)
+
+    def estimate_wait_minutes(
+        self,
+        department_id: int,
+        position: int,
+        available_agents: int,
+        busy_agents: int
+    ) -> int:
+        """
+        Estimate the wait for the chat at `position` in the department queue.
+
+        Chats that fit on an available agent start right away. The rest are
+        served in rounds by every working agent; busy agents are on average
+        half-way through their current chat when the first round starts.
+        """
+        if position <= 0:
+            return 0
+
+        average = self.average_handle_seconds(department_id)
+        working_agents = available_agents + busy_agents
+
+        if working_agents <= 0:
+            return math.ceil(position * average / 60)
+
+        remaining = position - available_agents
+        if remaining <= 0:
+            return 0
+
+        rounds = math.ceil(remaining / working_agents)
+        wait_seconds = rounds * average - average / 2
+        return max(math.ceil(wait_seconds / 60), 0)
+
+
+# Global instance
+wait_time_estimator = WaitTimeEstimator()
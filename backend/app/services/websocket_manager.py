@@ -1,7 +1,42 @@
-from typing import Dict, List, Set
-from fastapi import WebSocket
+from typing import Dict, List, Optional, Set, Tuple, Union
+from fastapi import WebSocket, WebSocketDisconnect
+from app.services.ws_protocol import JsonCodec
+from app.services.metrics import Counter, Gauge, Histogram
+from app.services.tracing import tracer
+import asyncio
 import json
+import time
+import os
 from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How long events for a batching connection are collected before one frame is sent
+WS_BATCH_TICK_SECONDS = float(os.getenv("WS_BATCH_TICK_MS", "20")) / 1000
+
+# Codec for connections that did not negotiate a protocol
+DEFAULT_CODEC = JsonCodec()
+
+# Connection kinds tracked for heartbeats and reaping
+CHAT_CONNECTION = "chat"
+AGENT_CONNECTION = "agent"
+SUPERVISOR_CONNECTION = "supervisor"
+
+# Broadcasts usually finish in well under a millisecond per recipient
+BROADCAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+broadcast_duration = Histogram(
+    "ws_broadcast_duration_seconds",
+    "Time to fan an event out to every recipient",
+    ("target",),
+    buckets=BROADCAST_BUCKETS
+)
+send_failures = Counter(
+    "ws_send_failures_total",
+    "WebSocket sends that raised, by what was being sent",
+    ("target",)
+)
 
 
 class ConnectionManager:
@@ -12,33 +47,226 @@ class ConnectionManager:
         # Maps: agent_user_id -> WebSocket (for agent dashboard)
         self.agent_connections: Dict[int, WebSocket] = {}
 
+        # Maps: WebSocket -> department filter (None for all departments)
+        self.supervisor_connections: Dict[WebSocket, Optional[int]] = {}
+
         # Maps: department_id -> Set[agent_user_id] (available agents)
         self.available_agents: Dict[int, Set[int]] = {}
 
-    async def connect_to_chat(self, websocket: WebSocket, chat_session_id: int):
-        """Connect a client to a specific chat session"""
+        # Maps: WebSocket -> (connection kind, chat_session_id or agent_user_id)
+        self.connection_owners: Dict[WebSocket, Tuple[str, int]] = {}
+
+        # Maps: WebSocket -> monotonic time of the last frame received
+        self.last_activity: Dict[WebSocket, float] = {}
+
+        # Maps: WebSocket -> negotiated codec (absent means DEFAULT_CODEC)
+        self.codecs: Dict[WebSocket, JsonCodec] = {}
+
+        # Maps: WebSocket -> events waiting for the next batch flush
+        self.send_buffers: Dict[WebSocket, List[dict]] = {}
+
+        # Maps: WebSocket -> chat broadcasts held back while missed events are replayed
+        self.held_events: Dict[WebSocket, List[dict]] = {}
+        self._flush_tasks: Set[asyncio.Task] = set()
+
+        # Counters exposed through connection_stats()
+        self.pings_sent = 0
+        self.reaped_connections = 0
+
+    def _track(self, websocket: WebSocket, kind: str, key: int):
+        self.connection_owners[websocket] = (kind, key)
+        self.last_activity[websocket] = time.monotonic()
+
+    def _untrack(self, websocket: WebSocket):
+        self.connection_owners.pop(websocket, None)
+        self.last_activity.pop(websocket, None)
+        self.codecs.pop(websocket, None)
+        self.send_buffers.pop(websocket, None)
+        self.held_events.pop(websocket, None)
+
+    async def connect_to_chat(
+        self,
+        websocket: WebSocket,
+        chat_session_id: int,
+        codec: Optional[JsonCodec] = None,
+        hold_broadcasts: bool = False
+    ):
+        """
+        Connect a client to a specific chat session. With `hold_broadcasts`,
+        broadcasts to the chat are kept for this client until
+        release_held_events, so events replayed in the meantime reach it first.
+        """
         await websocket.accept()
+        if codec is not None:
+            self.codecs[websocket] = codec
+        if hold_broadcasts:
+            self.held_events[websocket] = []
         if chat_session_id not in self.active_connections:
             self.active_connections[chat_session_id] = []
         self.active_connections[chat_session_id].append(websocket)
+        self._track(websocket, CHAT_CONNECTION, chat_session_id)
 
-    async def connect_agent(self, websocket: WebSocket, agent_id: int):
+    async def connect_agent(
+        self,
+        websocket: WebSocket,
+        agent_id: int,
+        codec: Optional[JsonCodec] = None
+    ):
         """Connect an agent to receive notifications"""
         await websocket.accept()
+        if codec is not None:
+            self.codecs[websocket] = codec
+        previous = self.agent_connections.get(agent_id)
+        if previous is not None:
+            self._untrack(previous)
         self.agent_connections[agent_id] = websocket
+        self._track(websocket, AGENT_CONNECTION, agent_id)
+
+    async def connect_supervisor(
+        self,
+        websocket: WebSocket,
+        department_id: Optional[int] = None,
+        codec: Optional[JsonCodec] = None
+    ):
+        """Connect a supervisor dashboard, optionally limited to one department"""
+        await websocket.accept()
+        if codec is not None:
+            self.codecs[websocket] = codec
+        self.supervisor_connections[websocket] = department_id
+        # Keyed by the socket's id, as supervisors have no natural key
+        self._track(websocket, SUPERVISOR_CONNECTION, id(websocket))
+
+    def disconnect_supervisor(self, websocket: WebSocket):
+        """Disconnect a supervisor dashboard"""
+        self.supervisor_connections.pop(websocket, None)
+        self._untrack(websocket)
+
+    def touch(self, websocket: WebSocket):
+        """Record that a frame was received on a connection"""
+        if websocket in self.last_activity:
+            self.last_activity[websocket] = time.monotonic()
+
+    async def receive(self, websocket: WebSocket) -> dict:
+        """Receive and decode one frame using the connection's protocol"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        self.touch(websocket)
+
+        data = message.get("text")
+        if data is None:
+            data = message.get("bytes")
+        return self.codecs.get(websocket, DEFAULT_CODEC).decode(data)
+
+    async def _send_frame(self, websocket: WebSocket, payload: Union[str, bytes]):
+        if isinstance(payload, bytes):
+            await websocket.send_bytes(payload)
+        else:
+            await websocket.send_text(payload)
+
+    async def _send(
+        self,
+        websocket: WebSocket,
+        message: dict,
+        encoded: Optional[Dict[str, Union[str, bytes]]] = None,
+        immediate: bool = False
+    ):
+        """
+        Send an event using the connection's protocol. Batching connections
+        buffer it for the next flush, unless `immediate`: then whatever is
+        buffered goes out with it now, so a failed send raises to the caller.
+        `encoded` caches payloads per protocol so a broadcast encodes (and
+        compresses) each event once.
+        """
+        codec = self.codecs.get(websocket, DEFAULT_CODEC)
+        if codec.batching:
+            if not immediate:
+                self._buffer(websocket, message)
+                return
+            # Buffered events go first; the scheduled flush then finds nothing
+            buffered = self.send_buffers.pop(websocket, None)
+            if buffered:
+                await self._send_frame(websocket, codec.batch_frame(buffered + [message]))
+                return
+
+        if encoded is None:
+            payload = codec.frame(message)
+        else:
+            payload = encoded.get(codec.key)
+            if payload is None:
+                payload = encoded[codec.key] = codec.frame(message)
+        await self._send_frame(websocket, payload)
+
+    def _buffer(self, websocket: WebSocket, message: dict):
+        buffer = self.send_buffers.get(websocket)
+        if buffer is not None:
+            buffer.append(message)
+            return
+        self.send_buffers[websocket] = [message]
+        asyncio.get_running_loop().call_later(WS_BATCH_TICK_SECONDS, self._schedule_flush, websocket)
+
+    def _schedule_flush(self, websocket: WebSocket):
+        task = asyncio.ensure_future(self._flush(websocket))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self, websocket: WebSocket):
+        """Send everything buffered for a connection as one frame"""
+        buffer = self.send_buffers.pop(websocket, None)
+        codec = self.codecs.get(websocket)
+        if not buffer or codec is None:
+            return
+
+        try:
+            await self._send_frame(websocket, codec.batch_frame(buffer))
+        except Exception as e:
+            print(f"Error flushing batched messages: {e}")
+            send_failures.labels("batch").inc()
+            self._drop(websocket)
+
+    def _drop(self, websocket: WebSocket):
+        """Remove a connection whose send failed from the registries"""
+        owner = self.connection_owners.get(websocket)
+        if owner is None:
+            return
+        kind, key = owner
+        if kind == CHAT_CONNECTION:
+            self.disconnect_from_chat(websocket, key)
+        elif kind == SUPERVISOR_CONNECTION:
+            self.disconnect_supervisor(websocket)
+        else:
+            self.disconnect_agent(key, websocket)
+        self._untrack(websocket)
+
+    async def release_held_events(self, websocket: WebSocket):
+        """Send the broadcasts held back for a client, in order, then stop holding"""
+        held = self.held_events.get(websocket)
+        # Broadcasts keep being held while these are sent, so none overtakes them
+        while held:
+            await self._send(websocket, held.pop(0))
+        self.held_events.pop(websocket, None)
 
     def disconnect_from_chat(self, websocket: WebSocket, chat_session_id: int):
         """Disconnect a client from a chat session"""
         if chat_session_id in self.active_connections:
             if websocket in self.active_connections[chat_session_id]:
                 self.active_connections[chat_session_id].remove(websocket)
+                self._untrack(websocket)
             if not self.active_connections[chat_session_id]:
                 del self.active_connections[chat_session_id]
 
-    def disconnect_agent(self, agent_id: int):
-        """Disconnect an agent"""
-        if agent_id in self.agent_connections:
-            del self.agent_connections[agent_id]
+    def disconnect_agent(self, agent_id: int, websocket: WebSocket | None = None) -> bool:
+        """
+        Disconnect an agent. When a websocket is given, only that connection
+        is removed, so a stale socket cannot drop the agent's newer one.
+        Returns True if a connection was removed.
+        """
+        if agent_id not in self.agent_connections:
+            return False
+        if websocket is not None and self.agent_connections[agent_id] is not websocket:
+            return False
+        self._untrack(self.agent_connections.pop(agent_id))
+        return True
 
     def mark_agent_available(self, agent_id: int, department_id: int):
         """Mark an agent as available in a department"""
@@ -60,33 +288,66 @@ class ConnectionManager:
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """Send a message to a specific websocket"""
         try:
-            await websocket.send_json(message)
+            with tracer.span("ws.send_personal_message", {"ws.event": message.get("type")}):
+                await self._send(websocket, message)
         except Exception as e:
             print(f"Error sending personal message: {e}")
+            send_failures.labels("personal").inc()
 
-    async def broadcast_to_chat(self, message: dict, chat_session_id: int):
-        """Broadcast a message to all clients in a chat session"""
-        if chat_session_id in self.active_connections:
-            disconnected = []
+    async def broadcast_to_chat(self, message: dict, chat_session_id: int, immediate: bool = False) -> bool:
+        """
+        Broadcast a message to all clients in a chat session. Returns False if
+        every send failed, so a retry reaches whoever reconnects without
+        repeating the event to clients that got it. A chat nobody is connected
+        to has nothing to miss, as clients load the history when they connect.
+        With `immediate`, batching clients are sent the event now rather than
+        at the next flush, so the result covers them too.
+        """
+        if chat_session_id not in self.active_connections:
+            return True
+        recipients = len(self.active_connections[chat_session_id])
+        start = time.perf_counter()
+        disconnected = []
+        encoded = {}
+        with tracer.span("ws.broadcast_to_chat", {
+            "chat_session_id": chat_session_id,
+            "ws.event": message.get("type"),
+            "ws.recipients": recipients
+        }):
             for connection in self.active_connections[chat_session_id]:
+                held = self.held_events.get(connection)
+                if held is not None:
+                    held.append(message)
+                    continue
                 try:
-                    await connection.send_json(message)
+                    await self._send(connection, message, encoded, immediate)
                 except Exception as e:
                     print(f"Error broadcasting to chat: {e}")
+                    send_failures.labels(CHAT_CONNECTION).inc()
                     disconnected.append(connection)
 
-            # Clean up disconnected websockets
-            for conn in disconnected:
-                self.disconnect_from_chat(conn, chat_session_id)
+        # Clean up disconnected websockets
+        for conn in disconnected:
+            self.disconnect_from_chat(conn, chat_session_id)
+        broadcast_duration.labels(CHAT_CONNECTION).observe(time.perf_counter() - start)
+        return len(disconnected) < recipients
 
-    async def notify_agent(self, agent_id: int, message: dict):
-        """Send a notification to a specific agent"""
-        if agent_id in self.agent_connections:
-            try:
-                await self.agent_connections[agent_id].send_json(message)
-            except Exception as e:
-                print(f"Error notifying agent: {e}")
-                self.disconnect_agent(agent_id)
+    async def notify_agent(self, agent_id: int, message: dict, immediate: bool = False) -> bool:
+        """
+        Send a notification to a specific agent; returns False if the agent is
+        not connected or the send failed. `immediate` as for broadcast_to_chat.
+        """
+        if agent_id not in self.agent_connections:
+            return False
+        try:
+            with tracer.span("ws.notify_agent", {"agent_id": agent_id, "ws.event": message.get("type")}):
+                await self._send(self.agent_connections[agent_id], message, immediate=immediate)
+        except Exception as e:
+            print(f"Error notifying agent: {e}")
+            send_failures.labels(AGENT_CONNECTION).inc()
+            self.disconnect_agent(agent_id)
+            return False
+        return True
 
     async def notify_department_agents(self, department_id: int, message: dict):
         """Notify all agents in a department"""
@@ -94,6 +355,86 @@ class ConnectionManager:
             for agent_id in list(self.available_agents[department_id]):
                 await self.notify_agent(agent_id, message)
 
+    async def broadcast_to_supervisors(self, message: dict, department_id: Optional[int] = None):
+        """Send a message to every supervisor with the given department filter"""
+        start = time.perf_counter()
+        encoded = {}
+        for connection, filter_id in list(self.supervisor_connections.items()):
+            if filter_id != department_id:
+                continue
+            try:
+                await self._send(connection, message, encoded)
+            except Exception as e:
+                print(f"Error broadcasting to supervisors: {e}")
+                send_failures.labels(SUPERVISOR_CONNECTION).inc()
+                self.disconnect_supervisor(connection)
+        broadcast_duration.labels(SUPERVISOR_CONNECTION).observe(time.perf_counter() - start)
+
+    async def _send_with_timeout(self, websocket: WebSocket, message: dict, timeout: float) -> bool:
+        try:
+            # Control frames skip batching, or a dead peer would only show at the next flush
+            await asyncio.wait_for(self._send(websocket, message, immediate=True), timeout=timeout)
+            return True
+        except Exception:
+            return False
+
+    async def ping_all(self, timeout: float) -> List[WebSocket]:
+        """Send a ping to every tracked connection; returns sockets whose send failed"""
+        sockets = list(self.connection_owners)
+        if not sockets:
+            return []
+        ping = {"type": "ping"}
+        results = await asyncio.gather(
+            *(self._send_with_timeout(ws, ping, timeout) for ws in sockets)
+        )
+        self.pings_sent += len(sockets)
+        return [ws for ws, ok in zip(sockets, results) if not ok]
+
+    def idle_connections(self, idle_timeout: float) -> List[WebSocket]:
+        """Connections that have not sent a frame within idle_timeout seconds"""
+        cutoff = time.monotonic() - idle_timeout
+        return [ws for ws, seen in self.last_activity.items() if seen < cutoff]
+
+    async def reap(self, websocket: WebSocket) -> Tuple[str, int] | None:
+        """
+        Drop a dead connection from the registries and close it.
+        Returns the (kind, key) the socket belonged to, or None if unknown.
+        """
+        owner = self.connection_owners.get(websocket)
+        if owner is None:
+            return None
+
+        self._drop(websocket)
+        self.reaped_connections += 1
+
+        try:
+            await asyncio.wait_for(websocket.close(code=1001), timeout=1.0)
+        except Exception:
+            pass
+        return owner
+
+    def connection_stats(self) -> dict:
+        """Gauges and counters describing the current connections"""
+        return {
+            "chat_connections": sum(len(conns) for conns in self.active_connections.values()),
+            "chat_sessions_connected": len(self.active_connections),
+            "agent_connections": len(self.agent_connections),
+            "supervisor_connections": len(self.supervisor_connections),
+            "pings_sent": self.pings_sent,
+            "reaped_connections": self.reaped_connections
+        }
+
 
 # Global instance
 manager = ConnectionManager()
+
+active_sockets = Gauge(
+    "ws_active_connections",
+    "Open WebSocket connections by kind",
+    ("kind",),
+    callback=lambda: {
+        CHAT_CONNECTION: sum(len(conns) for conns in manager.active_connections.values()),
+        AGENT_CONNECTION: len(manager.agent_connections),
+        SUPERVISOR_CONNECTION: len(manager.supervisor_connections),
+    }
+)
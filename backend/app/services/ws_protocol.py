@@ -0,0 +1,206 @@
+from typing import Dict, List, Optional, Union
+import json
+import zlib
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; fall back to compact JSON
+    msgpack = None
+
+# Text frames at least this large are deflated on connections that asked for compression
+WS_COMPRESS_THRESHOLD_BYTES = int(os.getenv("WS_COMPRESS_THRESHOLD_BYTES", "1024"))
+WS_COMPRESS_LEVEL = int(os.getenv("WS_COMPRESS_LEVEL", "6"))
+
+PROTOCOL_JSON = "json"
+PROTOCOL_COMPACT = "compact"
+PROTOCOL_MSGPACK = "msgpack"
+
+# Short keys used by the compact and msgpack protocols
+KEY_ALIASES: Dict[str, str] = {
+    "type": "t",
+    "chat_session_id": "c",
+    "sender_name": "n",
+    "sender_id": "s",
+    "content": "b",
+    "timestamp": "ts",
+    "message": "m",
+    "message_id": "i",
+    "is_system_message": "y",
+    "created_at": "ca",
+    "agent_id": "a",
+    "agent_name": "an",
+    "customer_name": "cn",
+    "customer_email": "ce",
+    "status": "st",
+    "is_typing": "k",
+    "position": "p",
+    "estimated_wait_minutes": "w",
+    "timeout_seconds": "to",
+}
+KEY_NAMES: Dict[str, str] = {alias: name for name, alias in KEY_ALIASES.items()}
+
+
+def shorten_keys(message: dict) -> dict:
+    """Replace known keys with their short aliases"""
+    return {KEY_ALIASES.get(key, key): value for key, value in message.items()}
+
+
+def expand_keys(message: dict) -> dict:
+    """Replace short aliases with the full key names"""
+    return {KEY_NAMES.get(key, key): value for key, value in message.items()}
+
+
+class CompressionStats:
+    """Running totals for frames that went through the size-aware compression policy"""
+
+    def __init__(self):
+        self.frames_considered = 0
+        self.frames_compressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "compression_frames_considered": self.frames_considered,
+            "compression_frames_compressed": self.frames_compressed,
+            "compression_bytes_in": self.bytes_in,
+            "compression_bytes_out": self.bytes_out,
+            "compression_ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else 1.0
+        }
+
+
+# Global instance
+compression_stats = CompressionStats()
+
+
+def deflate_frame(
+    payload: str,
+    threshold: int = WS_COMPRESS_THRESHOLD_BYTES,
+    level: int = WS_COMPRESS_LEVEL,
+    stats: Optional[CompressionStats] = None
+) -> Union[str, bytes]:
+    """
+    Apply the size-aware policy to a text frame: payloads below `threshold`
+    bytes stay text, larger ones become a raw-deflate binary frame (readable
+    with DecompressionStream("deflate-raw")) unless that would not shrink them.
+    """
+    data = payload.encode("utf-8")
+    if stats is not None:
+        stats.frames_considered += 1
+        stats.bytes_in += len(data)
+
+    if len(data) >= threshold:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) < len(data):
+            if stats is not None:
+                stats.frames_compressed += 1
+                stats.bytes_out += len(compressed)
+            return compressed
+
+    if stats is not None:
+        stats.bytes_out += len(data)
+    return payload
+
+
+class JsonCodec:
+    """Verbose JSON text frames, the default protocol"""
+
+    name = PROTOCOL_JSON
+    binary = False
+
+    def __init__(self, batching: bool = False, compress: bool = False):
+        self.batching = batching
+        # Compression applies to text protocols only; binary frames already mean msgpack
+        self.compress = compress and not self.binary
+        self.key = f"{self.name}:{int(self.compress)}"
+
+    def frame(self, message: dict) -> Union[str, bytes]:
+        """Encode one event into the payload sent on the wire"""
+        return self._finalize(self.encode(message))
+
+    def batch_frame(self, messages: List[dict]) -> Union[str, bytes]:
+        """Encode buffered events into a single wire payload"""
+        if len(messages) == 1:
+            return self.frame(messages[0])
+        return self._finalize(self.encode_batch(messages))
+
+    def _finalize(self, payload: Union[str, bytes]) -> Union[str, bytes]:
+        if self.compress:
+            return deflate_frame(payload, stats=compression_stats)
+        return payload
+
+    def encode(self, message: dict) -> Union[str, bytes]:
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+    def encode_batch(self, messages: List[dict]) -> Union[str, bytes]:
+        return json.dumps(
+            {"type": "batch", "events": messages},
+            separators=(",", ":"), ensure_ascii=False, default=str
+        )
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        return json.loads(data)
+
+
+class CompactJsonCodec(JsonCodec):
+    """JSON with short keys and no whitespace; batches are plain arrays"""
+
+    name = PROTOCOL_COMPACT
+
+    def encode(self, message: dict) -> Union[str, bytes]:
+        return json.dumps(shorten_keys(message), separators=(",", ":"), ensure_ascii=False, default=str)
+
+    def encode_batch(self, messages: List[dict]) -> Union[str, bytes]:
+        return json.dumps(
+            [shorten_keys(m) for m in messages],
+            separators=(",", ":"), ensure_ascii=False, default=str
+        )
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        return expand_keys(json.loads(data))
+
+
+class MsgpackCodec(JsonCodec):
+    """MessagePack binary frames with short keys; batches are arrays"""
+
+    name = PROTOCOL_MSGPACK
+    binary = True
+
+    def encode(self, message: dict) -> Union[str, bytes]:
+        return msgpack.packb(shorten_keys(message), default=str)
+
+    def encode_batch(self, messages: List[dict]) -> Union[str, bytes]:
+        return msgpack.packb([shorten_keys(m) for m in messages], default=str)
+
+    def decode(self, data: Union[str, bytes]) -> dict:
+        if isinstance(data, str):
+            return expand_keys(json.loads(data))
+        return expand_keys(msgpack.unpackb(data))
+
+
+def negotiate_codec(
+    protocol: Optional[str] = None,
+    batch: Optional[bool] = None,
+    compress: bool = False
+) -> JsonCodec:
+    """
+    Pick the codec for a connection from its `protocol`, `batch` and
+    `compress` query parameters. Compact protocols batch by default; msgpack
+    falls back to compact JSON when the library is not installed.
+    """
+    protocol = (protocol or PROTOCOL_JSON).lower()
+    if protocol == PROTOCOL_MSGPACK and msgpack is None:
+        protocol = PROTOCOL_COMPACT
+
+    batching = batch if batch is not None else protocol != PROTOCOL_JSON
+
+    if protocol == PROTOCOL_MSGPACK:
+        return MsgpackCodec(batching, compress)
+    if protocol == PROTOCOL_COMPACT:
+        return CompactJsonCodec(batching, compress)
+    return JsonCodec(batching, compress)
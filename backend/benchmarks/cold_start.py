@@ -0,0 +1,94 @@
+"""
+Cold start: time from launching the server process to its first response.
+
+Each run starts `uvicorn app.main:app` in a fresh process, polls GET /
+until it answers, then times the first request to a lazily loaded router
+(GET /api/departments/), which pays for importing it. Runs alternate
+LAZY_ROUTERS on and off and use a new SQLite database, so the first start
+of each mode also creates the schema; the medians cover warm disk caches.
+
+Usage (from the backend directory):
+    python -m benchmarks.cold_start --runs 7
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def get(url: str) -> int:
+    with urllib.request.urlopen(url, timeout=5) as response:
+        response.read()
+        return response.status
+
+
+def start_once(lazy: bool, database_url: str, timeout: float) -> tuple:
+    """Seconds to the first response to GET /, and for the first GET /api/departments/"""
+    port = free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        LAZY_ROUTERS="true" if lazy else "false",
+        PROFILER_STARTUP_SECONDS="0",
+    )
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with status {process.returncode}")
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError("server did not answer in time")
+            try:
+                if get(f"http://127.0.0.1:{port}/") == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.005)
+        first_response = time.perf_counter() - start
+
+        lazy_start = time.perf_counter()
+        get(f"http://127.0.0.1:{port}/api/departments/")
+        first_lazy_request = time.perf_counter() - lazy_start
+    finally:
+        process.terminate()
+        process.wait()
+    return first_response, first_lazy_request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=7, help="starts per mode")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for a start")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    samples = {True: [], False: []}
+    for _ in range(args.runs):
+        for lazy in (True, False):
+            database_url = f"sqlite:///{os.path.join(directory, f'cold_start_{lazy}.db')}"
+            samples[lazy].append(start_once(lazy, database_url, args.timeout))
+
+    print(f"{'':>16}{'first response ms':>20}{'first /api/departments ms':>28}")
+    for lazy in (False, True):
+        first_response = statistics.median(s[0] for s in samples[lazy]) * 1000
+        first_lazy_request = statistics.median(s[1] for s in samples[lazy]) * 1000
+        print(f"{'lazy routers' if lazy else 'eager routers':>16}{first_response:>20.1f}{first_lazy_request:>28.1f}")
+
+
+if __name__ == "__main__":
+    main()
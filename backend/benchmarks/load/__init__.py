@@ -0,0 +1,6 @@
+"""
+Load tests for the REST and WebSocket paths.
+
+Starts the app in-process with uvicorn against a freshly seeded database and
+drives scenarios through real HTTP and WebSocket clients. See __main__.py.
+"""
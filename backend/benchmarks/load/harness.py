@@ -0,0 +1,237 @@
+"""Server, seed data, timing and reporting shared by the load scenarios."""
+import asyncio
+import platform
+import resource
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from datetime import datetime
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def latency_summary(samples: list) -> dict:
+    """Count and p50/p99/max in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    return {
+        "count": len(samples),
+        "p50": round(statistics.median(samples) * 1000, 2),
+        "p99": round(percentile(samples, 0.99) * 1000, 2),
+        "max": round(max(samples) * 1000, 2),
+    }
+
+
+class QueryCounter:
+    """Counts SQL statements executed by the app's engine"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+
+        @event.listens_for(engine.sync_engine, "before_cursor_execute")
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            self.count += 1
+
+
+class Run:
+    """Latencies, errors and query count of one scenario's measured phase"""
+
+    def __init__(self, name: str, queries: QueryCounter):
+        self.name = name
+        self.queries = queries
+        # Maps: operation -> latencies in seconds
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.checks = {}
+        self._start = None
+        self._elapsed = 0.0
+        self._queries_start = 0
+
+    def __enter__(self):
+        self._queries_start = self.queries.count
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._elapsed = time.perf_counter() - self._start
+        self.query_count = self.queries.count - self._queries_start
+        return False
+
+    async def request(self, client, operation: str, method: str, url: str, expect=(200, 201), **kwargs):
+        """Send a request, timing it under `operation`; unexpected statuses count as errors"""
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception:
+            self.errors[operation] += 1
+            return None
+        self.latencies[operation].append(time.perf_counter() - start)
+        if response.status_code not in expect:
+            self.errors[operation] += 1
+        return response
+
+    def record(self, operation: str, seconds: float):
+        self.latencies[operation].append(seconds)
+
+    def report(self) -> dict:
+        requests = sum(len(samples) for op, samples in self.latencies.items() if not op.startswith("ws_"))
+        all_samples = [s for samples in self.latencies.values() for s in samples]
+        return {
+            "duration_s": round(self._elapsed, 3),
+            "requests": requests,
+            "errors": dict(self.errors),
+            "throughput_rps": round(len(all_samples) / self._elapsed, 1) if self._elapsed else 0.0,
+            "latency_ms": latency_summary(all_samples),
+            "operations": {op: latency_summary(samples) for op, samples in sorted(self.latencies.items())},
+            "queries": self.query_count,
+            "queries_per_request": round(self.query_count / requests, 2) if requests else None,
+            "checks": self.checks,
+        }
+
+
+def raise_fd_limit():
+    """Every WebSocket costs two descriptors in-process (client and server side)"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+async def start_server(app):
+    """Run the app with uvicorn on a free local port; returns (server, task, base_url)"""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=0, log_level="warning", ws_max_queue=1024, backlog=4096
+    ))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    return server, task, f"127.0.0.1:{port}"
+
+
+async def stop_server(server, task):
+    server.should_exit = True
+    await task
+
+
+async def seed(agents_per_department: int) -> dict:
+    """Departments and agents; returns {department_id: [agent ids]}"""
+    from app.database import AsyncSessionLocal
+    from app.models.models import Department, User, UserRole, AgentStatus
+    from app.services.auth import get_password_hash
+
+    # One hash for everyone; hashing per agent would dominate seeding
+    password = get_password_hash("password123")
+    names = ["Customer Care", "Technical Support", "Sales", "Billing"]
+    async with AsyncSessionLocal() as db:
+        departments = [
+            Department(name=name, is_active=True, is_customer_care=(i == 0))
+            for i, name in enumerate(names)
+        ]
+        db.add_all(departments)
+        await db.flush()
+
+        agents = defaultdict(list)
+        users = []
+        for department in departments:
+            for i in range(agents_per_department):
+                user = User(
+                    username=f"agent{department.id}_{i}",
+                    email=f"agent{department.id}_{i}@example.com",
+                    hashed_password=password,
+                    full_name=f"Agent {department.id}-{i}",
+                    role=UserRole.AGENT,
+                    department_id=department.id,
+                    is_active=True,
+                    agent_status=AgentStatus.AVAILABLE
+                )
+                users.append(user)
+        db.add_all(users)
+        await db.flush()
+        for user in users:
+            agents[user.department_id].append(user.id)
+        await db.commit()
+    return dict(agents)
+
+
+async def reset_state(agent_status=None):
+    """Close every open chat and put all agents in one status, so scenarios start alike"""
+    from sqlalchemy import update
+    from app.database import AsyncSessionLocal
+    from app.models.models import ChatSession, User, UserRole, ChatStatus, AgentStatus
+    from app.services.jobs import job_queue
+
+    # Post-response jobs (next-chat offers, agent releases) would undo the reset
+    await job_queue.join()
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.status != ChatStatus.CLOSED)
+            .values(status=ChatStatus.CLOSED, closed_at=datetime.utcnow())
+        )
+        await db.execute(
+            update(User)
+            .where(User.role == UserRole.AGENT)
+            .values(agent_status=agent_status or AgentStatus.AVAILABLE)
+        )
+        await db.commit()
+
+
+def metadata(args, dialect: str) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "database": dialect,
+        "args": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+    }
+
+
+def print_report(results: dict):
+    print(f"{'scenario':<18}{'ops/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}{'queries/req':>13}")
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:<18}{result['throughput_rps']:>10.1f}{latency.get('p50', 0):>10.2f}"
+            f"{latency.get('p99', 0):>10.2f}{sum(result['errors'].values()):>8}"
+            f"{result['queries_per_request'] if result['queries_per_request'] is not None else '-':>13}"
+        )
+        for operation, summary in result["operations"].items():
+            if summary["count"]:
+                print(f"  {operation:<24}{summary['count']:>8}{summary['p50']:>10.2f}{summary['p99']:>10.2f}")
+        if result["checks"]:
+            print(f"  checks: {result['checks']}")
+
+
+def print_comparison(baseline: dict, results: dict):
+    """Throughput and p99 change against a previous JSON report"""
+    print(f"\ncompared with {baseline['metadata'].get('commit') or 'baseline'}:")
+    for name, result in results.items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+
+        def change(new, old):
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+        print(
+            f"  {name:<18} throughput {change(result['throughput_rps'], before['throughput_rps']):>8}"
+            f"   p99 {change(result['latency_ms'].get('p99', 0), before['latency_ms'].get('p99', 0)):>8}"
+            f"   queries/req {before['queries_per_request']} -> {result['queries_per_request']}"
+        )
@@ -0,0 +1,302 @@
+"""
+Load scenarios. Each takes (ctx, run): ctx carries the HTTP client, base URL,
+seeded agents and CLI arguments; run records the measured phase.
+"""
+import asyncio
+import json
+import random
+import time
+
+
+async def _create_chat(ctx, run, operation="create_chat", department_id=None):
+    body = {"customer_name": "Load Customer", "customer_email": "customer@example.com"}
+    if department_id is not None:
+        body["department_id"] = department_id
+    response = await run.request(ctx.client, operation, "POST", "/api/chats/", json=body)
+    return response.json()["id"] if response is not None and response.status_code == 201 else None
+
+
+async def _gather_limited(concurrency: int, coroutines):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(limited(c) for c in coroutines))
+
+
+async def customer_flow(ctx, run):
+    """Customers start a chat, exchange a few messages and close it"""
+    async def flow(i):
+        chat_id = await _create_chat(ctx, run)
+        if chat_id is None:
+            return
+        for n in range(ctx.args.messages):
+            await run.request(
+                ctx.client, "post_message", "POST", f"/api/chats/{chat_id}/messages",
+                json={"chat_session_id": chat_id, "sender_name": "Load Customer", "content": f"message {n} of flow {i}"}
+            )
+        await run.request(ctx.client, "get_messages", "GET", f"/api/chats/{chat_id}/messages")
+        await run.request(ctx.client, "close_chat", "PUT", f"/api/chats/{chat_id}/close")
+
+    with run:
+        await _gather_limited(ctx.args.concurrency, [flow(i) for i in range(ctx.args.flows)])
+
+
+async def claim_race(ctx, run):
+    """Several agents claim the same waiting chat at once; exactly one may win"""
+    from app.models.models import AgentStatus
+
+    # With everyone offline new chats stay waiting
+    await ctx.reset(AgentStatus.OFFLINE)
+    department_id, agents = next(iter(ctx.agents.items()))
+    racers = agents[:ctx.args.racers]
+
+    chat_ids = []
+    winners_per_chat = []
+    with run:
+        for _ in range(ctx.args.claim_rounds):
+            chat_id = await _create_chat(ctx, run, "setup", department_id)
+            if chat_id is None:
+                continue
+            chat_ids.append(chat_id)
+            responses = await asyncio.gather(*(
+                run.request(
+                    ctx.client, "claim", "PUT", f"/api/chats/{chat_id}/claim",
+                    expect=(200, 400, 409), params={"agent_id": agent_id}
+                )
+                for agent_id in racers
+            ))
+            winners = [r for r in responses if r is not None and r.status_code == 200]
+            winners_per_chat.append(len(winners))
+            # Free the winner for the next round
+            await run.request(ctx.client, "close_chat", "PUT", f"/api/chats/{chat_id}/close")
+            await ctx.reset(AgentStatus.OFFLINE)
+    run.latencies.pop("setup", None)
+
+    run.checks = {
+        "chats": len(chat_ids),
+        "racers": len(racers),
+        "chats_without_winner": winners_per_chat.count(0),
+        "double_claims": sum(1 for w in winners_per_chat if w > 1),
+    }
+
+
+async def transfer_chain(ctx, run):
+    """Chats are passed along every department several times"""
+    departments = list(ctx.agents)
+
+    async def chain(i):
+        chat_id = await _create_chat(ctx, run)
+        if chat_id is None:
+            return
+        for hop in range(ctx.args.hops):
+            target = departments[(i + hop + 1) % len(departments)]
+            await run.request(
+                ctx.client, "transfer", "POST", f"/api/chats/{chat_id}/transfer",
+                json={"chat_session_id": chat_id, "target_department_id": target, "reason": "load test"}
+            )
+        await run.request(ctx.client, "close_chat", "PUT", f"/api/chats/{chat_id}/close")
+
+    with run:
+        await _gather_limited(ctx.args.concurrency, [chain(i) for i in range(ctx.args.chains)])
+
+
+async def review_burst(ctx, run):
+    """Many customers review their closed chats at once, some submitting twice"""
+    from sqlalchemy import select, func
+    from app.database import AsyncSessionLocal
+    from app.models.models import Review
+
+    chat_ids = []
+    for _ in range(ctx.args.reviews):
+        chat_id = await _create_chat(ctx, run, "setup")
+        if chat_id is not None:
+            await run.request(ctx.client, "setup", "PUT", f"/api/chats/{chat_id}/close")
+            chat_ids.append(chat_id)
+    run.latencies.pop("setup", None)
+    run.errors.pop("setup", None)
+
+    rng = random.Random(ctx.args.seed)
+    submissions = chat_ids + [c for c in chat_ids if rng.random() < ctx.args.duplicates]
+    rng.shuffle(submissions)
+
+    with run:
+        responses = await _gather_limited(ctx.args.concurrency, [
+            run.request(
+                ctx.client, "create_review", "POST", "/api/reviews/", expect=(201, 400),
+                json={"chat_session_id": chat_id, "rating": rng.randint(1, 5), "comment": "Quick and helpful, thanks"}
+            )
+            for chat_id in submissions
+        ])
+
+    async with AsyncSessionLocal() as db:
+        duplicate_rows = (await db.execute(
+            select(func.count()).select_from(
+                select(Review.chat_session_id)
+                .where(Review.chat_session_id.in_(chat_ids))
+                .group_by(Review.chat_session_id)
+                .having(func.count() > 1)
+                .subquery()
+            )
+        )).scalar()
+    run.checks = {
+        "submissions": len(submissions),
+        "accepted": sum(1 for r in responses if r is not None and r.status_code == 201),
+        "rejected_duplicates": sum(1 for r in responses if r is not None and r.status_code == 400),
+        "chats_with_duplicate_reviews": duplicate_rows,
+    }
+
+
+async def websocket_fanout(ctx, run):
+    """Thousands of chat sockets stay connected while messages are broadcast to them"""
+    import websockets
+
+    per_chat = ctx.args.sockets_per_chat
+    chat_count = max(1, ctx.args.sockets // per_chat)
+    chat_ids = [await _create_chat(ctx, run, "setup") for _ in range(chat_count)]
+    chat_ids = [c for c in chat_ids if c is not None]
+    run.latencies.pop("setup", None)
+
+    sent_at = {}
+    expected = len(chat_ids) * per_chat * ctx.args.broadcasts
+    received = 0
+    all_received = asyncio.Event()
+    sockets = []
+
+    async def connect(chat_id):
+        start = time.perf_counter()
+        try:
+            ws = await websockets.connect(
+                f"ws://{ctx.base_url}/ws/chat/{chat_id}?sender_name=Load", open_timeout=30, max_queue=None
+            )
+        except Exception:
+            run.errors["ws_connect"] += 1
+            return
+        run.record("ws_connect", time.perf_counter() - start)
+        sockets.append(ws)
+        return ws
+
+    async def read(ws):
+        nonlocal received
+        try:
+            async for frame in ws:
+                event = json.loads(frame)
+                if event.get("type") != "message":
+                    continue
+                key = event.get("content")
+                if key in sent_at:
+                    run.record("ws_delivery", time.perf_counter() - sent_at[key])
+                    received += 1
+                    if received >= expected:
+                        all_received.set()
+        except Exception:
+            pass
+
+    with run:
+        opened = await _gather_limited(200, [connect(c) for c in chat_ids for _ in range(per_chat)])
+        readers = [asyncio.create_task(read(ws)) for ws in opened if ws is not None]
+        # Let the join notifications settle before timing deliveries
+        await asyncio.sleep(0.5)
+
+        async def broadcast(chat_id):
+            for n in range(ctx.args.broadcasts):
+                key = f"{chat_id}:{n}"
+                sent_at[key] = time.perf_counter()
+                await run.request(
+                    ctx.client, "post_message", "POST", f"/api/chats/{chat_id}/messages",
+                    json={"chat_session_id": chat_id, "sender_name": "Load Agent", "content": key}
+                )
+
+        await _gather_limited(ctx.args.concurrency, [broadcast(c) for c in chat_ids])
+        try:
+            await asyncio.wait_for(all_received.wait(), timeout=30)
+        except asyncio.TimeoutError:
+            pass
+
+    run.checks = {
+        "sockets": len(sockets),
+        "chats": len(chat_ids),
+        "deliveries_expected": expected,
+        "deliveries_received": received,
+    }
+    await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+    for reader in readers:
+        reader.cancel()
+    await asyncio.gather(*readers, return_exceptions=True)
+
+
+async def retry_storm(ctx, run):
+    """Clients time out and resend every write several times at once, with and without Idempotency-Key"""
+    import uuid
+    from sqlalchemy import select, func
+    from app.database import AsyncSessionLocal
+    from app.models.models import ChatSession, Message
+
+    retries = ctx.args.retries
+
+    async def storm(operation, url, body, keyed):
+        headers = {"Idempotency-Key": str(uuid.uuid4())} if keyed else {}
+        responses = await asyncio.gather(*(
+            run.request(ctx.client, operation, "POST", url, expect=(200, 201, 400), json=body, headers=headers)
+            for _ in range(retries)
+        ))
+        return [r for r in responses if r is not None]
+
+    async def customer(i, keyed):
+        email = f"storm-{'keyed' if keyed else 'plain'}-{i}@example.com"
+        responses = await storm(
+            "create_chat_keyed" if keyed else "create_chat_plain", "/api/chats/",
+            {"customer_name": "Storm Customer", "customer_email": email}, keyed
+        )
+        created = [r for r in responses if r.status_code == 201]
+        if not created:
+            return
+        chat_id = created[0].json()["id"]
+        await storm(
+            "post_message_keyed" if keyed else "post_message_plain", f"/api/chats/{chat_id}/messages",
+            {"chat_session_id": chat_id, "sender_name": "Storm Customer", "content": f"storm {i}"}, keyed
+        )
+
+    queries = {}
+    with run:
+        for keyed in (False, True):
+            before = ctx.queries.count
+            await _gather_limited(ctx.args.concurrency, [customer(i, keyed) for i in range(ctx.args.storms)])
+            queries["keyed" if keyed else "plain"] = ctx.queries.count - before
+
+    async with AsyncSessionLocal() as db:
+        rows = {}
+        for label in ("plain", "keyed"):
+            pattern = f"storm-{label}-%"
+            chats = (await db.execute(
+                select(func.count()).select_from(ChatSession).where(ChatSession.customer_email.like(pattern))
+            )).scalar()
+            messages = (await db.execute(
+                select(func.count()).select_from(Message)
+                .join(ChatSession, Message.chat_session_id == ChatSession.id)
+                .where(ChatSession.customer_email.like(pattern), Message.is_system_message.is_(False))
+            )).scalar()
+            rows[label] = (chats, messages)
+
+    run.checks = {
+        "storms": ctx.args.storms,
+        "retries_per_write": retries,
+        "chats_created_plain": rows["plain"][0],
+        "chats_created_keyed": rows["keyed"][0],
+        "messages_created_plain": rows["plain"][1],
+        "messages_created_keyed": rows["keyed"][1],
+        "queries_plain": queries["plain"],
+        "queries_keyed": queries["keyed"],
+    }
+
+
+SCENARIOS = {
+    "customer_flow": customer_flow,
+    "claim_race": claim_race,
+    "transfer_chain": transfer_chain,
+    "review_burst": review_burst,
+    "websocket_fanout": websocket_fanout,
+    "retry_storm": retry_storm,
+}
@@ -0,0 +1,153 @@
+"""
+Overhead of the /metrics instrumentation on the chat message path.
+
+A database write costs milliseconds and varies far more between runs than
+the instrumentation costs, so the overhead is measured in two parts: the
+per-message cost of the instrumentation is timed in isolation (request
+middleware on a no-op app, broadcast_to_chat with metrics on and off),
+then compared with the median latency of POST /api/chats/{id}/messages
+through the full app. An end-to-end on/off comparison is printed too.
+Exits with status 1 if the overhead exceeds --budget percent.
+
+Usage (from the backend directory):
+    python -m benchmarks.metrics_overhead --messages 300 --rounds 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+class NullWebSocket:
+    """Stands in for a connected client; sends complete immediately"""
+
+    async def send_text(self, data: str):
+        pass
+
+    async def send_bytes(self, data: bytes):
+        pass
+
+
+async def time_messages(client, chat_id: int, count: int) -> float:
+    """Mean seconds per POST /api/chats/{id}/messages"""
+    start = time.perf_counter()
+    for i in range(count):
+        response = await client.post(
+            f"/api/chats/{chat_id}/messages",
+            json={"chat_session_id": chat_id, "sender_name": "Customer", "content": f"message {i}"}
+        )
+        assert response.status_code == 201, response.text
+    return (time.perf_counter() - start) / count
+
+
+async def time_broadcasts(manager, chat_id: int, count: int) -> float:
+    """Mean seconds per broadcast_to_chat"""
+    event = {"type": "message", "chat_session_id": chat_id, "sender_name": "Customer", "content": "hello"}
+    start = time.perf_counter()
+    for _ in range(count):
+        await manager.broadcast_to_chat(event, chat_id)
+    return (time.perf_counter() - start) / count
+
+
+async def compare(measure, registry, rounds: int) -> tuple:
+    """Median seconds with metrics off and on, alternating rounds to cancel out drift"""
+    samples = {True: [], False: []}
+    await measure()  # warm up caches and metric series
+    for _ in range(rounds):
+        for enabled in (False, True):
+            registry.enabled = enabled
+            samples[enabled].append(await measure())
+    registry.enabled = True
+    return statistics.median(samples[False]), statistics.median(samples[True])
+
+
+async def time_middleware(count: int) -> tuple:
+    """Mean seconds per request for a no-op ASGI app, bare and wrapped in MetricsMiddleware"""
+    from app.services.metrics import MetricsMiddleware
+
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    wrapped = MetricsMiddleware(endpoint)
+    results = []
+    for app in (endpoint, wrapped):
+        start = time.perf_counter()
+        for _ in range(count):
+            await app({"type": "http", "method": "POST"}, receive, send)
+        results.append((time.perf_counter() - start) / count)
+    return tuple(results)
+
+
+async def run(args) -> float:
+    import httpx
+    from app.database import init_db, engine, AsyncSessionLocal
+    from app.models.models import Department
+    from app.main import app
+    from app.services.metrics import metrics_registry
+    from app.services.websocket_manager import manager
+
+    engine.echo = False
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        db.add(Department(name="Customer Care", is_active=True, is_customer_care=True))
+        await db.commit()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/api/chats/", json={"customer_name": "Bench", "customer_email": "bench@example.com"})
+        chat_id = response.json()["id"]
+        for _ in range(args.sockets):
+            manager.active_connections.setdefault(chat_id, []).append(NullWebSocket())
+
+        print(f"{'':>28}{'off us':>12}{'on us':>12}{'delta us':>12}")
+        bare, wrapped = min(
+            [await time_middleware(args.messages * 100) for _ in range(args.rounds)],
+            key=lambda pair: pair[1] - pair[0]
+        )
+        print(f"{'request middleware':>28}{bare * 1e6:>12.2f}{wrapped * 1e6:>12.2f}{(wrapped - bare) * 1e6:>12.2f}")
+
+        off, on = await compare(
+            lambda: time_broadcasts(manager, chat_id, args.messages * 100),
+            metrics_registry, args.rounds
+        )
+        print(f"{f'broadcast to {args.sockets} sockets':>28}{off * 1e6:>12.2f}{on * 1e6:>12.2f}{(on - off) * 1e6:>12.2f}")
+        instrumentation = max(wrapped - bare, 0.0) + max(on - off, 0.0)
+
+        off, on = await compare(
+            lambda: time_messages(client, chat_id, args.messages),
+            metrics_registry, args.rounds
+        )
+        print(f"{'POST message (end to end)':>28}{off * 1e6:>12.1f}{on * 1e6:>12.1f}{(on - off) * 1e6:>12.1f}")
+
+    return instrumentation / off * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=300, help="messages per round")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--sockets", type=int, default=2, help="clients connected to the chat")
+    parser.add_argument("--budget", type=float, default=2.0, help="allowed overhead in percent")
+    args = parser.parse_args()
+
+    # Point the app at a throwaway database before it is imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'metrics.db')}"
+    # Thousands of messages from one address would trip the rate limits
+    os.environ["RATE_LIMIT_ENABLED"] = "false"
+    overhead = asyncio.run(run(args))
+    print(f"instrumentation per message: {overhead:.3f}% of the message path (budget {args.budget}%)")
+    sys.exit(0 if overhead <= args.budget else 1)
+
+
+if __name__ == "__main__":
+    main()
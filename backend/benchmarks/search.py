@@ -0,0 +1,144 @@
+"""
+Latency of /api/chats/search queries: FTS5 index against the LIKE fallback.
+
+Seeds a throwaway SQLite database with synthetic transcripts, builds the FTS5
+index, then runs rare, common, prefix and filtered queries through the search
+service on both backends. Also times message inserts with the sync triggers.
+
+Usage (from the backend directory):
+    python -m benchmarks.search --messages 1000000 --runs 20
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+
+
+def seed(path: str, messages: int, chats: int, rng: random.Random, vocabulary: list):
+    """Bulk-load departments, chats and messages directly, bypassing the app"""
+    # Zipf-like word frequencies; cumulative weights keep rng.choices cheap
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO departments (id, name, is_active, is_customer_care) VALUES (?, ?, 1, ?)",
+        [(i, f"Department {i}", i == 1) for i in range(1, 6)]
+    )
+    conn.executemany(
+        "INSERT INTO chat_sessions (id, customer_name, customer_email, department_id, status, created_at) "
+        "VALUES (?, ?, ?, ?, 'CLOSED', datetime('now'))",
+        [(i, f"Customer {i}", f"c{i}@example.com", rng.randint(1, 5)) for i in range(1, chats + 1)]
+    )
+    batch = []
+    for i in range(1, messages + 1):
+        content = " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(4, 30)))
+        batch.append((i, rng.randint(1, chats), "Customer", content))
+        if len(batch) == 50000:
+            conn.executemany(
+                "INSERT INTO messages (id, chat_session_id, sender_name, content, is_system_message, created_at) "
+                "VALUES (?, ?, ?, ?, 0, datetime('now'))", batch
+            )
+            batch = []
+    if batch:
+        conn.executemany(
+            "INSERT INTO messages (id, chat_session_id, sender_name, content, is_system_message, created_at) "
+            "VALUES (?, ?, ?, ?, 0, datetime('now'))", batch
+        )
+    conn.commit()
+    conn.close()
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def time_query(search_index, db, runs: int, query: str, **filters) -> tuple:
+    samples = []
+    hits = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        hits = len(await search_index.search(db, query, **filters))
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), percentile(samples, 0.99), hits
+
+
+async def run(args):
+    from app.database import init_db, AsyncSessionLocal, engine
+    from app.services.search import search_index, BACKEND_LIKE
+
+    engine.echo = False
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+
+    await init_db()
+    start = time.perf_counter()
+    seed(args.path, args.messages, args.chats, rng, vocabulary)
+    print(f"seeded {args.messages} messages in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    await search_index.setup()
+    print(f"built {search_index.backend} index in {time.perf_counter() - start:.1f}s")
+
+    queries = [
+        ("common word", vocabulary[0], {}),
+        ("rare word", vocabulary[-1], {}),
+        ("two words", f"{vocabulary[3]} {vocabulary[40]}", {}),
+        ("prefix", vocabulary[10][:3], {}),
+        ("department filter", vocabulary[5], {"department_id": 3}),
+    ]
+
+    backends = [(search_index.backend, args.runs), (BACKEND_LIKE, max(1, args.runs // 5))]
+    print(f"{'backend':>9}{'query':>20}{'p50 ms':>10}{'p99 ms':>10}{'hits':>6}")
+    async with AsyncSessionLocal() as db:
+        for backend, runs in backends:
+            search_index.backend = backend
+            for label, query, filters in queries:
+                p50, p99, hits = await time_query(search_index, db, runs, query, **filters)
+                print(f"{backend:>9}{label:>20}{p50:>10.2f}{p99:>10.2f}{hits:>6}")
+
+    # Write amplification: inserts now maintain the FTS index through triggers
+    conn = sqlite3.connect(args.path)
+    rows = [
+        (args.messages + i + 1, rng.randint(1, args.chats), "Agent", " ".join(rng.choices(vocabulary, k=12)))
+        for i in range(args.inserts)
+    ]
+    start = time.perf_counter()
+    for row in rows:
+        conn.execute(
+            "INSERT INTO messages (id, chat_session_id, sender_name, content, is_system_message, created_at) "
+            "VALUES (?, ?, ?, ?, 0, datetime('now'))", row
+        )
+    conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    print(f"{args.inserts} indexed inserts: {elapsed * 1e6 / args.inserts:.1f} us/insert")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--chats", type=int, default=20000)
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--inserts", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    # Point the app at a throwaway database before it is imported
+    args.path = os.path.join(tempfile.mkdtemp(), "search.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.path}"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
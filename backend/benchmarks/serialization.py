@@ -0,0 +1,221 @@
+"""
+List endpoint serialization: ORM objects validated with from_attributes
+against row tuples through a precompiled RowSerializer.
+
+Seeds --rows chats (each with a department and an agent), messages,
+reviews and users, then times one page of --rows items per resource both
+ways: loading ORM objects with selectinload and serializing them the way
+FastAPI does for a response_model (validate, dump to Python, JSONResponse),
+against selecting the schema's columns and dumping them with the route's
+RowSerializer. Times are medians of --rounds, split into the database
+query and serialization; both paths are checked to produce the same JSON.
+
+Usage (from the backend directory):
+    python -m benchmarks.serialization --rows 1000 --rounds 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+
+async def seed(rows: int):
+    from app.database import init_db, AsyncSessionLocal
+    from app.models.models import (
+        Department, User, UserRole, AgentStatus, ChatSession, ChatStatus, Message, Review
+    )
+
+    await init_db()
+    start = datetime(2024, 1, 1)
+    async with AsyncSessionLocal() as db:
+        departments = [
+            Department(name=f"Department {i}", description="Benchmark", is_customer_care=i == 0)
+            for i in range(5)
+        ]
+        db.add_all(departments)
+        await db.flush()
+        users = [
+            User(
+                username=f"agent{i}",
+                email=f"agent{i}@example.com",
+                hashed_password="x",
+                full_name=f"Agent {i}",
+                role=UserRole.AGENT,
+                department_id=departments[i % 5].id,
+                agent_status=AgentStatus.AVAILABLE
+            )
+            for i in range(rows)
+        ]
+        db.add_all(users)
+        await db.flush()
+        chats = [
+            ChatSession(
+                customer_name=f"Customer {i}",
+                customer_email=f"customer{i}@example.com",
+                department_id=departments[i % 5].id,
+                # Every tenth chat is still waiting for an agent
+                assigned_agent_id=users[i].id if i % 10 else None,
+                status=ChatStatus.CLOSED if i % 10 else ChatStatus.WAITING,
+                created_at=start + timedelta(seconds=i)
+            )
+            for i in range(rows)
+        ]
+        db.add_all(chats)
+        await db.flush()
+        db.add_all(
+            Message(
+                chat_session_id=chats[0].id,
+                sender_name="Customer 0",
+                content=f"Message number {i} in a long conversation",
+                created_at=start + timedelta(seconds=i)
+            )
+            for i in range(rows)
+        )
+        db.add_all(
+            Review(
+                chat_session_id=chat.id,
+                rating=i % 5 + 1,
+                comment="Quick and helpful",
+                customer_name=chat.customer_name,
+                customer_email=chat.customer_email,
+                agent_id=chat.assigned_agent_id,
+                department_id=chat.department_id,
+                created_at=start + timedelta(seconds=i)
+            )
+            for i, chat in enumerate(chats)
+        )
+        await db.commit()
+        return chats[0].id
+
+
+def cases(rows: int, chat_id: int) -> list:
+    """(name, ORM statement, ORM to schema content, response field type, row statement, serializer)"""
+    from sqlalchemy import select, desc
+    from sqlalchemy.orm import selectinload
+    from app.models.models import ChatSession, Message, Review, User, Department
+    from app.schemas.schemas import (
+        ChatSessionWithDetails, Message as MessageSchema, Review as ReviewSchema, UserWithDepartment
+    )
+    from app.routes.chats import chat_rows, message_rows
+    from app.routes.reviews import review_rows, _review_to_schema
+    from app.routes.users import user_rows
+
+    return [
+        (
+            "chats",
+            select(ChatSession)
+            .options(selectinload(ChatSession.department), selectinload(ChatSession.assigned_agent))
+            .order_by(desc(ChatSession.created_at)).limit(rows),
+            lambda objects: objects,
+            List[ChatSessionWithDetails],
+            chat_rows.select()
+            .join(Department, ChatSession.department_id == Department.id)
+            .outerjoin(User, ChatSession.assigned_agent_id == User.id)
+            .order_by(desc(ChatSession.created_at)).limit(rows),
+            chat_rows,
+        ),
+        (
+            "messages",
+            select(Message).where(Message.chat_session_id == chat_id).order_by(Message.created_at).limit(rows),
+            lambda objects: objects,
+            List[MessageSchema],
+            message_rows.select().where(Message.chat_session_id == chat_id).order_by(Message.created_at).limit(rows),
+            message_rows,
+        ),
+        (
+            "reviews",
+            select(Review)
+            .options(selectinload(Review.agent), selectinload(Review.department))
+            .order_by(Review.created_at.desc()).limit(rows),
+            lambda objects: [_review_to_schema(r) for r in objects],
+            List[ReviewSchema],
+            review_rows.select()
+            .outerjoin(User, Review.agent_id == User.id)
+            .outerjoin(Department, Review.department_id == Department.id)
+            .order_by(Review.created_at.desc()).limit(rows),
+            review_rows,
+        ),
+        (
+            "users",
+            select(User).options(selectinload(User.department)).order_by(User.id).limit(rows),
+            lambda objects: objects,
+            List[UserWithDepartment],
+            user_rows.select().outerjoin(Department, User.department_id == Department.id)
+            .order_by(User.id).limit(rows),
+            user_rows,
+        ),
+    ]
+
+
+async def time_orm(statement, to_content, field) -> tuple:
+    """Seconds to load the ORM objects, and to serialize them as FastAPI does for response_model"""
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from app.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        objects = (await db.execute(statement)).scalars().all()
+        loaded = time.perf_counter()
+        content = await serialize_response(field=field, response_content=to_content(objects))
+        body = JSONResponse(content).body
+        done = time.perf_counter()
+    return loaded - start, done - loaded, body
+
+
+async def time_rows(statement, serializer) -> tuple:
+    """Seconds to load the row tuples, and to serialize them with the RowSerializer"""
+    from app.database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        start = time.perf_counter()
+        rows = (await db.execute(statement)).all()
+        loaded = time.perf_counter()
+        body = serializer.response(rows).body
+        done = time.perf_counter()
+    return loaded - start, done - loaded, body
+
+
+async def run(args):
+    from fastapi.utils import create_model_field
+    from app.database import engine
+
+    engine.echo = False
+    chat_id = await seed(args.rows)
+
+    print(f"{args.rows} rows per page, median of {args.rounds} rounds (ms)")
+    print(f"{'':>10}{'ORM query':>12}{'ORM ser.':>12}{'row query':>12}{'row ser.':>12}{'speedup':>10}")
+    for name, orm_statement, to_content, response_type, row_statement, serializer in cases(args.rows, chat_id):
+        field = create_model_field(name="Response_" + name, type_=response_type, mode="serialization")
+        # Warm up statement caches and validators
+        _, _, orm_body = await time_orm(orm_statement, to_content, field)
+        _, _, row_body = await time_rows(row_statement, serializer)
+        if json.loads(orm_body) != json.loads(row_body):
+            raise SystemExit(f"{name}: row-based response differs from the ORM one")
+
+        orm = [await time_orm(orm_statement, to_content, field) for _ in range(args.rounds)]
+        row = [await time_rows(row_statement, serializer) for _ in range(args.rounds)]
+        orm_query, orm_serialize = (statistics.median(s[i] for s in orm) * 1000 for i in (0, 1))
+        row_query, row_serialize = (statistics.median(s[i] for s in row) * 1000 for i in (0, 1))
+        speedup = (orm_query + orm_serialize) / (row_query + row_serialize)
+        print(f"{name:>10}{orm_query:>12.2f}{orm_serialize:>12.2f}{row_query:>12.2f}{row_serialize:>12.2f}{speedup:>9.1f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="items per page")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    # Point the app at a throwaway database before it is imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'serialization.db')}"
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Bytes on the wire against server CPU for the size-aware compression policy.
+
+Mixes small live events with long transcript/history payloads and replays
+them through deflate_frame at several thresholds and compression levels.
+
+Usage (from the backend directory):
+    python -m benchmarks.ws_compression --events 5000 --thresholds 0 256 1024 4096
+"""
+import argparse
+import random
+import time
+from app.services.ws_protocol import JsonCodec, CompressionStats, deflate_frame
+from benchmarks.ws_protocol import make_events, frame_header_bytes
+
+
+def make_transcripts(count: int, seed: int = 7) -> list:
+    """History replays: batches of 20-80 messages sent as one frame"""
+    rng = random.Random(seed)
+    live = make_events(count * 40, seed)
+    transcripts = []
+    for _ in range(count):
+        size = rng.randint(20, 80)
+        start = rng.randint(0, len(live) - size)
+        transcripts.append(live[start:start + size])
+    return transcripts
+
+
+def run(payloads: list, threshold: float, level: int) -> dict:
+    stats = CompressionStats()
+    wire_bytes = 0
+    start_cpu = time.process_time()
+    for payload in payloads:
+        if threshold == float("inf"):
+            frame = payload
+        else:
+            frame = deflate_frame(payload, threshold=int(threshold), level=level, stats=stats)
+        size = len(frame) if isinstance(frame, bytes) else len(frame.encode("utf-8"))
+        wire_bytes += size + frame_header_bytes(size)
+    cpu = time.process_time() - start_cpu
+    return {
+        "wire_bytes": wire_bytes,
+        "compressed": stats.frames_compressed,
+        "cpu_ms": cpu * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=5000, help="live events in the mix")
+    parser.add_argument("--transcripts", type=int, default=200, help="history replay frames in the mix")
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[0, 256, 1024, 4096])
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 6])
+    args = parser.parse_args()
+
+    codec = JsonCodec()
+    payloads = [codec.encode(e) for e in make_events(args.events)]
+    payloads += [codec.encode_batch(t) for t in make_transcripts(args.transcripts)]
+    random.Random(1).shuffle(payloads)
+
+    baseline = run(payloads, float("inf"), 0)
+    print(f"{len(payloads)} frames, {baseline['wire_bytes']} bytes uncompressed")
+    print(f"{'threshold':>10}{'level':>7}{'compressed':>12}{'wire bytes':>13}{'ratio':>8}{'cpu ms':>10}")
+    for level in args.levels:
+        for threshold in args.thresholds:
+            result = run(payloads, threshold, level)
+            print(
+                f"{threshold:>10}{level:>7}{result['compressed']:>12}{result['wire_bytes']:>13}"
+                f"{result['wire_bytes'] / baseline['wire_bytes']:>8.2f}{result['cpu_ms']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compare WebSocket wire protocols: bytes on the wire and encode CPU time.
+
+Usage (from the backend directory):
+    python -m benchmarks.ws_protocol --events 20000 --batch 1 10
+"""
+import argparse
+import random
+import time
+from app.services.ws_protocol import (
+    JsonCodec,
+    CompactJsonCodec,
+    MsgpackCodec,
+    msgpack
+)
+
+
+def make_events(count: int, seed: int = 42) -> list:
+    """A mix of the events an agent dashboard typically receives"""
+    rng = random.Random(seed)
+    names = ["Alice Johnson", "Bob Smith", "Charlie Brown", "Diana Prince"]
+    events = []
+    for i in range(count):
+        chat_id = rng.randint(1, 5000)
+        kind = rng.random()
+        if kind < 0.55:
+            events.append({
+                "type": "message",
+                "message_id": i,
+                "chat_session_id": chat_id,
+                "sender_name": rng.choice(names),
+                "content": "Thanks, I can see the order now. " * rng.randint(1, 3),
+                "is_system_message": False,
+                "created_at": "2026-10-19 12:00:00"
+            })
+        elif kind < 0.85:
+            events.append({
+                "type": "typing",
+                "chat_session_id": chat_id,
+                "sender_name": rng.choice(names),
+                "is_typing": rng.random() < 0.5
+            })
+        elif kind < 0.95:
+            events.append({
+                "type": "queue_status",
+                "chat_session_id": chat_id,
+                "position": rng.randint(1, 30),
+                "estimated_wait_minutes": rng.randint(0, 40),
+                "message": "All agents are currently busy."
+            })
+        else:
+            events.append({
+                "type": "new_assignment",
+                "chat_session_id": chat_id,
+                "customer_name": rng.choice(names),
+                "customer_email": "customer@example.com"
+            })
+    return events
+
+
+def frame_header_bytes(payload_length: int) -> int:
+    """Size of an unmasked server-to-client WebSocket frame header"""
+    if payload_length < 126:
+        return 2
+    if payload_length < 65536:
+        return 4
+    return 10
+
+
+def run(codec, events: list, batch_size: int) -> dict:
+    frames = 0
+    total_bytes = 0
+    start_cpu = time.process_time()
+    for i in range(0, len(events), batch_size):
+        chunk = events[i:i + batch_size]
+        payload = codec.encode(chunk[0]) if len(chunk) == 1 else codec.encode_batch(chunk)
+        size = len(payload.encode("utf-8") if isinstance(payload, str) else payload)
+        total_bytes += size + frame_header_bytes(size)
+        frames += 1
+    cpu = time.process_time() - start_cpu
+    return {"frames": frames, "bytes": total_bytes, "cpu_ms": cpu * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args()
+
+    events = make_events(args.events)
+    codecs = [JsonCodec(), CompactJsonCodec()]
+    if msgpack is not None:
+        codecs.append(MsgpackCodec())
+    else:
+        print("msgpack not installed, skipping the msgpack protocol")
+
+    baseline = None
+    print(f"{'protocol':<10}{'batch':>6}{'frames':>9}{'bytes':>12}{'vs json':>9}{'cpu ms':>10}{'us/event':>10}")
+    for batch_size in args.batch:
+        for codec in codecs:
+            result = run(codec, events, batch_size)
+            if baseline is None:
+                baseline = result["bytes"]
+            print(
+                f"{codec.name:<10}{batch_size:>6}{result['frames']:>9}{result['bytes']:>12}"
+                f"{result['bytes'] / baseline:>9.2f}{result['cpu_ms']:>10.1f}"
+                f"{result['cpu_ms'] * 1000 / len(events):>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+from app.database import init_db, AsyncSessionLocal
+from app.services.archive import archive_closed_chats, ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE
+from app.services.review_insights import process_new_reviews, REVIEW_INSIGHTS_CHUNK_SIZE
+from app.services.scorecards import rebuild_scorecards
+
+
+async def run_archive(args):
+    """Archive chats closed more than --older-than-days ago"""
+    await init_db()
+    result = await archive_closed_chats(args.older_than_days, args.batch_size)
+    if result["locked"]:
+        print("Another archive run is in progress; try again when it has finished")
+        return
+    print(f"✓ Archived {result['chats_archived']} chats, deleted {result['messages_deleted']} messages")
+
+
+async def run_review_insights(args):
+    """Analyse reviews submitted since the last run"""
+    await init_db()
+    result = await process_new_reviews(args.chunk_size)
+    print(f"✓ Processed {result['reviews_processed']} reviews")
+
+
+async def run_rebuild_scorecards(args):
+    """Recompute agent scorecards from chats and reviews"""
+    await init_db()
+    async with AsyncSessionLocal() as db:
+        count = await rebuild_scorecards(db)
+    print(f"✓ Rebuilt scorecards for {count} agents")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance jobs for the customer care backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive", help="Move old closed chats into archive files")
+    archive.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS)
+    archive.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    archive.set_defaults(handler=run_archive)
+
+    insights = commands.add_parser("review-insights", help="Update review sentiment, keywords and trends")
+    insights.add_argument("--chunk-size", type=int, default=REVIEW_INSIGHTS_CHUNK_SIZE)
+    insights.set_defaults(handler=run_review_insights)
+
+    scorecards = commands.add_parser("rebuild-scorecards", help="Recompute agent scorecards from history")
+    scorecards.set_defaults(handler=run_rebuild_scorecards)
+
+    args = parser.parse_args()
+    asyncio.run(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
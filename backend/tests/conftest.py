@@ -0,0 +1,43 @@
+import asyncio
+import os
+import tempfile
+import pytest
+
+# Point the app at a throwaway database before any test imports it
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}"
+# Tests turn the limits on where they need them
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+
+# Offline agents seeded for the whole run; auto-assignment leaves chats waiting for them
+AGENTS = 25
+
+
+@pytest.fixture(scope="session")
+def agent_ids():
+    """Ids of AGENTS offline agents in the customer care department"""
+    from app.database import init_db, AsyncSessionLocal
+    from app.models.models import Department, User, UserRole, AgentStatus
+
+    async def seed():
+        await init_db()
+        async with AsyncSessionLocal() as db:
+            department = Department(name="Customer Care", is_active=True, is_customer_care=True)
+            db.add(department)
+            await db.flush()
+            agents = [
+                User(
+                    username=f"agent{i}",
+                    email=f"agent{i}@example.com",
+                    hashed_password="x",
+                    full_name=f"Agent {i}",
+                    role=UserRole.AGENT,
+                    department_id=department.id,
+                    agent_status=AgentStatus.OFFLINE
+                )
+                for i in range(AGENTS)
+            ]
+            db.add_all(agents)
+            await db.commit()
+            return [agent.id for agent in agents]
+
+    return asyncio.run(seed())
@@ -0,0 +1,27 @@
+import asyncio
+import httpx
+from app.database import engine
+from app.main import app
+from app.services.jobs import job_queue
+
+engine.echo = False
+
+
+def run(scenario):
+    """Run `scenario(client)` against the app with its background services started"""
+    async def main():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await scenario(client)
+                await job_queue.join()
+
+    asyncio.run(main())
+
+
+async def create_chat(client, name: str = "Customer", headers: dict = None) -> httpx.Response:
+    return await client.post(
+        "/api/chats/",
+        json={"customer_name": name, "customer_email": "customer@example.com"},
+        headers=headers
+    )
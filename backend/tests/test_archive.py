@@ -0,0 +1,86 @@
+"""Archiving old closed chats next to late writes and other archive runs"""
+from datetime import datetime, timedelta
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models.models import ChatSession, ChatStatus, Message, MaintenanceLock
+from app.services import archive
+from tests.support import run
+
+
+async def old_closed_chat(department_id: int, messages: int) -> int:
+    closed_at = datetime.utcnow() - timedelta(days=archive.ARCHIVE_AFTER_DAYS + 1)
+    async with AsyncSessionLocal() as db:
+        chat = ChatSession(
+            customer_name="Archived", department_id=department_id,
+            status=ChatStatus.CLOSED, created_at=closed_at, closed_at=closed_at
+        )
+        db.add(chat)
+        await db.flush()
+        db.add_all(
+            Message(chat_session_id=chat.id, sender_name="Archived", content=f"m{i}", created_at=closed_at)
+            for i in range(messages)
+        )
+        await db.commit()
+        return chat.id
+
+
+async def department_of(agent_id: int) -> int:
+    from app.models.models import User
+    async with AsyncSessionLocal() as db:
+        return (await db.get(User, agent_id)).department_id
+
+
+def test_messages_written_after_archiving_are_kept(agent_ids, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+
+    async def scenario(client):
+        chat_id = await old_closed_chat(await department_of(agent_ids[0]), 3)
+        assert (await archive.archive_closed_chats())["chats_archived"] >= 1
+
+        # Closed chats still accept messages; the next run's purge must leave this one
+        response = await client.post(
+            f"/api/chats/{chat_id}/messages",
+            json={"chat_session_id": chat_id, "sender_name": "Archived", "content": "late"}
+        )
+        assert response.status_code == 201, response.text
+        await archive.archive_closed_chats()
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(Message.content).where(Message.chat_session_id == chat_id))
+            assert result.scalars().all() == ["late"]
+
+        response = await client.get(f"/api/chats/{chat_id}/messages")
+        assert [m["content"] for m in response.json()] == ["m0", "m1", "m2", "late"]
+
+    run(scenario)
+
+
+def test_one_archive_run_at_a_time(agent_ids, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path))
+
+    async def scenario(client):
+        chat_id = await old_closed_chat(await department_of(agent_ids[0]), 2)
+        async with AsyncSessionLocal() as db:
+            lock = MaintenanceLock(
+                name="archive", owner="other", locked_until=datetime.utcnow() + timedelta(seconds=60)
+            )
+            db.add(lock)
+            await db.commit()
+
+        assert await archive.archive_closed_chats() == {"chats_archived": 0, "messages_deleted": 0, "locked": True}
+
+        # The other run died; once its lock lapses the next run takes over
+        async with AsyncSessionLocal() as db:
+            lock = await db.get(MaintenanceLock, "archive")
+            lock.locked_until = datetime.utcnow() - timedelta(seconds=1)
+            await db.commit()
+
+        result = await archive.archive_closed_chats()
+        assert not result["locked"] and result["chats_archived"] >= 1
+        async with AsyncSessionLocal() as db:
+            assert await db.get(MaintenanceLock, "archive") is None
+            result = await db.execute(select(Message.id).where(Message.chat_session_id == chat_id))
+            assert result.first() is None
+
+    run(scenario)
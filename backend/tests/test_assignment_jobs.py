@@ -0,0 +1,56 @@
+"""Assignment jobs run after the request; what the agent did in between wins"""
+import asyncio
+
+from app.database import AsyncSessionLocal
+from app.models.models import User, AgentStatus, ChatSession, ChatStatus
+from app.services.assignment_service import handle_chat_close_assignment
+from app.services.jobs import job_queue
+
+
+def test_close_assignment_leaves_agent_with_a_new_chat_alone(agent_ids):
+    agent_id = agent_ids[23]
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            agent = await db.get(User, agent_id)
+            # The agent claimed another chat before the job ran
+            chat = ChatSession(
+                customer_name="Claimed meanwhile", department_id=agent.department_id,
+                assigned_agent_id=agent_id, status=ChatStatus.ACTIVE
+            )
+            db.add(chat)
+            agent.agent_status = AgentStatus.BUSY
+            await db.commit()
+
+        async with AsyncSessionLocal() as db:
+            assert await handle_chat_close_assignment(db, agent_id, agent.department_id) is None
+        await job_queue.handlers["release_agent"](agent_id=agent_id)
+
+        async with AsyncSessionLocal() as db:
+            agent = await db.get(User, agent_id)
+            assert agent.agent_status == AgentStatus.BUSY
+
+            chat = await db.get(ChatSession, chat.id)
+            chat.status = ChatStatus.CLOSED
+            agent.agent_status = AgentStatus.OFFLINE
+            await db.commit()
+
+    asyncio.run(scenario())
+
+
+def test_release_keeps_an_offline_agent_offline(agent_ids):
+    agent_id = agent_ids[24]
+
+    async def scenario():
+        # Transferred away their chat, then signed off before the job ran
+        await job_queue.handlers["release_agent"](agent_id=agent_id)
+
+        async with AsyncSessionLocal() as db:
+            agent = await db.get(User, agent_id)
+            assert agent.agent_status == AgentStatus.OFFLINE
+            assert await handle_chat_close_assignment(db, agent_id, agent.department_id) is None
+
+        async with AsyncSessionLocal() as db:
+            assert (await db.get(User, agent_id)).agent_status == AgentStatus.OFFLINE
+
+    asyncio.run(scenario())
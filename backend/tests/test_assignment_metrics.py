@@ -0,0 +1,43 @@
+"""chat_time_to_assignment_seconds times each chat's first assignment only"""
+import asyncio
+from datetime import datetime, timedelta
+
+from app.database import AsyncSessionLocal
+from app.models.models import User, AgentStatus, ChatSession, ChatStatus
+from app.services.assignment_service import assign_chat_to_agent, time_to_assignment
+
+
+def test_transferred_chats_are_not_timed_again(agent_ids):
+    agent_id = agent_ids[23]
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            agent = await db.get(User, agent_id)
+            hour_ago = datetime.utcnow() - timedelta(hours=1)
+            chats = [
+                ChatSession(
+                    customer_name="Timed", department_id=agent.department_id,
+                    status=ChatStatus.WAITING, created_at=hour_ago, transferred_from=transferred_from
+                )
+                for transferred_from in (None, 1)
+            ]
+            db.add_all(chats)
+            await db.commit()
+            chat_ids = [chat.id for chat in chats]
+
+        histogram = time_to_assignment.labels(agent.department_id)
+        counted = []
+        for chat_id in chat_ids:
+            async with AsyncSessionLocal() as db:
+                before = sum(histogram.counts)
+                await assign_chat_to_agent(db, await db.get(ChatSession, chat_id), await db.get(User, agent_id))
+                counted.append(sum(histogram.counts) - before)
+        assert counted == [1, 0]
+
+        async with AsyncSessionLocal() as db:
+            for chat_id in chat_ids:
+                (await db.get(ChatSession, chat_id)).status = ChatStatus.CLOSED
+            (await db.get(User, agent_id)).agent_status = AgentStatus.OFFLINE
+            await db.commit()
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+"""Idempotency-Key replay: retry storms, what is kept, and whose responses are replayed"""
+import asyncio
+import uuid
+from sqlalchemy import select, func
+
+from app.database import AsyncSessionLocal
+from app.models.models import ChatSession
+from app.services import rate_limit
+from app.services.idempotency import IdempotencyStore
+from tests.support import run, create_chat
+
+
+async def count_chats(name: str) -> int:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(func.count(ChatSession.id)).where(ChatSession.customer_name == name))
+        return result.scalar()
+
+
+def test_retry_storm_creates_one_chat(agent_ids):
+    async def scenario(client):
+        headers = {"Idempotency-Key": str(uuid.uuid4())}
+        responses = await asyncio.gather(*(create_chat(client, "Storm", headers) for _ in range(20)))
+
+        assert {r.status_code for r in responses} == {201}
+        assert len({r.json()["id"] for r in responses}) == 1
+        assert sum(r.headers.get("idempotent-replayed") == "true" for r in responses) == 19
+        assert await count_chats("Storm") == 1
+
+    run(scenario)
+
+
+def test_rate_limited_response_is_not_replayed(agent_ids, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "CHATS_PER_IP", rate_limit.RateLimit("chats_per_ip", "1/60"))
+    monkeypatch.setattr(rate_limit.rate_limiter, "store", rate_limit.MemoryStore())
+
+    async def scenario(client):
+        assert (await create_chat(client, "Limited")).status_code == 201
+
+        headers = {"Idempotency-Key": str(uuid.uuid4())}
+        response = await create_chat(client, "Limited", headers)
+        assert response.status_code == 429
+
+        # The limit clears; the client's retry with the same key must run
+        rate_limit.rate_limiter.store = rate_limit.MemoryStore()
+        response = await create_chat(client, "Limited", headers)
+        assert response.status_code == 201
+        assert response.headers.get("idempotent-replayed") is None
+
+    run(scenario)
+
+
+def test_keys_are_scoped_to_the_client(agent_ids):
+    async def scenario(client):
+        key = str(uuid.uuid4())
+        first = await create_chat(client, "Scoped", {"Idempotency-Key": key, "Authorization": "Bearer one"})
+        second = await create_chat(client, "Scoped", {"Idempotency-Key": key, "Authorization": "Bearer two"})
+
+        assert first.json()["id"] != second.json()["id"]
+        assert second.headers.get("idempotent-replayed") is None
+        assert await count_chats("Scoped") == 2
+
+    run(scenario)
+
+
+def test_trim_keeps_running_requests():
+    async def scenario():
+        store = IdempotencyStore(ttl=60, max_keys=1)
+        running, _ = store.begin("running", "a")
+        store.begin("other", "b")
+        # Over the cap, but the running request's retries still need its entry
+        entry, created = store.begin("running", "a")
+        assert entry is running and not created
+
+    asyncio.run(scenario())
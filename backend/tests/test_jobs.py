@@ -0,0 +1,75 @@
+"""The database job store shared by several processes"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+
+from app.database import AsyncSessionLocal
+from app.models.models import Job
+from app.services.jobs import JobQueue, STATUS_RUNNING
+
+
+def durable_queues(count: int, runs: list):
+    """`count` database-backed queues, standing in for separate processes"""
+    async def record(n: int):
+        runs.append(n)
+        await asyncio.sleep(0)
+
+    queues = [JobQueue(durable=True) for _ in range(count)]
+    for queue in queues:
+        queue.handlers["record"] = record
+    return queues
+
+
+async def run_queues(queues):
+    for queue in queues:
+        queue.start()
+    await asyncio.gather(*(queue.join() for queue in queues))
+    for queue in queues:
+        await queue.stop()
+
+
+def test_each_job_runs_once_across_processes(agent_ids):
+    runs = []
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            db.add_all(Job(name="record", payload=json.dumps({"n": n}), priority=5) for n in range(40))
+            await db.commit()
+
+        await run_queues(durable_queues(3, runs))
+
+        async with AsyncSessionLocal() as db:
+            assert (await db.execute(select(Job.id).where(Job.name == "record"))).first() is None
+
+    asyncio.run(scenario())
+    assert sorted(runs) == list(range(40))
+
+
+def test_only_lapsed_leases_are_taken_over(agent_ids):
+    runs = []
+
+    async def scenario():
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            live = Job(
+                name="record", payload=json.dumps({"n": 1}), status=STATUS_RUNNING,
+                locked_by="other", locked_until=now + timedelta(seconds=60)
+            )
+            crashed = Job(
+                name="record", payload=json.dumps({"n": 2}), status=STATUS_RUNNING,
+                locked_by="crashed", locked_until=now - timedelta(seconds=1)
+            )
+            db.add_all([live, crashed])
+            await db.commit()
+
+        await run_queues(durable_queues(1, runs))
+
+        async with AsyncSessionLocal() as db:
+            left = (await db.execute(select(Job.locked_by).where(Job.name == "record"))).scalars().all()
+            assert left == ["other"]
+            await db.execute(delete(Job).where(Job.name == "record"))
+            await db.commit()
+
+    asyncio.run(scenario())
+    assert runs == [2]
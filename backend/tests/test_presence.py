@@ -0,0 +1,52 @@
+"""Presence writes must not undo a status set by an assignment"""
+import asyncio
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal
+from app.models.models import User, AgentStatus, ChatSession, ChatStatus
+from app.services import presence as presence_module
+from app.services.presence import PresenceTracker
+
+
+def test_available_skips_agents_with_an_active_chat(agent_ids, monkeypatch):
+    busy_agent, idle_agent = agent_ids[21], agent_ids[22]
+    mirrored = []
+    monkeypatch.setattr(
+        presence_module.supervisor_hub, "set_agent_status",
+        lambda ids, status: mirrored.append((sorted(ids), status))
+    )
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            agent = await db.get(User, busy_agent)
+            chat = ChatSession(
+                customer_name="Presence", department_id=agent.department_id,
+                assigned_agent_id=busy_agent, status=ChatStatus.ACTIVE
+            )
+            db.add(chat)
+            await db.commit()
+
+        # Reconnects queue AVAILABLE; the assignment commits before the flush
+        tracker = PresenceTracker()
+        tracker.set_status(busy_agent, AgentStatus.AVAILABLE)
+        tracker.set_status(idle_agent, AgentStatus.AVAILABLE)
+        async with AsyncSessionLocal() as db:
+            agent = await db.get(User, busy_agent)
+            agent.agent_status = AgentStatus.BUSY
+            await db.commit()
+        await tracker.flush()
+
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(User.id, User.agent_status).where(User.id.in_([busy_agent, idle_agent])))
+            statuses = dict(result.all())
+            assert statuses == {busy_agent: AgentStatus.BUSY, idle_agent: AgentStatus.AVAILABLE}
+            assert mirrored == [([idle_agent], AgentStatus.AVAILABLE)]
+
+            # Leave both agents out of later auto-assignment
+            chat.status = ChatStatus.CLOSED
+            await db.merge(chat)
+            for agent_id in (busy_agent, idle_agent):
+                (await db.get(User, agent_id)).agent_status = AgentStatus.OFFLINE
+            await db.commit()
+
+    asyncio.run(scenario())
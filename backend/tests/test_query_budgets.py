@@ -0,0 +1,74 @@
+"""
+SQL statement budgets for the hot endpoints, so an N+1 regression fails the
+suite instead of showing up in production. Run from the backend directory:
+
+    python -m pytest tests
+"""
+from app.services.jobs import job_queue
+from app.services.message_cache import message_cache
+from app.services.query_stats import query_budget
+from tests.support import run, create_chat
+
+PAGE = 20
+
+
+async def new_chat(client, name: str = "Customer") -> int:
+    response = await create_chat(client, name)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+def test_chat_list(agent_ids):
+    async def scenario(client):
+        chat_ids = [await new_chat(client, f"Customer {i}") for i in range(PAGE)]
+        for chat_id, agent_id in zip(chat_ids, agent_ids):
+            response = await client.put(f"/api/chats/{chat_id}/claim", params={"agent_id": agent_id})
+            assert response.status_code == 200, response.text
+
+        # Departments and agents are joined in, not loaded per chat
+        with query_budget(1, "GET /api/chats/"):
+            response = await client.get("/api/chats/", params={"limit": PAGE})
+        assert response.status_code == 200
+        assert len(response.json()) == PAGE
+
+    run(scenario)
+
+
+def test_messages(agent_ids):
+    async def scenario(client):
+        chat_id = await new_chat(client)
+        for i in range(PAGE):
+            response = await client.post(
+                f"/api/chats/{chat_id}/messages",
+                json={"chat_session_id": chat_id, "sender_name": "Customer", "content": f"message {i}"}
+            )
+            assert response.status_code == 201, response.text
+
+        with query_budget(0, "GET /api/chats/{id}/messages (cached)"):
+            response = await client.get(f"/api/chats/{chat_id}/messages")
+        assert len(response.json()) == PAGE
+
+        message_cache.evict(chat_id)
+        with query_budget(2, "GET /api/chats/{id}/messages"):
+            response = await client.get(f"/api/chats/{chat_id}/messages")
+        assert len(response.json()) == PAGE
+
+    run(scenario)
+
+
+def test_claim_and_close(agent_ids):
+    async def scenario(client):
+        chat_id = await new_chat(client)
+        # Not used by the other tests, so free to claim
+        agent_id = agent_ids[PAGE]
+        with query_budget(11, "PUT /api/chats/{id}/claim"):
+            response = await client.put(f"/api/chats/{chat_id}/claim", params={"agent_id": agent_id})
+        assert response.status_code == 200, response.text
+
+        # The follow-up assignment runs on the job queue and is not counted
+        with query_budget(7, "PUT /api/chats/{id}/close"):
+            response = await client.put(f"/api/chats/{chat_id}/close")
+            await job_queue.join()
+        assert response.status_code == 200, response.text
+
+    run(scenario)
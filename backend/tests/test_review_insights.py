@@ -0,0 +1,44 @@
+"""Review insights must not skip reviews that commit out of id order"""
+import asyncio
+from datetime import datetime, timedelta
+
+from app.database import AsyncSessionLocal
+from app.models.models import User, ChatSession, ChatStatus, Review, ReviewInsight, PipelineWatermark
+from app.services.review_insights import process_new_reviews, WATERMARK_NAME
+
+
+async def add_review(department_id: int, review_id: int, created_at=None):
+    async with AsyncSessionLocal() as db:
+        chat = ChatSession(customer_name="Reviewer", department_id=department_id, status=ChatStatus.CLOSED)
+        db.add(chat)
+        await db.flush()
+        db.add(Review(
+            id=review_id, chat_session_id=chat.id, rating=4, comment="quick and helpful",
+            customer_name="Reviewer", customer_email="reviewer@example.com",
+            department_id=department_id, created_at=created_at
+        ))
+        await db.commit()
+
+
+def test_late_commits_below_the_watermark_are_analysed(agent_ids):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            department_id = (await db.get(User, agent_ids[0])).department_id
+
+        # 1001 commits first; 1000 was inserted earlier but commits after the run
+        await add_review(department_id, 1001)
+        assert (await process_new_reviews())["reviews_processed"] >= 1
+        await add_review(department_id, 1000)
+        assert (await process_new_reviews())["reviews_processed"] == 1
+
+        async with AsyncSessionLocal() as db:
+            assert await db.get(ReviewInsight, 1000) is not None
+            assert (await db.get(PipelineWatermark, WATERMARK_NAME)).last_id < 1000
+
+        # Once no lower id can still be in flight the watermark moves past them
+        await add_review(department_id, 1002, datetime.utcnow() - timedelta(hours=1))
+        assert (await process_new_reviews())["reviews_processed"] == 1
+        async with AsyncSessionLocal() as db:
+            assert (await db.get(PipelineWatermark, WATERMARK_NAME)).last_id == 1002
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+"""ConnectionManager delivery order, with a stand-in socket"""
+import asyncio
+import json
+
+from app.services.websocket_manager import ConnectionManager
+from app.services.ws_protocol import JsonCodec
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.sent.append(json.loads(data))
+
+
+class BrokenSocket(RecordingSocket):
+    async def send_text(self, data: str):
+        raise RuntimeError("connection reset")
+
+
+def test_replay_reaches_a_resuming_client_before_live_broadcasts():
+    async def scenario():
+        manager = ConnectionManager()
+        socket = RecordingSocket()
+        await manager.connect_to_chat(socket, 7, hold_broadcasts=True)
+
+        # A message is broadcast while the replay is still reading the database
+        assert await manager.broadcast_to_chat({"type": "message", "seq": 5}, 7)
+        for seq in (3, 4):
+            await manager.send_personal_message({"type": "message", "seq": seq}, socket)
+        await manager.release_held_events(socket)
+        await manager.broadcast_to_chat({"type": "message", "seq": 6}, 7)
+
+        assert [event["seq"] for event in socket.sent] == [3, 4, 5, 6]
+
+    asyncio.run(scenario())
+
+
+def test_immediate_sends_report_failures_on_batching_sockets():
+    async def scenario():
+        manager = ConnectionManager()
+        await manager.connect_to_chat(BrokenSocket(), 7, JsonCodec(batching=True))
+
+        # Buffered: nothing has been sent yet, so nothing can be known to have failed
+        assert await manager.broadcast_to_chat({"type": "message"}, 7)
+        assert not await manager.broadcast_to_chat({"type": "message"}, 7, immediate=True)
+
+    asyncio.run(scenario())
+
+
+def test_immediate_sends_go_out_behind_buffered_events():
+    async def scenario():
+        manager = ConnectionManager()
+        socket = RecordingSocket()
+        await manager.connect_to_chat(socket, 7, JsonCodec(batching=True))
+
+        await manager.broadcast_to_chat({"type": "typing"}, 7)
+        assert await manager.broadcast_to_chat({"type": "message"}, 7, immediate=True)
+
+        assert socket.sent == [{"type": "batch", "events": [{"type": "typing"}, {"type": "message"}]}]
+        assert socket not in manager.send_buffers
+
+    asyncio.run(scenario())
+
+
+def test_pings_are_not_batched():
+    async def scenario():
+        manager = ConnectionManager()
+        socket, broken = RecordingSocket(), BrokenSocket()
+        await manager.connect_to_chat(socket, 7, JsonCodec(batching=True))
+        await manager.connect_to_chat(broken, 8, JsonCodec(batching=True))
+
+        assert await manager.ping_all(timeout=1) == [broken]
+        assert socket.sent == [{"type": "ping"}]
+
+    asyncio.run(scenario())
@@ -4,6 +4,7 @@ import { FormsModule } from '@angular/forms';
 import { Router } from '@angular/router';
 import { ApiService } from '../../services/api.service';
 import { WebSocketService } from '../../services/websocket.service';
+import { AgentSocketService } from '../../services/agent-socket.service';
 import { AuthService } from '../../services/auth.service';
 import {
   ChatSession,
@@ -973,6 +974,7 @@ export class AgentDashboardComponent implements OnInit, OnDestroy {
   constructor(
     private apiService: ApiService,
     private wsService: WebSocketService,
+    private agentSocket: AgentSocketService,
     private authService: AuthService,
     private router: Router
   ) {}
@@ -997,8 +999,8 @@ export class AgentDashboardComponent implements OnInit, OnDestroy {
   connectAgentWebSocket(): void {
     if (!this.currentUser) return;
 
-    this.agentWsSubscription = this.wsService
-      .connectAgent(this.currentUser.id, this.currentUser.department_id)
+    this.agentWsSubscription = this.agentSocket
+      .connect(this.currentUser.id, this.currentUser.department_id)
       .subscribe({
         next: (wsMessage: any) => this.handleAgentWebSocketMessage(wsMessage),
         error: (err) => console.error('Agent WebSocket error', err)
@@ -1098,6 +1100,7 @@ export class AgentDashboardComponent implements OnInit, OnDestroy {
   ngOnDestroy(): void {
     this.disconnectWebSocket();
     this.agentWsSubscription?.unsubscribe();
+    this.agentSocket.disconnect();
     this.refreshSubscription?.unsubscribe();
     this.clearAssignmentTimer();
     if (this.typingTimeout) clearTimeout(this.typingTimeout);
@@ -1224,6 +1227,9 @@ export class AgentDashboardComponent implements OnInit, OnDestroy {
       this.customerTyping = true;
       if (this.typingTimeout) clearTimeout(this.typingTimeout);
       this.typingTimeout = setTimeout(() => this.customerTyping = false, 3000);
+    } else if (wsMessage.type === 'resync_required') {
+      // Too much was missed to replay over the socket; reload the history
+      this.loadMessages();
     } else if (wsMessage.type === 'chat_closed') {
       if (this.selectedChat) {
         this.selectedChat.status = ChatStatus.CLOSED;
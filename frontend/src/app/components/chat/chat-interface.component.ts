@@ -779,6 +779,9 @@ export class ChatInterfaceComponent implements OnInit, OnDestroy {
         agents_available: 0,
         agents_busy: 0
       };
+    } else if (wsMessage.type === 'resync_required') {
+      // Too much was missed to replay over the socket; reload the history
+      this.loadMessages();
     } else if (wsMessage.type === 'chat_closed') {
       this.chatSession!.status = ChatStatus.CLOSED;
       this.stopQueuePolling();
@@ -0,0 +1,136 @@
+import { Injectable } from '@angular/core';
+import { Observable, Subject } from 'rxjs';
+import { WSMessage } from '../models/models';
+import { environment } from '../../environments/environment';
+
+/**
+ * The agent's notification channel (/ws/agent/{id}).
+ *
+ * Kept apart from WebSocketService so that opening or switching chats never
+ * closes it: the server reads a closed agent socket as the agent going away
+ * and marks them OFFLINE once the presence grace period runs out.
+ */
+@Injectable({
+  providedIn: 'root'
+})
+export class AgentSocketService {
+  private socket?: WebSocket;
+  private messagesSubject?: Subject<WSMessage>;
+  private reconnectAttempts = 0;
+  private maxReconnectAttempts = 5;
+  private reconnectDelay = 2000;
+  private currentAgentId?: number;
+  private currentDepartmentId?: number;
+  private heartbeatTimer?: ReturnType<typeof setInterval>;
+  private heartbeatIntervalMs = 25000;
+
+  constructor() {}
+
+  connect(agentId: number, departmentId?: number): Observable<WSMessage> {
+    // Always disconnect existing connection first
+    this.disconnect();
+
+    // Create a fresh Subject
+    this.messagesSubject = new Subject<WSMessage>();
+
+    // Store connection params for reconnection
+    this.currentAgentId = agentId;
+    this.currentDepartmentId = departmentId;
+    this.reconnectAttempts = 0;
+
+    this.createConnection(agentId, departmentId);
+
+    return this.messagesSubject.asObservable();
+  }
+
+  private createConnection(agentId: number, departmentId?: number): void {
+    const wsUrl = `${environment.wsUrl}/ws/agent/${agentId}${departmentId ? '?department_id=' + departmentId : ''}`;
+
+    try {
+      this.socket = new WebSocket(wsUrl);
+
+      this.socket.onopen = () => {
+        console.log('Agent WebSocket connected:', agentId);
+        this.reconnectAttempts = 0;
+        // Keep the agent's presence alive on the server
+        this.stopHeartbeat();
+        this.heartbeatTimer = setInterval(() => {
+          this.sendMessage({ type: 'heartbeat' });
+        }, this.heartbeatIntervalMs);
+      };
+
+      this.socket.onmessage = (event) => {
+        try {
+          const message = JSON.parse(event.data);
+          if (message.type === 'ping') {
+            this.sendMessage({ type: 'pong' });
+            return;
+          }
+          this.messagesSubject?.next(message);
+        } catch (e) {
+          console.error('Error parsing WebSocket message:', e);
+        }
+      };
+
+      this.socket.onerror = (error) => {
+        console.error('Agent WebSocket error:', error);
+      };
+
+      this.socket.onclose = () => {
+        console.log('Agent WebSocket closed');
+        this.stopHeartbeat();
+        // Reconnect within the presence grace period if not intentionally closed
+        if (this.currentAgentId && this.reconnectAttempts < this.maxReconnectAttempts) {
+          this.reconnectAttempts++;
+          setTimeout(() => {
+            if (this.currentAgentId) {
+              this.createConnection(this.currentAgentId, this.currentDepartmentId);
+            }
+          }, this.reconnectDelay);
+        }
+      };
+    } catch (e) {
+      console.error('Error creating Agent WebSocket:', e);
+    }
+  }
+
+  sendMessage(message: any): void {
+    if (this.socket && this.socket.readyState === WebSocket.OPEN) {
+      this.socket.send(JSON.stringify(message));
+    } else {
+      console.warn('Agent WebSocket is not connected, message not sent:', message);
+    }
+  }
+
+  updateAgentStatus(status: string): void {
+    this.sendMessage({
+      type: 'status_update',
+      status: status
+    });
+  }
+
+  private stopHeartbeat(): void {
+    if (this.heartbeatTimer) {
+      clearInterval(this.heartbeatTimer);
+      this.heartbeatTimer = undefined;
+    }
+  }
+
+  disconnect(): void {
+    this.stopHeartbeat();
+    this.currentAgentId = undefined;
+    this.currentDepartmentId = undefined;
+    this.reconnectAttempts = this.maxReconnectAttempts; // Prevent reconnection
+
+    if (this.socket) {
+      this.socket.close();
+      this.socket = undefined;
+    }
+
+    this.messagesSubject = undefined;
+  }
+
+  isConnected(): boolean {
+    return this.socket !== undefined && this.socket.readyState === WebSocket.OPEN;
+  }
+}
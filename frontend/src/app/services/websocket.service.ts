@@ -15,6 +15,7 @@ export class WebSocketService {
   private currentChatId?: number;
   private currentSenderName?: string;
   private currentSenderId?: number;
+  private lastSeq?: number;
 
   constructor() {}
 
@@ -33,6 +34,7 @@ export class WebSocketService {
     this.currentChatId = chatSessionId;
     this.currentSenderName = senderName;
     this.currentSenderId = senderId;
+    this.lastSeq = undefined;
 
     this.createChatConnection(chatSessionId, senderName, senderId);
 
@@ -40,7 +42,9 @@ export class WebSocketService {
   }
 
   private createChatConnection(chatSessionId: number, senderName: string, senderId?: number): void {
-    const wsUrl = `${environment.wsUrl}/ws/chat/${chatSessionId}?sender_name=${encodeURIComponent(senderName)}${senderId ? '&sender_id=' + senderId : ''}`;
+    // On reconnect, ask the server to replay what was missed since the last seen message
+    const resume = this.lastSeq !== undefined ? '&resume_from=' + this.lastSeq : '';
+    const wsUrl = `${environment.wsUrl}/ws/chat/${chatSessionId}?sender_name=${encodeURIComponent(senderName)}${senderId ? '&sender_id=' + senderId : ''}${resume}`;
 
     try {
       this.socket = new WebSocket(wsUrl);
@@ -53,6 +57,17 @@ export class WebSocketService {
       this.socket.onmessage = (event) => {
         try {
           const message = JSON.parse(event.data);
+          if (message.type === 'ping') {
+            this.sendMessage({ type: 'pong' });
+            return;
+          }
+          if (typeof message.seq === 'number') {
+            // Replayed events may overlap with ones already delivered
+            if (this.lastSeq !== undefined && message.seq <= this.lastSeq) {
+              return;
+            }
+            this.lastSeq = message.seq;
+          }
           this.messagesSubject?.next(message);
         } catch (e) {
           console.error('Error parsing WebSocket message:', e);
@@ -81,46 +96,6 @@ export class WebSocketService {
     }
   }
 
-  connectAgent(agentId: number, departmentId?: number): Observable<WSMessage> {
-    // Always disconnect existing connection first
-    this.disconnect();
-
-    // Create a fresh Subject
-    this.messagesSubject = new Subject<WSMessage>();
-
-    const wsUrl = `${environment.wsUrl}/ws/agent/${agentId}${departmentId ? '?department_id=' + departmentId : ''}`;
-
-    try {
-      this.socket = new WebSocket(wsUrl);
-
-      this.socket.onopen = () => {
-        console.log('Agent WebSocket connected:', agentId);
-        this.reconnectAttempts = 0;
-      };
-
-      this.socket.onmessage = (event) => {
-        try {
-          const message = JSON.parse(event.data);
-          this.messagesSubject?.next(message);
-        } catch (e) {
-          console.error('Error parsing WebSocket message:', e);
-        }
-      };
-
-      this.socket.onerror = (error) => {
-        console.error('Agent WebSocket error:', error);
-      };
-
-      this.socket.onclose = () => {
-        console.log('Agent WebSocket closed');
-      };
-    } catch (e) {
-      console.error('Error creating Agent WebSocket:', e);
-    }
-
-    return this.messagesSubject.asObservable();
-  }
-
   sendMessage(message: any): void {
     if (this.socket && this.socket.readyState === WebSocket.OPEN) {
       this.socket.send(JSON.stringify(message));
@@ -138,17 +113,11 @@ export class WebSocketService {
     });
   }
 
-  updateAgentStatus(status: string): void {
-    this.sendMessage({
-      type: 'status_update',
-      status: status
-    });
-  }
-
   disconnect(): void {
     this.currentChatId = undefined;
     this.currentSenderName = undefined;
     this.currentSenderId = undefined;
+    this.lastSeq = undefined;
     this.reconnectAttempts = this.maxReconnectAttempts; // Prevent reconnection
 
     if (this.socket) {